@@ -0,0 +1 @@
+"""Análisis offline del journal de conversaciones (ver analytics.journal)."""
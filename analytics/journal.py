@@ -0,0 +1,89 @@
+"""Lector del journal de conversaciones: exporta NDJSON o resume el período.
+
+Uso:
+    python -m analytics.journal journal/ --stats
+    python -m analytics.journal journal/ --since 2026-10-01 --tenant default > turnos.ndjson
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable
+
+from src.services.journal_format import iter_journal, list_segments
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def stats(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Turnos, usuarios, ruteo, latencias, costo, etapas y fragmentos RAG más usados"""
+    turns = 0
+    users = set()
+    handled_by: Counter = Counter()
+    matches: Counter = Counter()
+    stages: Dict[str, list] = {}
+    latencies = []
+    cost = 0.0
+    first_ts = last_ts = None
+    for record in records:
+        turns += 1
+        users.add(record.get("user"))
+        handled_by[record.get("handled_by", "pipeline")] += 1
+        matches.update(record.get("rag_match_ids") or [])
+        for stage, ms in (record.get("stage_ms") or {}).items():
+            stages.setdefault(stage, []).append(ms)
+        if record.get("response_time_ms") is not None:
+            latencies.append(record["response_time_ms"])
+        cost += record.get("cost_usd") or 0.0
+        first_ts = record["ts"] if first_ts is None else first_ts
+        last_ts = record["ts"]
+    return {
+        "turns": turns,
+        "users": len(users),
+        "from": datetime.fromtimestamp(first_ts, timezone.utc).isoformat() if first_ts else None,
+        "to": datetime.fromtimestamp(last_ts, timezone.utc).isoformat() if last_ts else None,
+        "handled_by": dict(handled_by.most_common()),
+        "response_time_ms": {"p50": _percentile(latencies, 0.50), "p95": _percentile(latencies, 0.95)},
+        "stages_ms": {stage: {"mean": round(sum(v) / len(v), 2), "p95": _percentile(v, 0.95)}
+                      for stage, v in sorted(stages.items())},
+        "cost_usd": round(cost, 6),
+        "top_rag_matches": dict(matches.most_common(20))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lee el journal de conversaciones")
+    parser.add_argument("directory", help="Directorio del journal (JOURNAL_DIR)")
+    parser.add_argument("--since", default=None, help="Fecha ISO (UTC) desde la que leer")
+    parser.add_argument("--tenant", default=None, help="Solo turnos de este tenant")
+    parser.add_argument("--include-open", action="store_true", help="Incluir el segmento activo")
+    parser.add_argument("--stats", action="store_true", help="Resumen en vez de exportar los turnos")
+    args = parser.parse_args(argv)
+
+    since = None
+    if args.since:
+        parsed = datetime.fromisoformat(args.since)
+        since = (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+    if not list_segments(args.directory, args.include_open):
+        raise SystemExit(f"sin segmentos en {args.directory}")
+
+    records = iter_journal(args.directory, include_open=args.include_open, since=since)
+    if args.tenant:
+        records = (r for r in records if r.get("tenant") == args.tenant)
+
+    if args.stats:
+        json.dump(stats(records), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return
+    for record in records:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
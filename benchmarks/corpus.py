@@ -0,0 +1,86 @@
+"""Corpus de mensajes reales de WhatsApp (anonimizados) para los benchmarks"""
+
+MENSAJES = [
+    "hola",
+    "Hola buenas tardes",
+    "buen dia, queria consultar precio de matafuegos",
+    "Necesito 3 extintores de 5kg para mi oficina en Palermo, cuanto sale?",
+    "cuanto sale la recarga de un matafuego ABC de 10 kg??",
+    "Hola! tengo un restaurant de 120 m2 y me pidieron habilitacion de bomberos, que necesito",
+    "hacen el control anual de la red de incendio? somos un edificio de 12 pisos",
+    "me llamo Martina Gomez, mi mail es martina.gomez@gmail.com",
+    "Soy Juan Carlos Perez de la empresa Metalurgica del Sur",
+    "si, al mismo whatsapp esta perfecto",
+    "correcto, esos son mis datos",
+    "gracias!!",
+    "ok",
+    "👍",
+    "Tienen detectores de humo inalambricos? necesito para un local comercial",
+    "que diferencia hay entre un extintor de CO2 y uno de polvo quimico",
+    "la norma IRAM 3517 cada cuanto pide el mantenimiento de los extintores",
+    "Buenas, quería saber si venden elementos de protección personal, guantes y botas",
+    "necesito cotización para instalar sprinklers en una fábrica de 800 metros",
+    "mi email es compras@distribuidoranorte.com.ar, soy Laura",
+    "se me vencio la carga del matafuego del auto, lo puedo llevar hoy?",
+    "hacen capacitacion de evacuacion para el personal? somos 40 empleados",
+    "Quien gano el partido de anoche?",
+    "me pasas una receta de empanadas",
+    "necesito el certificado de la inspeccion para presentar en el municipio mañana urgente",
+    "Hola Eva, te escribo de nuevo por el presupuesto que me pasaron la semana pasada",
+    "los hidrantes del barrio privado no tienen presión, ustedes revisan bombas?",
+    "cuanto tarda la entrega de 10 matafuegos a zona norte, local en San Isidro",
+    "quiero contratar el servicio de mantenimiento mensual para mi empresa",
+    "mi nombre es Roberto Fernandez y el telefono es 11 5555-1234",
+]
+
+# Estados de lead parciales para simular conversaciones a mitad de camino
+LEADS_PARCIALES = [
+    {},
+    {"intent": "Necesito 3 extintores de 5kg para mi oficina en Palermo"},
+    {"intent": "cotización sprinklers fábrica", "nombre": "Laura"},
+    {"intent": "control anual red de incendio", "ubicacion": "edificio de 12 pisos"},
+]
+
+RESPUESTA_BOT = (
+    "¡Perfecto! Para oficinas recomendamos extintores ABC de 5 kg, uno cada 200 m2 🧯 "
+    "¿Me pasás tu nombre y email así te envío la propuesta?"
+)
+
+CONTEXTO_RAG = """Extintores ABC de polvo químico seco: aptos para fuegos clase A, B y C. Capacidades de 1, 2.5, 5 y 10 kg.
+---
+Mantenimiento de extintores: según IRAM 3517-2 la recarga y control se realiza anualmente, con prueba hidráulica cada 5 años.
+---
+Habilitaciones: asesoramos en la documentación requerida por bomberos y el municipio para locales comerciales y gastronómicos."""
+
+# Documento largo para el chunking del RAG (~6000 palabras)
+DOCUMENTO = " ".join([CONTEXTO_RAG.replace("\n", " ")] * 60)
+
+HTML_LEAD = """
+<html><body>
+<div class="header"><h1>🔥 NUEVO LEAD - Eva WhatsApp Bot</h1><p>Lead capturado automáticamente</p></div>
+<div class="client-info"><h3>👤 Información del Cliente</h3>
+<div class="field"><span class="label">Nombre:</span> <span class="value">Martina Gomez</span></div>
+<div class="field"><span class="label">WhatsApp:</span> <span class="value">whatsapp:+5491155551234</span></div>
+<div class="field"><span class="label">Email:</span> <span class="value">martina.gomez@gmail.com</span></div>
+</div>
+<div class="client-info"><h3>🎯 Consulta del Cliente</h3>
+<div class="field"><span class="label">Intención:</span> <span class="value">Necesito 3 extintores de 5kg para mi oficina</span></div>
+<div class="field"><span class="label">Ubicación/Detalles:</span> <span class="value">oficina en Palermo, 150 m2</span></div>
+</div>
+<div class="client-info"><h3>🚀 Próximos Pasos</h3><ul>
+<li>✅ Contactar al cliente por WhatsApp: <strong>whatsapp:+5491155551234</strong></li>
+<li>✅ Enviar cotización por email: <strong>martina.gomez@gmail.com</strong></li>
+<li>📋 Agendar visita técnica si es necesario</li>
+</ul></div>
+<div class="footer"><p>Generado automáticamente por <strong>Eva</strong> - Asistente Virtual Argenfuego</p></div>
+</body></html>
+"""
+
+LOG_DATA = {
+    "user_id": "whatsapp:+5491155551234",
+    "response_time_ms": 1834,
+    "tokens_used": 512,
+    "cost_usd": 0.00041,
+    "trace_id": "4bf92f3577b34da6a3ce929d0e0e4736",
+    "message_preview": "Necesito 3 extintores de 5kg para mi oficina"
+}
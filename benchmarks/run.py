@@ -0,0 +1,216 @@
+"""Micro-benchmarks de los caminos CPU del bot (sin red ni API keys).
+
+Uso:
+    python -m benchmarks.run                    # mide y compara contra el baseline
+    python -m benchmarks.run --save-baseline    # guarda las mediciones como nuevo baseline
+    python -m benchmarks.run --only validators --threshold 0.3
+
+Sale con código 1 si algún benchmark es más lento (ops/seg) o asigna más memoria
+por operación que el baseline más allá del umbral.
+"""
+import argparse
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Claves dummy: los clientes se construyen al importar settings pero nunca se llaman
+for _key in ("OPENAI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN",
+             "PINECONE_API_KEY", "SENDGRID_API_KEY"):
+    os.environ.setdefault(_key, "benchmark-dummy")
+os.environ.setdefault("LOG_LEVEL", "INFO")
+os.environ.setdefault("LOG_ASYNC", "false")
+os.environ.setdefault("TRACE_OTLP_ENDPOINT", "")
+
+from benchmarks import corpus  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "baseline.json")
+
+
+def _build_cases() -> Dict[str, Callable[[], Callable[[], Any]]]:
+    """Cada caso devuelve una función sin argumentos que ejecuta UNA operación"""
+    from src.guardrails import validators
+    from src.services.chatbot_service import ChatbotService
+    from src.services.email_service import email_service
+    from src.services.logging_service import logger
+    from src.services.rag_service import RAGManager
+    from src.templates.prompts import SYSTEM_PROMPT
+    from src.templates.assembler import prompt_assembler
+
+    mensajes = itertools.cycle(corpus.MENSAJES)
+    leads = itertools.cycle(itertools.product(corpus.MENSAJES, corpus.LEADS_PARCIALES))
+    chatbot = ChatbotService()
+    # chunk_text no usa el cliente de Pinecone: se evita __init__ (requiere red)
+    rag = RAGManager.__new__(RAGManager)
+    devnull = open(os.devnull, "w")
+
+    def log_emitted():
+        with contextlib.redirect_stdout(devnull):
+            logger.info("message_processed", **corpus.LOG_DATA)
+
+    return {
+        "validators.validar_mensaje_completo": lambda: validators.validar_mensaje_completo(next(mensajes)),
+        "validators.validar_tema_incendios": lambda: validators.validar_tema_incendios(next(mensajes)),
+        "chatbot._update_lead_data": lambda: _update_lead(chatbot, next(leads)),
+        "rag.chunk_text": lambda: rag.chunk_text(corpus.DOCUMENTO),
+        "logging.format_log": lambda: logger.format_log("INFO", "message_processed", corpus.LOG_DATA),
+        "logging.log_emitted": log_emitted,
+        "logging.log_filtered": lambda: logger.debug("message_processed", **corpus.LOG_DATA),
+        "email._html_to_text": lambda: email_service._html_to_text(corpus.HTML_LEAD),
+        "prompts.SYSTEM_PROMPT.render": lambda: SYSTEM_PROMPT.render(contexto_relevante=corpus.CONTEXTO_RAG),
+        "prompts.build_chat_messages": lambda: prompt_assembler.build_chat_messages(
+            next(mensajes), corpus.CONTEXTO_RAG
+        ),
+    }
+
+
+def _update_lead(chatbot, pair):
+    mensaje, lead = pair
+    return chatbot._update_lead_data(mensaje, corpus.RESPUESTA_BOT, lead, "whatsapp:+5491155551234")
+
+
+def measure_speed(fn: Callable[[], Any], min_time: float, repeat: int) -> float:
+    """Mejor ops/seg de `repeat` rondas; cada ronda dura al menos min_time (estilo timeit)"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        number *= 10
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+
+    best = 0.0
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - start
+            best = max(best, number / elapsed)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def measure_allocations(fn: Callable[[], Any], samples: int,
+                        overhead: Dict[str, float] = None) -> Dict[str, float]:
+    """Pico de memoria por operación y bytes retenidos tras `samples` operaciones.
+
+    `overhead` es la misma medición sobre una operación vacía y se descuenta.
+    """
+    overhead = overhead or {"alloc_peak_bytes_per_op": 0, "retained_bytes_per_op": 0}
+    fn()  # calentar caches (regex compiladas, lru_cache, etc.)
+    tracemalloc.start()
+    try:
+        peaks = []
+        before = tracemalloc.take_snapshot()
+        for _ in range(samples):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "alloc_peak_bytes_per_op": max(0, round(sum(peaks) / len(peaks) - overhead["alloc_peak_bytes_per_op"])),
+        "retained_bytes_per_op": max(0, round(retained / samples - overhead["retained_bytes_per_op"]))
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lista de regresiones contra el baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {current['ops_per_sec']:.0f} ops/s vs baseline {previous['ops_per_sec']:.0f} ops/s"
+            )
+        # Margen fijo de 256 bytes: el pico de allocs tiene ruido con objetos chicos
+        allowed = previous["alloc_peak_bytes_per_op"] * (1 + threshold) + 256
+        if current["alloc_peak_bytes_per_op"] > allowed:
+            regressions.append(
+                f"{name}: {current['alloc_peak_bytes_per_op']} B/op vs baseline "
+                f"{previous['alloc_peak_bytes_per_op']} B/op"
+            )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de componentes CPU")
+    parser.add_argument("--only", default="", help="Filtra benchmarks cuyo nombre contenga este texto")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Archivo JSON de baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Segundos mínimos por ronda")
+    parser.add_argument("--repeat", type=int, default=5, help="Rondas por benchmark (se toma la mejor)")
+    parser.add_argument("--alloc-samples", type=int, default=200, help="Operaciones medidas con tracemalloc")
+    args = parser.parse_args(argv)
+
+    cases = {name: fn for name, fn in _build_cases().items() if args.only in name}
+    results: Dict[str, Dict[str, float]] = {}
+    # Costo propio de tracemalloc por operación, medido con una función vacía
+    overhead = measure_allocations(lambda: None, args.alloc_samples)
+
+    print(f"{'benchmark':<40} {'ops/s':>12} {'peak B/op':>10} {'retained B/op':>14}")
+    for name, fn in cases.items():
+        ops = measure_speed(fn, args.min_time, args.repeat)
+        allocs = measure_allocations(fn, args.alloc_samples, overhead)
+        results[name] = {"ops_per_sec": round(ops, 1), **allocs}
+        print(f"{name:<40} {ops:>12,.0f} {allocs['alloc_peak_bytes_per_op']:>10} "
+              f"{allocs['retained_bytes_per_op']:>14}")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        if os.path.exists(args.baseline):
+            # Se conservan los benchmarks no medidos en esta corrida (--only)
+            with open(args.baseline, encoding="utf-8") as f:
+                report["results"] = {**json.load(f).get("results", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nBaseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSin baseline en {args.baseline}; correr con --save-baseline para crearlo")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegresiones (umbral {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print(f"\nSin regresiones contra {args.baseline} (umbral {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
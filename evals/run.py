@@ -0,0 +1,69 @@
+"""Evaluación batch: corre un set JSONL por el pipeline completo y escribe NDJSON.
+
+    python -m evals.run set.jsonl --concurrency 8 > resultados.ndjson
+    python -m evals.run set.jsonl --url http://127.0.0.1:8000/test-batch
+
+Cada línea del set es {"user_id": ..., "message": ...} o un guion
+{"user_id": ..., "messages": [...]}; opcionales "id" y "tenant". Los mensajes de un
+mismo usuario se procesan en orden; usuarios distintos, en paralelo. Sin --url corre
+en proceso (necesita las API keys del entorno); con --url usa el endpoint del server.
+El resumen final (tiempos por etapa y costo) va a stderr.
+"""
+import argparse
+import json
+import sys
+from typing import Iterator, List
+
+
+def _run_local(lines: List[str], concurrency: int, fresh_sessions: bool) -> Iterator[dict]:
+    from src.services.batch_eval import batch_evaluator, parse_items
+    return batch_evaluator.run(parse_items(lines), concurrency, fresh_sessions)
+
+
+def _run_remote(url: str, body: str, concurrency: int, fresh_sessions: bool, timeout: float) -> Iterator[dict]:
+    import httpx
+    params = {"concurrency": concurrency, "fresh_sessions": str(fresh_sessions).lower()}
+    with httpx.stream("POST", url, params=params, content=body.encode("utf-8"),
+                      headers={"Content-Type": "application/x-ndjson"}, timeout=timeout) as response:
+        if response.status_code != 200:
+            response.read()
+            raise SystemExit(f"{response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluación batch de mensajes por ChatbotService")
+    parser.add_argument("input", help="Archivo JSONL ('-' para stdin)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Usuarios procesados en paralelo")
+    parser.add_argument("--url", default=None, help="Endpoint /test-batch de un server en vez de correr en proceso")
+    parser.add_argument("--reuse-sessions", action="store_true",
+                        help="Usar los user_id tal cual (por defecto cada corrida arranca sesiones nuevas)")
+    parser.add_argument("--timeout", type=float, default=3600)
+    args = parser.parse_args(argv)
+
+    with (sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")) as f:
+        body = f.read()
+
+    fresh_sessions = not args.reuse_sessions
+    if args.url:
+        results = _run_remote(args.url, body, args.concurrency, fresh_sessions, args.timeout)
+    else:
+        results = _run_local(body.splitlines(), args.concurrency, fresh_sessions)
+
+    for result in results:
+        if result.get("type") == "summary":
+            latency = result["latency_ms"]
+            print(f"{result['completed']}/{result['items']} mensajes en {result['wall_s']}s "
+                  f"({result['items_per_s']}/s) | errores: {result['errors']} | "
+                  f"costo: ${result['cost_usd']} | p50={latency['p50']}ms p95={latency['p95']}ms",
+                  file=sys.stderr)
+            for stage, stats in result["stages_ms"].items():
+                print(f"  {stage}: mean={stats['mean']}ms p95={stats['p95']}ms n={stats['count']}", file=sys.stderr)
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Generador de carga: reproduce POSTs firmados a /webhook a una tasa objetivo.
+
+    python -m loadtest.driver --url http://127.0.0.1:8000/webhook \\
+        --rate 20 --duration 60 --users 300 --auth-token stub-token
+
+Carga de lazo abierto: las llegadas siguen un proceso de Poisson a `--rate` req/s
+sin esperar respuestas, así la latencia medida incluye la cola del servidor.
+Cada usuario virtual avanza por su guion de conversación en orden.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from loadtest.scripts import CONVERSATIONS
+
+BOT_NUMBER = "whatsapp:+5491147361881"
+
+
+def twilio_signature(auth_token: str, url: str, params: Dict[str, str]) -> str:
+    """X-Twilio-Signature: HMAC-SHA1 de la URL + parámetros ordenados, en base64"""
+    payload = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    digest = hmac.new(auth_token.encode(), payload.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return round(sorted_values[index], 1)
+
+
+class VirtualUser:
+    """Usuario con número propio y un guion de conversación que recorre en orden"""
+
+    def __init__(self, index: int, script: List[str]):
+        self.number = f"whatsapp:+54911{index:08d}"
+        self.script = script
+        self.position = 0
+
+    def next_message(self) -> str:
+        message = self.script[self.position % len(self.script)]
+        self.position += 1
+        return message
+
+
+class LoadDriver:
+    def __init__(self, url: str, auth_token: str, rate: float, duration: float, users: int,
+                 timeout: float, account_sid: str, seed: Optional[int] = None):
+        self.url = url
+        self.auth_token = auth_token
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self.account_sid = account_sid
+        self.random = random.Random(seed)
+        self.users = [VirtualUser(i, self.random.choice(CONVERSATIONS)) for i in range(users)]
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.sent = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _form(self, user: VirtualUser) -> Dict[str, str]:
+        return {
+            "AccountSid": self.account_sid,
+            "MessageSid": f"SM{uuid.uuid4().hex}",
+            "From": user.number,
+            "To": BOT_NUMBER,
+            "Body": user.next_message(),
+            "NumMedia": "0",
+        }
+
+    async def _send(self, client: httpx.AsyncClient, user: VirtualUser):
+        form = self._form(user)
+        headers = {"X-Twilio-Signature": twilio_signature(self.auth_token, self.url, form)}
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            response = await client.post(self.url, data=form, headers=headers)
+            outcome = str(response.status_code)
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        finally:
+            self.in_flight -= 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.statuses[outcome] = self.statuses.get(outcome, 0) + 1
+        if outcome.startswith("2"):
+            self.latencies.append(elapsed_ms)
+
+    async def run(self) -> Dict:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        tasks = []
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            start = time.perf_counter()
+            next_arrival = start
+            while next_arrival - start < self.duration:
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+                user = self.random.choice(self.users)
+                tasks.append(asyncio.create_task(self._send(client, user)))
+                self.sent += 1
+                next_arrival += self.random.expovariate(self.rate)
+            send_window = time.perf_counter() - start
+            await asyncio.gather(*tasks)
+            total_time = time.perf_counter() - start
+        return self.report(send_window, total_time)
+
+    def report(self, send_window: float, total_time: float) -> Dict:
+        latencies = sorted(self.latencies)
+        ok = len(latencies)
+        errors = self.sent - ok
+        return {
+            "target_rate": self.rate,
+            "offered_rate": round(self.sent / send_window, 2) if send_window else 0,
+            "throughput": round(ok / total_time, 2) if total_time else 0,
+            "sent": self.sent,
+            "ok": ok,
+            "error_rate": round(errors / self.sent, 4) if self.sent else 0,
+            "statuses": self.statuses,
+            "peak_in_flight": self.peak_in_flight,
+            "latency_ms": {
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": round(latencies[-1], 1) if latencies else None,
+            },
+            "duration_s": round(total_time, 1),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de carga para /webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/webhook")
+    parser.add_argument("--rate", type=float, default=10, help="Requests por segundo (promedio)")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos enviando carga")
+    parser.add_argument("--users", type=int, default=200, help="Usuarios virtuales distintos")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--auth-token", default="stub-token", help="TWILIO_AUTH_TOKEN para firmar")
+    parser.add_argument("--account-sid", default="ACstub")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Salida JSON en una línea")
+    args = parser.parse_args(argv)
+
+    driver = LoadDriver(args.url, args.auth_token, args.rate, args.duration, args.users,
+                        args.timeout, args.account_sid, seed=args.seed)
+    report = asyncio.run(driver.run())
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    latency = report["latency_ms"]
+    print(f"Enviados: {report['sent']} ({report['offered_rate']} req/s ofrecidos, objetivo {args.rate})")
+    print(f"Throughput: {report['throughput']} req/s OK | error rate: {report['error_rate']:.2%}")
+    print(f"Latencia ms: p50={latency['p50']} p90={latency['p90']} p95={latency['p95']} "
+          f"p99={latency['p99']} max={latency['max']}")
+    print(f"Estados: {report['statuses']} | pico en vuelo: {report['peak_in_flight']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Guiones de conversación para los usuarios virtuales del generador de carga"""
+
+CONVERSATIONS = [
+    # Lead completo: saludo → consulta → datos → confirmación
+    [
+        "hola",
+        "Necesito 3 extintores de 5kg para mi oficina en Palermo, cuanto sale?",
+        "me llamo Martina Gomez, mi mail es martina.gomez@gmail.com",
+        "si, al mismo whatsapp esta perfecto",
+        "gracias!!",
+    ],
+    # Consulta técnica sin lead
+    [
+        "Buenas tardes",
+        "la norma IRAM 3517 cada cuanto pide el mantenimiento de los extintores",
+        "y la prueba hidraulica?",
+        "ok gracias",
+    ],
+    # Gastronómico con habilitación
+    [
+        "Hola! tengo un restaurant de 120 m2 y me pidieron habilitacion de bomberos, que necesito",
+        "hacen la visita ustedes?",
+        "Soy Juan Carlos Perez, compras@restaurantelsur.com.ar",
+        "correcto, esos son mis datos",
+    ],
+    # Fuera de tema (topic guardrail)
+    [
+        "hola",
+        "Quien gano el partido de anoche?",
+        "me pasas una receta de empanadas",
+    ],
+    # Mensajes cortos
+    [
+        "hola",
+        "precio recarga matafuego 10kg",
+        "👍",
+    ],
+    # Industrial
+    [
+        "Buen dia",
+        "necesito cotización para instalar sprinklers en una fábrica de 800 metros",
+        "los hidrantes tambien tienen poca presion, revisan bombas?",
+        "mi nombre es Roberto Fernandez y el mail roberto@metalurgicadelsur.com",
+        "exacto",
+    ],
+]
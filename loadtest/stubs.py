@@ -0,0 +1,338 @@
+"""Stubs locales de OpenAI, Pinecone, Twilio y SendGrid para pruebas de carga.
+
+Un solo servidor HTTP (stdlib) atiende todos los vendors por path, con latencia
+log-normal y tasa de errores configurables por endpoint:
+
+    python -m loadtest.stubs --port 9100 \\
+        --latency openai_chat=600:1800 --latency pinecone_query=40:120 \\
+        --errors openai_chat=0.02:429 --errors twilio_messages=0.01:503
+
+`--latency ENDPOINT=MEDIANA_MS:P95_MS` y `--errors ENDPOINT=TASA[:STATUS]`.
+`--print-env` muestra las variables para apuntar la app a los stubs.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+# Latencias por defecto (mediana, p95 en ms), similares a producción
+DEFAULT_LATENCY = {
+    "openai_chat": (700, 2000),
+    "openai_embeddings": (120, 350),
+    "openai_moderation": (150, 400),
+    "pinecone_control": (80, 200),
+    "pinecone_query": (45, 150),
+    "pinecone_upsert": (60, 200),
+    "twilio_messages": (180, 500),
+    "sendgrid_send": (150, 450),
+}
+
+EMBEDDING_DIMENSION = 1536
+INDEX_NAME = "argenfuego-chatbot-knowledge-base"
+
+KNOWLEDGE = [
+    "Extintores ABC de polvo químico seco: aptos para fuegos clase A, B y C. Capacidades de 1, 2.5, 5 y 10 kg.",
+    "Mantenimiento de extintores: según IRAM 3517-2 la recarga y control se realiza anualmente.",
+    "Habilitaciones: asesoramos en la documentación requerida por bomberos y el municipio.",
+    "Instalamos redes de incendio, hidrantes, bombas y sistemas de rociadores (sprinklers).",
+]
+
+CHAT_REPLIES = [
+    "¡Claro! Para una oficina recomendamos extintores ABC de 5 kg 🧯 ¿Me pasás tu nombre y email para enviarte la propuesta?",
+    "La recarga anual incluye control de presión y precinto según IRAM 3517. ¿Cuántos equipos tenés?",
+    "Podemos coordinar una visita técnica sin cargo. ¿En qué zona está el local?",
+    "Perfecto, ya tengo tus datos. En breve el equipo comercial te contacta 📞",
+]
+
+# Vector fijo pre-serializado: evita generar 1536 floats por request
+_EMBEDDING_JSON = json.dumps([round(math.sin(i) / 40, 6) for i in range(EMBEDDING_DIMENSION)])
+
+_INDEX_DESCRIPTION = {
+    "name": INDEX_NAME,
+    "dimension": EMBEDDING_DIMENSION,
+    "metric": "cosine",
+    "host": "",
+    "vector_type": "dense",
+    "deletion_protection": "disabled",
+    "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+    "status": {"ready": True, "state": "Ready"},
+}
+
+
+class StubConfig:
+    """Latencia y errores por endpoint, más contadores de requests atendidos"""
+
+    def __init__(self, latency: Dict[str, Tuple[float, float]], errors: Dict[str, Tuple[float, int]],
+                 seed: Optional[int] = None):
+        self.latency = {**DEFAULT_LATENCY, **latency}
+        self.errors = errors
+        self.random = random.Random(seed)
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def delay_seconds(self, endpoint: str) -> float:
+        """Muestra log-normal a partir de la mediana y el p95 configurados"""
+        median, p95 = self.latency.get(endpoint, (0, 0))
+        if median <= 0:
+            return 0.0
+        sigma = math.log(max(p95, median) / median) / 1.645
+        with self._lock:
+            return self.random.lognormvariate(math.log(median), sigma) / 1000
+
+    def error_status(self, endpoint: str) -> Optional[int]:
+        rate, status = self.errors.get(endpoint, (0.0, 500))
+        with self._lock:
+            return status if self.random.random() < rate else None
+
+    def count(self, endpoint: str, outcome: str):
+        with self._lock:
+            bucket = self.counts.setdefault(endpoint, {})
+            bucket[outcome] = bucket.get(outcome, 0) + 1
+
+
+# (método, regex de path) → endpoint
+ROUTES = [
+    ("POST", re.compile(r"^/v1/chat/completions$"), "openai_chat"),
+    ("POST", re.compile(r"^/v1/embeddings$"), "openai_embeddings"),
+    ("POST", re.compile(r"^/v1/moderations$"), "openai_moderation"),
+    ("GET", re.compile(r"^/indexes/?$"), "pinecone_control"),
+    ("GET", re.compile(r"^/indexes/[^/]+$"), "pinecone_control"),
+    ("POST", re.compile(r"^/query$"), "pinecone_query"),
+    ("POST", re.compile(r"^/vectors/upsert$"), "pinecone_upsert"),
+    ("POST", re.compile(r"^/2010-04-01/Accounts/[^/]+/Messages\.json$"), "twilio_messages"),
+    ("POST", re.compile(r"^/v3/mail/send$"), "sendgrid_send"),
+    ("GET", re.compile(r"^/_stats$"), "stats"),
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # sin access log: a cientos de req/s solo agrega ruido
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        path = self.path.split("?", 1)[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        endpoint = next((name for verb, pattern, name in ROUTES
+                         if verb == method and pattern.match(path)), None)
+        if endpoint is None:
+            self._send(404, {"error": f"stub: ruta no soportada {method} {path}"})
+            return
+        if endpoint == "stats":
+            self._send(200, self.config.counts)
+            return
+
+        time.sleep(self.config.delay_seconds(endpoint))
+        status = self.config.error_status(endpoint)
+        if status is not None:
+            self.config.count(endpoint, str(status))
+            self._send(status, {"error": {"message": "stub: error inyectado", "type": "stub_error"}})
+            return
+
+        body = self._parse_body(raw)
+        handler = getattr(self, f"_{endpoint}")
+        self.config.count(endpoint, "ok")
+        handler(path, body)
+
+    def _parse_body(self, raw: bytes) -> Any:
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw)
+        from urllib.parse import parse_qs
+        return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def _send(self, status: int, payload: Any, raw_json: str = None):
+        data = (raw_json if raw_json is not None else json.dumps(payload)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # --- OpenAI ---
+
+    def _openai_chat(self, path, body):
+        messages = body.get("messages", [])
+        system = messages[0].get("content", "") if messages else ""
+        # Validación de tema (max_tokens chico) → veredicto; si no, respuesta de Eva
+        content = "SÍ" if system.startswith("Eres un validador") else random.choice(CHAT_REPLIES)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "logprobs": None,
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    def _openai_embeddings(self, path, body):
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        tokens = sum(len(text) for text in inputs) // 4
+        data = ",".join(
+            f'{{"object":"embedding","index":{i},"embedding":{_EMBEDDING_JSON}}}' for i in range(len(inputs))
+        )
+        raw = (f'{{"object":"list","data":[{data}],"model":"{body.get("model", "text-embedding-ada-002")}",'
+               f'"usage":{{"prompt_tokens":{tokens},"total_tokens":{tokens}}}}}')
+        self._send(200, None, raw_json=raw)
+
+    def _openai_moderation(self, path, body):
+        self._send(200, {
+            "id": f"modr-{uuid.uuid4().hex[:24]}",
+            "model": "omni-moderation-latest",
+            "results": [{"flagged": False, "categories": {}, "category_scores": {}}]
+        })
+
+    # --- Pinecone ---
+
+    def _pinecone_control(self, path, body):
+        description = {**_INDEX_DESCRIPTION, "host": self.headers.get("Host", "")}
+        if path.rstrip("/") == "/indexes":
+            self._send(200, {"indexes": [description]})
+        else:
+            self._send(200, description)
+
+    def _pinecone_query(self, path, body):
+        top_k = int(body.get("topK", 3))
+        matches = [{
+            "id": f"doc-{i}",
+            "score": round(0.86 - i * 0.05, 4),
+            "values": [],
+            "metadata": {"chunk_text": KNOWLEDGE[i % len(KNOWLEDGE)]}
+        } for i in range(top_k)]
+        self._send(200, {"matches": matches, "namespace": body.get("namespace", ""),
+                         "usage": {"readUnits": 1}})
+
+    def _pinecone_upsert(self, path, body):
+        self._send(200, {"upsertedCount": len(body.get("vectors", []))})
+
+    # --- Twilio / SendGrid ---
+
+    def _twilio_messages(self, path, body):
+        account_sid = path.split("/")[3]
+        self._send(201, {
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": account_sid,
+            "from": body.get("From"),
+            "to": body.get("To"),
+            "body": body.get("Body"),
+            "status": "queued",
+            "num_segments": "1",
+            "direction": "outbound-api",
+            "date_created": time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime()),
+            "uri": f"{path[:-5]}/SM0.json"
+        })
+
+    def _sendgrid_send(self, path, body):
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.send_header("X-Message-Id", uuid.uuid4().hex)
+        self.end_headers()
+
+
+def _parse_pairs(values, parse) -> Dict[str, Any]:
+    parsed = {}
+    for value in values or []:
+        endpoint, _, spec = value.partition("=")
+        if endpoint not in DEFAULT_LATENCY:
+            raise SystemExit(f"Endpoint desconocido '{endpoint}'. Opciones: {', '.join(DEFAULT_LATENCY)}")
+        parsed[endpoint] = parse(spec)
+    return parsed
+
+
+def _latency_spec(spec: str) -> Tuple[float, float]:
+    median, _, p95 = spec.partition(":")
+    return float(median), float(p95 or median)
+
+
+def _error_spec(spec: str) -> Tuple[float, int]:
+    rate, _, status = spec.partition(":")
+    return float(rate), int(status or 500)
+
+
+def env_for(base_url: str) -> Dict[str, str]:
+    """Variables de entorno para que la app use los stubs en base_url"""
+    return {
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_MAX_RETRIES": "0",
+        "PINECONE_API_KEY": "pc-stub",
+        "PINECONE_HOST": base_url,
+        "PINECONE_INDEX_HOST": base_url,
+        "TWILIO_ACCOUNT_SID": "ACstub",
+        "TWILIO_AUTH_TOKEN": "stub-token",
+        "TWILIO_API_BASE_URL": base_url,
+        "SENDGRID_API_KEY": "SG.stub",
+        "SENDGRID_API_BASE_URL": base_url,
+        "HTTP_ENABLE_HTTP2": "false",
+    }
+
+
+def serve(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stubs locales de APIs externas para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", action="append", help="ENDPOINT=MEDIANA_MS:P95_MS (repetible)")
+    parser.add_argument("--errors", action="append", help="ENDPOINT=TASA[:STATUS] (repetible)")
+    parser.add_argument("--no-latency", action="store_true", help="Respuestas inmediatas en todos los endpoints")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--print-env", action="store_true", help="Imprime las variables para la app y sale")
+    args = parser.parse_args(argv)
+
+    base_url = f"http://{args.host}:{args.port}"
+    if args.print_env:
+        for key, value in env_for(base_url).items():
+            print(f"export {key}={value}")
+        return
+
+    latency = {name: (0, 0) for name in DEFAULT_LATENCY} if args.no_latency else {}
+    latency.update(_parse_pairs(args.latency, _latency_spec))
+    config = StubConfig(latency, _parse_pairs(args.errors, _error_spec), seed=args.seed)
+    server = serve(args.host, args.port, config)
+    print(f"Stubs escuchando en {base_url} (contadores en {base_url}/_stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(config.counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
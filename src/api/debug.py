@@ -1,24 +1,74 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from src.services.memory_service import conversation_memory
 from src.services.email_service import email_service
 from src.services.logging_service import logger
-import sendgrid
+from src.services.usage_service import usage_tracker
+from src.services.resilience import breakers
+from src.services.lead_outbox import lead_outbox
+from src.services.rate_limiter import rate_limiter
+from src.services.admission import admission
+from src.services.tenant_service import tenants
+from src.services.profiler import profiler
+from src.services.heap_service import heap_profiler
+from src.services.topic_classifier import topic_classifier
+from src.services.journal_service import journal
+from src.services.deadline import deadlines
+from src.config.settings import (
+    http_client_factory,
+    SENDGRID_CONNECT_TIMEOUT_S,
+    SENDGRID_READ_TIMEOUT_S,
+    SENDGRID_API_BASE_URL
+)
+import json
 import os
 from datetime import datetime
+from typing import Optional
 from sendgrid.helpers.mail import Mail, Email, To, Content
 
 router = APIRouter()
 
+# Estructuras de vida larga que /debug/heap reporta en cada snapshot
+heap_profiler.watch("conversation_memory.user_sessions", lambda: len(conversation_memory.user_sessions))
+heap_profiler.watch("conversation_memory.checkpoints",
+                    lambda: len(getattr(conversation_memory.memory, "storage", None) or {}))
+heap_profiler.watch("usage_tracker.budget_users", lambda: len(usage_tracker.budgets._spend))
+heap_profiler.watch("rate_limiter.tracked_users", lambda: len(rate_limiter._users))
+heap_profiler.watch("logger.openai_calls_keys", lambda: len(logger.metrics["openai_calls"]))
+
 @router.get("/debug/memory")
-async def debug_memory():
-    """Endpoint para debugging del sistema de memoria"""
+async def debug_memory(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    min_age_minutes: Optional[int] = Query(None, ge=0),
+    max_age_minutes: Optional[int] = Query(None, ge=0)
+):
+    """Endpoint para debugging del sistema de memoria (paginado o streaming NDJSON)"""
+    min_age_seconds = min_age_minutes * 60 if min_age_minutes is not None else None
+    max_age_seconds = max_age_minutes * 60 if max_age_minutes is not None else None
+    
     try:
-        sessions = conversation_memory.debug_user_sessions()
+        if format == "ndjson":
+            # Streaming: una sesión por línea, sin construir la respuesta completa en memoria
+            def generate():
+                for item in conversation_memory.iter_user_sessions(min_age_seconds, max_age_seconds):
+                    yield json.dumps(item) + "\n"
+            
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+        
+        sessions, next_cursor = conversation_memory.list_user_sessions(
+            cursor=cursor,
+            limit=limit,
+            min_age_seconds=min_age_seconds,
+            max_age_seconds=max_age_seconds
+        )
         return JSONResponse({
             "status": "success",
             "user_sessions": sessions,
-            "total_sessions": len(sessions)
+            "count": len(sessions),
+            "next_cursor": next_cursor,
+            "total_sessions": len(conversation_memory.user_sessions)
         })
     except Exception as e:
         logger.log_api_failure("debug_memory_endpoint", str(e))
@@ -27,6 +77,173 @@ async def debug_memory():
             "error": str(e)
         }, status_code=500)
 
+@router.get("/debug/memory/summary")
+def debug_memory_summary(top: int = Query(10, ge=0, le=100)):
+    """Resumen de conteos y bytes estimados por sesión y totales (corre en threadpool)"""
+    try:
+        return JSONResponse({
+            "status": "success",
+            **conversation_memory.memory_summary(top_n=top)
+        })
+    except Exception as e:
+        logger.log_api_failure("debug_memory_summary_endpoint", str(e))
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        }, status_code=500)
+
+@router.get("/debug/logging")
+async def debug_logging():
+    """Estado del sink de logs asíncrono (profundidad de cola y descartes)"""
+    return JSONResponse({
+        "status": "success",
+        "log_level": logger.log_level,
+        "log_format": logger.log_format,
+        "sink": logger.get_sink_stats()
+    })
+
+@router.get("/debug/usage")
+async def debug_usage(top: int = Query(10, ge=1, le=100)):
+    """Tokens, costo real acumulado y usuarios con mayor gasto en la ventana de presupuesto"""
+    metrics_snapshot = logger.get_metrics()
+    return JSONResponse({
+        "status": "success",
+        "total_api_cost_usd": metrics_snapshot["total_api_cost_usd"],
+        "avg_cost_per_message_usd": metrics_snapshot["avg_cost_per_message_usd"],
+        "tokens": metrics_snapshot["tokens"],
+        "openai_calls": metrics_snapshot["openai_calls"],
+        "budget": {
+            "window_hours": usage_tracker.budgets.window_seconds / 3600,
+            "downgrade_usd": usage_tracker.downgrade_usd,
+            "throttle_usd": usage_tracker.throttle_usd,
+            "top_spenders": usage_tracker.budgets.top_spenders(top)
+        }
+    })
+
+@router.get("/debug/http")
+async def debug_http():
+    """Estado de los pools HTTP compartidos (saturación, conexiones abiertas/ociosas)"""
+    return JSONResponse({
+        "status": "success",
+        "pools": http_client_factory.pool_stats()
+    })
+
+@router.get("/debug/breakers")
+async def debug_breakers():
+    """Estado de los circuit breakers por dependencia"""
+    return JSONResponse({
+        "status": "success",
+        "breakers": breakers.get_status()
+    })
+
+@router.get("/debug/ratelimit")
+async def debug_rate_limit():
+    """Configuración y estado del rate limiter (tokens globales, usuarios y rechazos)"""
+    return JSONResponse({
+        "status": "success",
+        "rate_limit": rate_limiter.get_status()
+    })
+
+@router.get("/debug/admission")
+async def debug_admission():
+    """Control de admisión: en vuelo, cola y rechazos por etapa, más la cola diferida"""
+    return JSONResponse({
+        "status": "success",
+        "admission": admission.get_status()
+    })
+
+@router.get("/debug/deadline")
+async def debug_deadline():
+    """Presupuesto por request y mínimos de cada etapa degradable (conteos en /metrics)"""
+    return JSONResponse({
+        "status": "success",
+        "deadline": deadlines.get_status()
+    })
+
+@router.get("/debug/tenants")
+async def debug_tenants():
+    """Tenants configurados con requests y sesiones en memoria de cada uno"""
+    return JSONResponse({
+        "status": "success",
+        **tenants.get_status()
+    })
+
+@router.get("/debug/profile")
+async def debug_profile():
+    """Estado del profiler y perfiles capturados (sin stacks)"""
+    if not profiler.enabled:
+        return JSONResponse({"status": "disabled", "error": "PROFILING_ENABLED=false"}, status_code=404)
+    return JSONResponse({"status": "success", "profiler": profiler.get_status()})
+
+@router.post("/debug/profile")
+async def debug_profile_arm(requests: int = Query(5, ge=0), interval_ms: float = Query(10, gt=0)):
+    """Perfila los próximos N mensajes (acotado por PROFILING_MAX_REQUESTS y el intervalo mínimo)"""
+    if not profiler.enabled:
+        return JSONResponse({"status": "disabled", "error": "PROFILING_ENABLED=false"}, status_code=404)
+    return JSONResponse({"status": "success", "profiler": profiler.arm(requests, interval_ms)})
+
+@router.get("/debug/profile/collapsed")
+async def debug_profile_collapsed(id: Optional[str] = None):
+    """Stacks colapsados ('a;b;c N') de un perfil o de todos sumados, listos para flamegraph.pl/speedscope"""
+    if not profiler.enabled:
+        return PlainTextResponse("profiling disabled\n", status_code=404)
+    if id is not None and profiler.get_profile(id) is None:
+        return PlainTextResponse(f"profile {id} not found\n", status_code=404)
+    return PlainTextResponse(profiler.merged([id] if id else None))
+
+@router.get("/debug/heap")
+def debug_heap(
+    top: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename)$"),
+    traceback_lines: int = Query(1, ge=1, le=25),
+    reset_baseline: bool = False
+):
+    """Top de asignaciones (tracemalloc), diff con el snapshot anterior y objetos por clase (corre en threadpool)"""
+    if not heap_profiler.enabled:
+        return JSONResponse({"status": "disabled", "error": "HEAP_PROFILING_ENABLED=false"}, status_code=404)
+    try:
+        return JSONResponse({
+            "status": "success",
+            **heap_profiler.report(top=top, group_by=group_by, traceback_lines=traceback_lines,
+                                   reset_baseline=reset_baseline)
+        })
+    except Exception as e:
+        logger.log_api_failure("debug_heap_endpoint", str(e))
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        }, status_code=500)
+
+@router.get("/debug/topic")
+def debug_topic(mensaje: Optional[str] = None, tenant: Optional[str] = None):
+    """Estado del clasificador de tema; con ?mensaje= devuelve decisión y margen (para calibrar la banda)"""
+    result = {"status": "success", "classifier": topic_classifier.get_status()}
+    if mensaje:
+        with tenants.use(tenants.get(tenant)):
+            score = topic_classifier.score(mensaje)
+        result["score"] = {
+            "decision": score.decision,
+            "margin": round(score.margin, 4) if score.margin is not None else None
+        }
+    return JSONResponse(result)
+
+@router.get("/debug/journal")
+async def debug_journal():
+    """Journal de conversaciones: cola, registros escritos, descartes y segmento activo"""
+    return JSONResponse({
+        "status": "success",
+        "journal": journal.get_stats()
+    })
+
+@router.get("/debug/outbox")
+def debug_outbox(limit: int = Query(20, ge=1, le=200)):
+    """Estado del outbox de leads: pendientes, enviados, descartados y últimos errores"""
+    return JSONResponse({
+        "status": "success",
+        "outbox": lead_outbox.stats(),
+        "recent_failures": lead_outbox.recent_failures(limit)
+    })
+
 @router.get("/debug/sendgrid")
 async def debug_sendgrid():
     """Endpoint para testing conexión SendGrid API"""
@@ -51,7 +268,11 @@ async def debug_sendgrid():
         try:
             logger.info("sendgrid_api_test_started", api_key_prefix=sendgrid_api_key[:10])
             
-            sg = sendgrid.SendGridAPIClient(api_key=sendgrid_api_key)
+            # Mismo cliente pooled que usa el servicio de email
+            sg = email_service.client or http_client_factory.sendgrid_client(
+                sendgrid_api_key, SENDGRID_CONNECT_TIMEOUT_S, SENDGRID_READ_TIMEOUT_S,
+                base_url=SENDGRID_API_BASE_URL
+            )
             
             # Crear email de prueba
             from_email = Email(email_service.sender_email, email_service.sender_name)
@@ -80,6 +301,30 @@ async def debug_sendgrid():
             
             response = sg.send(mail)
             
+            if response.status_code == 400:
+                logger.log_api_failure("sendgrid_bad_request", response.text)
+                return JSONResponse({
+                    "status": "error",
+                    "error_type": "bad_request",
+                    "message": "SendGrid API request error. Check API key and email addresses",
+                    "details": response.text,
+                    "env_variables": env_status
+                }, status_code=400)
+            
+            if response.status_code in (401, 403):
+                logger.log_api_failure("sendgrid_auth_error", response.text)
+                return JSONResponse({
+                    "status": "error", 
+                    "error_type": "authentication",
+                    "message": "SendGrid API authentication failed. Check SENDGRID_API_KEY",
+                    "details": response.text,
+                    "suggestion": "Verify API key is correct and has send permissions",
+                    "env_variables": env_status
+                }, status_code=401)
+            
+            if response.status_code >= 300:
+                raise RuntimeError(f"Status: {response.status_code}, Body: {response.text}")
+            
             logger.info("sendgrid_test_successful", 
                        recipient=email_service.recipient,
                        status_code=response.status_code)
@@ -92,27 +337,6 @@ async def debug_sendgrid():
                 "env_variables": env_status
             })
             
-        except sendgrid.exceptions.BadRequestsError as e:
-            logger.log_api_failure("sendgrid_bad_request", str(e))
-            return JSONResponse({
-                "status": "error",
-                "error_type": "bad_request",
-                "message": "SendGrid API request error. Check API key and email addresses",
-                "details": str(e),
-                "env_variables": env_status
-            }, status_code=400)
-            
-        except sendgrid.exceptions.UnauthorizedError as e:
-            logger.log_api_failure("sendgrid_auth_error", str(e))
-            return JSONResponse({
-                "status": "error", 
-                "error_type": "authentication",
-                "message": "SendGrid API authentication failed. Check SENDGRID_API_KEY",
-                "details": str(e),
-                "suggestion": "Verify API key is correct and has send permissions",
-                "env_variables": env_status
-            }, status_code=401)
-            
         except Exception as e:
             logger.log_api_failure("sendgrid_general_error", str(e))
             return JSONResponse({
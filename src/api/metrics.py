@@ -0,0 +1,27 @@
+import os
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, JSONResponse
+from src.services.metrics_service import metrics
+from src.services.logging_service import logger
+from src.config.settings import WORKER_ID
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Métricas en formato de exposición de texto de Prometheus"""
+    return PlainTextResponse(metrics.render_prometheus(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/debug/metrics")
+async def debug_metrics():
+    """Métricas agregadas con percentiles p50/p95/p99 en JSON"""
+    return JSONResponse({
+        "status": "success",
+        **logger.get_metrics()
+    })
+
+@router.get("/health")
+async def health():
+    """Liveness: responde mientras el event loop no esté bloqueado (lo usa el front multi-proceso)"""
+    return JSONResponse({"status": "ok", "worker": WORKER_ID or None, "pid": os.getpid()})
@@ -1,32 +1,61 @@
-from fastapi import APIRouter, Form
+from typing import Optional
+import json
+from fastapi import APIRouter, Form, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from src.services.chatbot_service import chatbot_service
 from src.services.rag_service import get_rag_manager
+from src.services.tenant_service import tenants
+from src.services.profiler import profiler
+from src.services.batch_eval import batch_evaluator, parse_items, BatchInputError
+from src.config.settings import PROFILING_HEADER
 
 router = APIRouter()
 
 @router.post("/test")
-async def probar_chatbot(mensaje: str = Form()):
+async def probar_chatbot(request: Request, mensaje: str = Form(), tenant: Optional[str] = Form(None)):
     """Probar el chatbot con RAG y guardrails sin WhatsApp"""
     # Usar user_id temporal para testing
-    respuesta = chatbot_service.procesar_mensaje(mensaje, "test_user")
+    with tenants.use(tenants.get(tenant)), profiler.requested(request.headers.get(PROFILING_HEADER)):
+        respuesta = await run_in_threadpool(chatbot_service.procesar_mensaje, mensaje, "test_user")
     return {"mensaje": mensaje, "respuesta": respuesta}
 
 @router.get("/test-simple")
-async def probar_chatbot_simple(mensaje: str, user_id: str = "test_user"):
-    """Probar el chatbot usando query parameter con user_id opcional"""
-    respuesta = chatbot_service.procesar_mensaje(mensaje, user_id)
-    return {"mensaje": mensaje, "respuesta": respuesta, "user_id": user_id}
+async def probar_chatbot_simple(request: Request, mensaje: str, user_id: str = "test_user",
+                                tenant: Optional[str] = None):
+    """Probar el chatbot usando query parameter con user_id y tenant opcionales"""
+    with tenants.use(tenants.get(tenant)) as active, profiler.requested(request.headers.get(PROFILING_HEADER)):
+        respuesta = await run_in_threadpool(chatbot_service.procesar_mensaje, mensaje, user_id)
+    return {"mensaje": mensaje, "respuesta": respuesta, "user_id": user_id, "tenant": active.id}
+
+@router.post("/test-batch")
+async def probar_chatbot_batch(request: Request, concurrency: int = Query(4, ge=1),
+                               fresh_sessions: bool = True):
+    """Evalúa un set JSONL ({"user_id","message"} o {"user_id","messages":[...]}) y devuelve NDJSON
+    con respuesta, tiempos por etapa y costo por mensaje, más un resumen al final"""
+    body = (await request.body()).decode("utf-8")
+    try:
+        items = parse_items(body.splitlines())
+    except BatchInputError as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=400)
+    
+    # Generador sync: StreamingResponse lo itera en el threadpool, línea por línea
+    lines = (json.dumps(result, ensure_ascii=False) + "\n"
+             for result in batch_evaluator.run(items, concurrency, fresh_sessions))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @router.get("/status")
-async def estado_rag():
-    """Verifica el estado de la base de conocimiento"""
+async def estado_rag(tenant: Optional[str] = None):
+    """Verifica el estado de la base de conocimiento (del tenant indicado o el default)"""
     try:
-        stats = get_rag_manager().index.describe_index_stats()
+        rag_manager = get_rag_manager(tenants.get(tenant))
+        stats = rag_manager.index.describe_index_stats()
         return {
             "indice_activo": True,
             "vectores_almacenados": stats.total_vector_count,
-            "dimensiones": get_rag_manager().dimension,
-            "namespace": get_rag_manager().namespace
+            "dimensiones": rag_manager.dimension,
+            "indice": rag_manager.index_name,
+            "namespace": rag_manager.namespace
         }
     except Exception as e:
         return {"error": f"Error verificando estado: {str(e)}"}
@@ -39,6 +68,8 @@ async def inicio():
             "webhook": "/webhook",
             "probar": "/test",
             "probar_simple": "/test-simple",
-            "estado": "/status"
+            "probar_batch": "/test-batch",
+            "estado": "/status",
+            "metricas": "/metrics"
         }
     }
\ No newline at end of file
@@ -1,54 +1,104 @@
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Request
 from fastapi.responses import PlainTextResponse
-from src.config.settings import twilio_client
+from starlette.concurrency import run_in_threadpool
+from src.config.settings import twilio_client, http_client_factory
+from src.services.tenant_service import tenants
 from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tracing_service import tracer
+from src.services.usage_service import usage_tracker
+from src.services.fast_path import inbound_fast_path, media_content_types
+from src.services.profiler import profiler
+from src.config.settings import PROFILING_HEADER
 import time
 from src.services.chatbot_service import chatbot_service
+from src.services.guardrails_service import guardrails_service
+from src.services.deadline import deadlines
 
 router = APIRouter()
 
+def enviar_whatsapp(numero: str, mensaje: str):
+    """Envía la respuesta por Twilio WhatsApp desde el número del tenant (bloqueante: llamar desde un thread)"""
+    with tracer.span("twilio_send"), metrics.time_dependency("twilio_send"):
+        twilio_client.messages.create(
+            from_=f"whatsapp:{tenants.current().whatsapp_number}",
+            to=f"whatsapp:{numero}",
+            body=mensaje
+        )
+
+# Respuestas procesadas en diferido (load shedding) salen por el mismo canal
+chatbot_service.reply_sender = enviar_whatsapp
+# El envío usa lo que queda del deadline del request (sin deadline, TWILIO_TIMEOUT_S)
+http_client_factory.twilio_timeout_hook = deadlines.send_timeout
+
 @router.post("/webhook")
-async def recibir_mensaje(Body: str = Form(), From: str = Form()):
+async def recibir_mensaje(request: Request):
     """Webhook principal de WhatsApp con RAG y guardrails"""
-    numero = From.replace("whatsapp:", "")
+    form = await request.form()
+    # Twilio manda Body vacío en audios, imágenes y stickers; NumMedia indica los adjuntos
+    Body = form.get("Body") or ""
+    numero = form.get("From", "").replace("whatsapp:", "")
+    media_types = media_content_types(form)
+    # El número que recibió el mensaje define el negocio (tenant) que responde
+    tenant = tenants.resolve(form.get("To", ""))
     start_time = time.time()
     
-    logger.info("message_received", user_id=numero, message_preview=Body[:50] + "...")
-    
-    # 🧠 ChatGPT + RAG + Guardrails + LangGraph
-    respuesta_ia = chatbot_service.procesar_mensaje(Body, numero)
-    
-    # Final safety check: ensure response is never None or empty
-    if respuesta_ia is None or respuesta_ia.strip() == "":
-        logger.log_api_failure("webhook_null_response", f"Chatbot returned None/empty for user {numero}")
-        respuesta_ia = "Disculpa, tuve un problema técnico. ¿Puedo ayudarte con algo sobre seguridad contra incendios? 🔥"
-    
-    # 📱 Enviar respuesta por WhatsApp
-    twilio_client.messages.create(
-        from_="whatsapp:+5491147361881",
-        to=From,
-        body=respuesta_ia
-    )
-    
-    # Calcular tiempo de respuesta
-    response_time = int((time.time() - start_time) * 1000)
-    
-    # Safe token calculation
-    try:
-        tokens_used = len(Body.split()) + len(respuesta_ia.split()) if respuesta_ia else len(Body.split())
-    except:
-        tokens_used = len(Body.split())  # Fallback
+    # Traza por request: cada etapa del pipeline queda como span. El deadline acota la suma
+    # de todas las etapas (guardrails, RAG, completion, envío), no cada una por separado
+    with deadlines.start() as deadline, tenants.use(tenant), \
+            tracer.trace("webhook", user_id=numero, tenant=tenant.id) as trace, \
+            usage_tracker.track_request(numero) as usage:
+        logger.info("message_received", user_id=numero, tenant=tenant.id, num_media=len(media_types),
+                    message_preview=lambda: Body[:50] + "...")
         
-    logger.log_message_processed(
-        user_id=numero,
-        response_time=response_time, 
-        tokens_used=tokens_used,
-        cost=0.002,  # Estimación promedio
-        rag_used=True,
-        guardrails_passed=True
-    )
-    
-    # Safe preview generation
-    response_preview = respuesta_ia[:50] + "..." if respuesta_ia and len(respuesta_ia) > 50 else (respuesta_ia or "")
-    logger.info("message_sent", user_id=numero, response_preview=response_preview)
+        # ⚡ Media sin texto o mensaje vacío: respuesta fija, sin llamadas a OpenAI
+        fast_reply = inbound_fast_path.classify(Body, media_types)
+        if fast_reply is not None:
+            tracer.set_attribute("fast_path", fast_reply.kind)
+            logger.info("fast_path_reply", user_id=numero, kind=fast_reply.kind, media_types=media_types)
+            respuesta_ia = fast_reply.reply
+        else:
+            # 🧠 ChatGPT + RAG + Guardrails + LangGraph (pipeline bloqueante: fuera del event loop)
+            with profiler.requested(request.headers.get(PROFILING_HEADER)):
+                respuesta_ia = await run_in_threadpool(chatbot_service.procesar_mensaje, Body, numero)
+        
+        # Final safety check: ensure response is never None or empty
+        if respuesta_ia is None or respuesta_ia.strip() == "":
+            logger.log_api_failure("webhook_null_response", f"Chatbot returned None/empty for user {numero}")
+            respuesta_ia = "Disculpa, tuve un problema técnico. ¿Puedo ayudarte con algo sobre seguridad contra incendios? 🔥"
+        
+        # 📱 Enviar respuesta por WhatsApp
+        await run_in_threadpool(enviar_whatsapp, numero, respuesta_ia)
+        
+        # Calcular tiempo de respuesta
+        response_time = int((time.time() - start_time) * 1000)
+        
+        # Tokens y costo reales reportados por OpenAI durante el request
+        logger.log_message_processed(
+            user_id=numero,
+            response_time=response_time, 
+            tokens_used=usage.total_tokens,
+            cost=round(usage.cost, 6),
+            rag_used=fast_reply is None,
+            guardrails_passed=True,
+            trace_id=trace.trace_id
+        )
+        
+        # Turno completo al journal (solo encola: la escritura comprimida va en background)
+        match_ids = trace.span_attribute("vector_query", "match_ids")
+        await guardrails_service.log_conversation_async(numero, Body, respuesta_ia, metadata={
+            "trace_id": trace.trace_id,
+            "tenant": tenant.id,
+            "handled_by": fast_reply.kind if fast_reply else trace.root.attributes.get("intent", "pipeline"),
+            "rag_match_ids": match_ids.split(",") if match_ids else [],
+            "stage_ms": trace.stage_timings(),
+            "degradations": list(deadline.degradations) if deadline else [],
+            "response_time_ms": response_time,
+            "tokens": usage.total_tokens,
+            "cost_usd": round(usage.cost, 6)
+        })
+        
+        # Safe preview generation (lazy: solo si el nivel INFO está activo)
+        logger.info("message_sent", user_id=numero,
+                    response_preview=lambda: respuesta_ia[:50] + "..." if len(respuesta_ia) > 50 else respuesta_ia)
     return PlainTextResponse("", status_code=200)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import re
+import threading
+import importlib.util
+from typing import Any, Callable, Dict, Optional
+import httpx
+
+# HTTP/2 requiere el extra httpx[http2] (paquete h2); sin él se usa HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_TWILIO_HOST = re.compile(r"^https://[a-z0-9.-]+\.twilio\.com")
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """Transporte httpx que cuenta requests en vuelo para medir saturación del pool"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return super().handle_request(request)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        connections = getattr(self._pool, "connections", [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "http2_connections": sum(1 for conn in connections if "HTTP/2" in repr(conn))
+        }
+
+
+class SendGridHttpClient:
+    """Cliente mínimo de SendGrid v3 sobre el pool httpx compartido (keep-alive entre envíos)"""
+
+    def __init__(self, api_key: str, http_client: httpx.Client):
+        self.api_key = api_key
+        self.http = http_client
+
+    def send(self, mail) -> httpx.Response:
+        """Envía un `sendgrid.helpers.mail.Mail` y devuelve la respuesta HTTP"""
+        return self.http.post(
+            "/v3/mail/send",
+            json=mail.get(),
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+
+
+class HttpClientFactory:
+    """Fábrica central de clientes HTTP: pools keep-alive y timeouts explícitos por dependencia"""
+
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float, http2: bool):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._httpx_clients: Dict[str, httpx.Client] = {}
+        self._transports: Dict[str, InstrumentedTransport] = {}
+        self._requests_adapters: Dict[str, Any] = {}
+        self._pinecone_config: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # Timeout por request para Twilio (el SDK no lo acepta por llamada): recibe el default
+        self.twilio_timeout_hook: Optional[Callable[[float], float]] = None
+
+    def httpx_client(self, name: str, connect_timeout: float, read_timeout: float,
+                     base_url: str = "", http2: Optional[bool] = None) -> httpx.Client:
+        """Cliente httpx con nombre, creado una sola vez y compartido por todo el proceso"""
+        with self._lock:
+            client = self._httpx_clients.get(name)
+            if client is not None:
+                return client
+
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )
+            transport = InstrumentedTransport(
+                limits=limits,
+                http2=self.http2 if http2 is None else (http2 and HTTP2_AVAILABLE)
+            )
+            client = httpx.Client(
+                base_url=base_url,
+                transport=transport,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout,
+                                      pool=connect_timeout)
+            )
+            self._httpx_clients[name] = client
+            self._transports[name] = transport
+            return client
+
+    def openai_client(self, api_key: str, connect_timeout: float, read_timeout: float,
+                      max_retries: int, base_url: Optional[str] = None):
+        from openai import OpenAI
+
+        http_client = self.httpx_client("openai", connect_timeout, read_timeout)
+        return OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            timeout=http_client.timeout,
+            max_retries=max_retries
+        )
+
+    def twilio_client(self, account_sid: str, auth_token: str, timeout: float, max_retries: int = 0,
+                      base_url: str = ""):
+        from requests.adapters import HTTPAdapter
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        http_client = TwilioHttpClient(pool_connections=True, timeout=timeout)
+        # El SDK usa requests: se monta un adapter con el mismo tamaño de pool
+        adapter = HTTPAdapter(pool_connections=self.max_keepalive, pool_maxsize=self.max_connections,
+                              max_retries=max_retries)
+        http_client.session.mount("https://", adapter)
+        self._requests_adapters["twilio"] = adapter
+        
+        if base_url:
+            # El SDK arma URLs absolutas a *.twilio.com: se reescriben hacia base_url
+            http_client.session.mount("http://", adapter)
+        send = http_client.request
+        
+        def request(method, url, *args, **kwargs):
+            if base_url:
+                url = _TWILIO_HOST.sub(base_url.rstrip("/"), url, count=1)
+            if self.twilio_timeout_hook is not None and kwargs.get("timeout") is None:
+                kwargs["timeout"] = self.twilio_timeout_hook(timeout)
+            return send(method, url, *args, **kwargs)
+        http_client.request = request
+        return Client(account_sid, auth_token, http_client=http_client)
+
+    def sendgrid_client(self, api_key: str, connect_timeout: float, read_timeout: float,
+                        base_url: str = "https://api.sendgrid.com") -> SendGridHttpClient:
+        http_client = self.httpx_client("sendgrid", connect_timeout, read_timeout, base_url=base_url)
+        return SendGridHttpClient(api_key, http_client)
+
+    def pinecone_options(self, connect_timeout: float, read_timeout: float) -> Dict[str, Any]:
+        """Parámetros de pool y timeout para el SDK de Pinecone (urllib3 propio, sin HTTP/2)"""
+        self._pinecone_config = {
+            "pool_threads": self.max_keepalive,
+            "connection_pool_maxsize": self.max_connections,
+            "request_timeout": (connect_timeout, read_timeout)
+        }
+        return dict(self._pinecone_config)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Estado de cada pool: requests en vuelo, conexiones abiertas/ociosas"""
+        stats: Dict[str, Any] = {
+            "limits": {
+                "max_connections": self.max_connections,
+                "max_keepalive": self.max_keepalive,
+                "http2_enabled": self.http2
+            }
+        }
+        for name, transport in self._transports.items():
+            pool = transport.pool_stats()
+            pool["saturation"] = round(pool["in_flight"] / self.max_connections, 2)
+            stats[name] = pool
+        for name, adapter in self._requests_adapters.items():
+            container = adapter.poolmanager.pools
+            pools = [container[key] for key in container.keys()]
+            stats[name] = {
+                "hosts": len(pools),
+                "open_connections": sum(pool.num_connections for pool in pools),
+                "idle_connections": sum(pool.pool.qsize() for pool in pools if pool.pool is not None),
+                "requests": sum(pool.num_requests for pool in pools)
+            }
+        if self._pinecone_config:
+            stats["pinecone"] = {k: v for k, v in self._pinecone_config.items() if k != "request_timeout"}
+        return stats
@@ -1,28 +1,213 @@
-from twilio.rest import Client
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from src.config.http_clients import HttpClientFactory
 
 load_dotenv()
 
-twilio_client = Client(
+# Transporte HTTP compartido: pools keep-alive dimensionados a la concurrencia del worker
+HTTP_POOL_MAX_CONNECTIONS = int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", "40"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_S", "60"))
+HTTP_ENABLE_HTTP2 = os.environ.get("HTTP_ENABLE_HTTP2", "true").lower() == "true"
+
+# Timeouts por dependencia (segundos)
+OPENAI_CONNECT_TIMEOUT_S = float(os.environ.get("OPENAI_CONNECT_TIMEOUT_S", "3"))
+OPENAI_READ_TIMEOUT_S = float(os.environ.get("OPENAI_READ_TIMEOUT_S", "20"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+PINECONE_CONNECT_TIMEOUT_S = float(os.environ.get("PINECONE_CONNECT_TIMEOUT_S", "2"))
+PINECONE_READ_TIMEOUT_S = float(os.environ.get("PINECONE_READ_TIMEOUT_S", "5"))
+TWILIO_TIMEOUT_S = float(os.environ.get("TWILIO_TIMEOUT_S", "10"))
+SENDGRID_CONNECT_TIMEOUT_S = float(os.environ.get("SENDGRID_CONNECT_TIMEOUT_S", "3"))
+SENDGRID_READ_TIMEOUT_S = float(os.environ.get("SENDGRID_READ_TIMEOUT_S", "10"))
+
+# Endpoints alternativos (p.ej. los stubs locales de loadtest/); vacío = API real del vendor
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+TWILIO_API_BASE_URL = os.environ.get("TWILIO_API_BASE_URL", "")
+PINECONE_HOST = os.environ.get("PINECONE_HOST") or None
+PINECONE_INDEX_HOST = os.environ.get("PINECONE_INDEX_HOST", "")
+SENDGRID_API_BASE_URL = os.environ.get("SENDGRID_API_BASE_URL", "https://api.sendgrid.com")
+
+http_client_factory = HttpClientFactory(
+    max_connections=HTTP_POOL_MAX_CONNECTIONS,
+    max_keepalive=HTTP_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+    http2=HTTP_ENABLE_HTTP2
+)
+
+twilio_client = http_client_factory.twilio_client(
     os.environ["TWILIO_ACCOUNT_SID"],
-    os.environ["TWILIO_AUTH_TOKEN"]
+    os.environ["TWILIO_AUTH_TOKEN"],
+    timeout=TWILIO_TIMEOUT_S,
+    base_url=TWILIO_API_BASE_URL
 )
 
-openai_client = OpenAI(
-    api_key=os.environ["OPENAI_API_KEY"]
+openai_client = http_client_factory.openai_client(
+    api_key=os.environ["OPENAI_API_KEY"],
+    connect_timeout=OPENAI_CONNECT_TIMEOUT_S,
+    read_timeout=OPENAI_READ_TIMEOUT_S,
+    max_retries=OPENAI_MAX_RETRIES,
+    base_url=OPENAI_BASE_URL
 )
 
 PINECONE_API_KEY = os.environ["PINECONE_API_KEY"]
 PINECONE_NAMESPACE = os.environ.get("PINECONE_NAMESPACE", "default")
+PINECONE_INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME", "argenfuego-chatbot-knowledge-base")
+TWILIO_WHATSAPP_NUMBER = os.environ.get("TWILIO_WHATSAPP_NUMBER", "+5491147361881")
 
 # Guardrails configurables
 ENABLE_INPUT_MODERATION = os.environ.get("ENABLE_INPUT_MODERATION", "false").lower() == "true"
 ENABLE_TOPIC_VALIDATION = os.environ.get("ENABLE_TOPIC_VALIDATION", "true").lower() == "true"
 ENABLE_OUTPUT_MODERATION = os.environ.get("ENABLE_OUTPUT_MODERATION", "false").lower() == "true"
 
+# Clasificador de tema por embeddings: decide solo fuera de la banda [LOW, HIGH] del margen
+# (similitud on-topic - off-topic) y consulta al LLM solo adentro. El vector se reusa en el RAG
+TOPIC_CLASSIFIER_ENABLED = os.environ.get("TOPIC_CLASSIFIER_ENABLED", "false").lower() == "true"
+TOPIC_CLASSIFIER_LOW = float(os.environ.get("TOPIC_CLASSIFIER_LOW", "-0.02"))
+TOPIC_CLASSIFIER_HIGH = float(os.environ.get("TOPIC_CLASSIFIER_HIGH", "0.03"))
+TOPIC_CLASSIFIER_TOP_K = int(os.environ.get("TOPIC_CLASSIFIER_TOP_K", "3"))
+TOPIC_CLASSIFIER_KB_SAMPLES = int(os.environ.get("TOPIC_CLASSIFIER_KB_SAMPLES", "20"))
+TOPIC_CLASSIFIER_EXEMPLARS_FILE = os.environ.get("TOPIC_CLASSIFIER_EXEMPLARS_FILE", "")
+
 # Logging configurables
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 LOG_FORMAT = os.environ.get("LOG_FORMAT", "JSON").upper()
-LOG_PII_MASKING = os.environ.get("LOG_PII_MASKING", "true").lower() == "true"
\ No newline at end of file
+LOG_PII_MASKING = os.environ.get("LOG_PII_MASKING", "true").lower() == "true"
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL_MS = int(os.environ.get("LOG_FLUSH_INTERVAL_MS", "200"))
+
+# Tracing configurable
+TRACE_SLOW_MS = int(os.environ.get("TRACE_SLOW_MS", "3000"))
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "")  # p.ej. http://localhost:4318/v1/traces
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "argenfuego-chatbot")
+
+# Costos y presupuestos por usuario
+MODEL_PRICES_JSON = os.environ.get("MODEL_PRICES_JSON", "")  # {"modelo": [input_usd_1M, output_usd_1M]}
+USER_BUDGET_WINDOW_HOURS = float(os.environ.get("USER_BUDGET_WINDOW_HOURS", "24"))
+USER_BUDGET_DOWNGRADE_USD = float(os.environ.get("USER_BUDGET_DOWNGRADE_USD", "0.05"))
+USER_BUDGET_THROTTLE_USD = float(os.environ.get("USER_BUDGET_THROTTLE_USD", "0.25"))
+USER_BUDGET_DOWNGRADE_MODEL = os.environ.get("USER_BUDGET_DOWNGRADE_MODEL", "gpt-4o-mini")
+USER_BUDGET_DOWNGRADE_MAX_TOKENS = int(os.environ.get("USER_BUDGET_DOWNGRADE_MAX_TOKENS", "80"))
+USER_BUDGET_MAX_USERS = int(os.environ.get("USER_BUDGET_MAX_USERS", "10000"))
+
+# Router de modelos (JSON con lista de reglas; "[]" usa siempre el modelo por defecto)
+MODEL_ROUTER_RULES = os.environ.get("MODEL_ROUTER_RULES", "")
+MODEL_ROUTER_RULES_FILE = os.environ.get("MODEL_ROUTER_RULES_FILE", "")
+
+# Multi-tenant: JSON con la lista de tenants (número de WhatsApp, índice, namespace,
+# destinatario de leads, prompt). Sin archivo, un único tenant con la config de arriba
+TENANTS_FILE = os.environ.get("TENANTS_FILE", "")
+
+# Router de intents deterministas (JSON con lista de intents; sin configurar usa los default)
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_ROUTER_INTENTS = os.environ.get("INTENT_ROUTER_INTENTS", "")
+INTENT_ROUTER_FILE = os.environ.get("INTENT_ROUTER_FILE", "")
+
+# Deadline por request (desde que llega al webhook): cada etapa usa solo lo que queda y las
+# degradables se degradan si el presupuesto restante es menor a su mínimo (segundos)
+DEADLINE_ENABLED = os.environ.get("DEADLINE_ENABLED", "true").lower() == "true"
+DEADLINE_WEBHOOK_S = float(os.environ.get("DEADLINE_WEBHOOK_S", "12"))
+DEADLINE_SEND_RESERVE_S = float(os.environ.get("DEADLINE_SEND_RESERVE_S", "2"))
+DEADLINE_MIN_TIMEOUT_S = float(os.environ.get("DEADLINE_MIN_TIMEOUT_S", "0.5"))
+DEADLINE_TOPIC_LLM_MIN_S = float(os.environ.get("DEADLINE_TOPIC_LLM_MIN_S", "8"))
+DEADLINE_RAG_MIN_S = float(os.environ.get("DEADLINE_RAG_MIN_S", "6"))
+DEADLINE_FULL_COMPLETION_S = float(os.environ.get("DEADLINE_FULL_COMPLETION_S", "5"))
+DEADLINE_COMPLETION_MIN_S = float(os.environ.get("DEADLINE_COMPLETION_MIN_S", "3"))
+DEADLINE_CAPPED_MAX_TOKENS = int(os.environ.get("DEADLINE_CAPPED_MAX_TOKENS", "80"))
+
+# Resiliencia: circuit breakers por dependencia y hedging opcional (0 = deshabilitado)
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.environ.get("BREAKER_RECOVERY_SECONDS", "30"))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.environ.get("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+HEDGE_EMBEDDINGS_MS = int(os.environ.get("HEDGE_EMBEDDINGS_MS", "0"))
+HEDGE_PINECONE_MS = int(os.environ.get("HEDGE_PINECONE_MS", "0"))
+RAG_CONTEXT_CACHE_SIZE = int(os.environ.get("RAG_CONTEXT_CACHE_SIZE", "500"))
+
+# Outbox de leads (SQLite): el request solo registra, el envío va en background con reintentos
+LEAD_OUTBOX_PATH = os.environ.get("LEAD_OUTBOX_PATH", "lead_outbox.sqlite3")
+LEAD_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("LEAD_OUTBOX_MAX_ATTEMPTS", "8"))
+LEAD_OUTBOX_BACKOFF_BASE_S = float(os.environ.get("LEAD_OUTBOX_BACKOFF_BASE_S", "5"))
+LEAD_OUTBOX_BACKOFF_MAX_S = float(os.environ.get("LEAD_OUTBOX_BACKOFF_MAX_S", "900"))
+LEAD_OUTBOX_POLL_INTERVAL_S = float(os.environ.get("LEAD_OUTBOX_POLL_INTERVAL_S", "2"))
+# Una fila 'sending' sin resultado pasado este tiempo se da por abandonada (proceso caído) y se re-encola
+LEAD_OUTBOX_CLAIM_LEASE_S = float(os.environ.get("LEAD_OUTBOX_CLAIM_LEASE_S", "300"))
+
+# Digest de leads: los no urgentes se agrupan en un email con tabla + CSV
+LEAD_DIGEST_ENABLED = os.environ.get("LEAD_DIGEST_ENABLED", "false").lower() == "true"
+LEAD_DIGEST_MAX_LEADS = int(os.environ.get("LEAD_DIGEST_MAX_LEADS", "25"))
+LEAD_DIGEST_MAX_WAIT_S = float(os.environ.get("LEAD_DIGEST_MAX_WAIT_S", "900"))
+LEAD_URGENT_KEYWORDS = [
+    keyword.strip().lower()
+    for keyword in os.environ.get(
+        "LEAD_URGENT_KEYWORDS", "urgente,urgencia,hoy mismo,inmediato,clausura,clausurar,vencido,vencida"
+    ).split(",")
+    if keyword.strip()
+]
+
+# Rate limiting por token bucket (por usuario y global), antes de guardrails y LLM
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_USER_BURST = float(os.environ.get("RATE_LIMIT_USER_BURST", "6"))
+RATE_LIMIT_USER_PER_MINUTE = float(os.environ.get("RATE_LIMIT_USER_PER_MINUTE", "10"))
+RATE_LIMIT_GLOBAL_BURST = float(os.environ.get("RATE_LIMIT_GLOBAL_BURST", "100"))
+RATE_LIMIT_GLOBAL_PER_SECOND = float(os.environ.get("RATE_LIMIT_GLOBAL_PER_SECOND", "30"))
+RATE_LIMIT_MAX_USERS = int(os.environ.get("RATE_LIMIT_MAX_USERS", "50000"))
+
+# Control de admisión por etapa cara: "etapa=en_vuelo:cola:espera_s", separados por coma
+ADMISSION_LIMITS = {
+    stage.strip(): (int(spec.split(":")[0]), int(spec.split(":")[1]), float(spec.split(":")[2]))
+    for stage, _, spec in (
+        item.partition("=") for item in os.environ.get(
+            "ADMISSION_LIMITS", "completion=16:24:8,topic_llm=16:24:3,embeddings=24:32:2"
+        ).split(",") if item.strip()
+    )
+}
+ADMISSION_DEFER_ENABLED = os.environ.get("ADMISSION_DEFER_ENABLED", "false").lower() == "true"
+ADMISSION_DEFER_QUEUE_SIZE = int(os.environ.get("ADMISSION_DEFER_QUEUE_SIZE", "200"))
+ADMISSION_DEFER_WORKERS = int(os.environ.get("ADMISSION_DEFER_WORKERS", "2"))
+ADMISSION_DEFER_MAX_WAIT_S = float(os.environ.get("ADMISSION_DEFER_MAX_WAIT_S", "60"))
+
+# Profiling bajo demanda (/debug/profile): deshabilitado por defecto y con límites de muestreo
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_HEADER = os.environ.get("PROFILING_HEADER", "X-Debug-Profile")
+PROFILING_MIN_INTERVAL_MS = float(os.environ.get("PROFILING_MIN_INTERVAL_MS", "5"))
+PROFILING_MAX_REQUESTS = int(os.environ.get("PROFILING_MAX_REQUESTS", "20"))
+PROFILING_MAX_CONCURRENT = int(os.environ.get("PROFILING_MAX_CONCURRENT", "4"))
+PROFILING_HEADER_PER_MINUTE = float(os.environ.get("PROFILING_HEADER_PER_MINUTE", "6"))
+PROFILING_MAX_STORED = int(os.environ.get("PROFILING_MAX_STORED", "20"))
+PROFILING_OUTPUT_DIR = os.environ.get("PROFILING_OUTPUT_DIR", "")  # vacío = solo en memoria
+
+# Memoria (/debug/heap): tracemalloc arranca con la app solo si está habilitado (tiene overhead)
+HEAP_PROFILING_ENABLED = os.environ.get("HEAP_PROFILING_ENABLED", "false").lower() == "true"
+HEAP_TRACEMALLOC_FRAMES = int(os.environ.get("HEAP_TRACEMALLOC_FRAMES", "10"))
+
+# Journal de conversaciones: append-only en segmentos de bloques zlib, escrito en background.
+# Guarda en disco el texto de los mensajes y las respuestas (datos de clientes): apagado por
+# defecto; al habilitarlo, JOURNAL_DIR debería ser un volumen privado. La retención borra los
+# segmentos cerrados más viejos que JOURNAL_RETENTION_DAYS o que excedan JOURNAL_MAX_TOTAL_MB
+JOURNAL_ENABLED = os.environ.get("JOURNAL_ENABLED", "false").lower() == "true"
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "journal")
+JOURNAL_SEGMENT_MAX_MB = float(os.environ.get("JOURNAL_SEGMENT_MAX_MB", "64"))
+JOURNAL_SEGMENT_MAX_AGE_S = float(os.environ.get("JOURNAL_SEGMENT_MAX_AGE_S", "3600"))
+JOURNAL_BLOCK_RECORDS = int(os.environ.get("JOURNAL_BLOCK_RECORDS", "64"))
+JOURNAL_FLUSH_INTERVAL_S = float(os.environ.get("JOURNAL_FLUSH_INTERVAL_S", "2"))
+JOURNAL_MAX_QUEUE = int(os.environ.get("JOURNAL_MAX_QUEUE", "10000"))
+JOURNAL_MAX_TOTAL_MB = float(os.environ.get("JOURNAL_MAX_TOTAL_MB", "2048"))
+JOURNAL_RETENTION_DAYS = float(os.environ.get("JOURNAL_RETENTION_DAYS", "30"))
+
+# Evaluación batch (/test-batch y python -m evals.run): límites por corrida
+BATCH_EVAL_MAX_CONCURRENCY = int(os.environ.get("BATCH_EVAL_MAX_CONCURRENCY", "16"))
+BATCH_EVAL_MAX_ITEMS = int(os.environ.get("BATCH_EVAL_MAX_ITEMS", "5000"))
+
+# Modo multi-proceso (python -m src.front): el front enruta cada usuario a uno de N workers
+# por hash consistente del número, así la memoria de sesión sigue siendo local al proceso
+CLUSTER_WORKERS = int(os.environ.get("CLUSTER_WORKERS", str(os.cpu_count() or 2)))
+CLUSTER_WORKER_HOST = os.environ.get("CLUSTER_WORKER_HOST", "127.0.0.1")
+CLUSTER_WORKER_BASE_PORT = int(os.environ.get("CLUSTER_WORKER_BASE_PORT", "8100"))
+CLUSTER_VNODES = int(os.environ.get("CLUSTER_VNODES", "160"))
+CLUSTER_HEALTH_INTERVAL_S = float(os.environ.get("CLUSTER_HEALTH_INTERVAL_S", "2"))
+CLUSTER_HEALTH_TIMEOUT_S = float(os.environ.get("CLUSTER_HEALTH_TIMEOUT_S", "2"))
+CLUSTER_HEALTH_FAILURES = int(os.environ.get("CLUSTER_HEALTH_FAILURES", "3"))
+CLUSTER_RESTART_BACKOFF_MAX_S = float(os.environ.get("CLUSTER_RESTART_BACKOFF_MAX_S", "30"))
+CLUSTER_PROXY_TIMEOUT_S = float(os.environ.get("CLUSTER_PROXY_TIMEOUT_S", "60"))
+WORKER_ID = os.environ.get("WORKER_ID", "")  # Lo asigna el front a cada worker; vacío = proceso único
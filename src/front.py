@@ -0,0 +1,131 @@
+"""Modo multi-proceso: un front liviano que reparte los mensajes entre N workers.
+
+    CLUSTER_WORKERS=4 python -m src.front --port 8000
+
+Cada worker es un `uvicorn src.main:app` en su propio puerto (CLUSTER_WORKER_BASE_PORT + i).
+/webhook se enruta por hash consistente del número (From), así la memoria de conversación,
+el rate limit por usuario y la cola diferida de cada usuario viven siempre en el mismo proceso.
+El resto de los endpoints va al worker de `?worker=N` o de `?user_id=`, o al primero sano.
+"""
+import argparse
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import parse_qs
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from src.config.settings import CLUSTER_PROXY_TIMEOUT_S, PROFILING_HEADER
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.worker_pool import worker_pool, Worker
+
+# Headers que se reenvían al worker (el resto los arma httpx)
+_FORWARDED_HEADERS = ("content-type", "x-twilio-signature", PROFILING_HEADER.lower())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await worker_pool.start()
+    yield
+    await worker_pool.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _headers(request: Request) -> dict:
+    return {name: request.headers[name] for name in _FORWARDED_HEADERS if name in request.headers}
+
+
+@app.get("/health")
+async def health():
+    """Sano si al menos un worker responde"""
+    status = worker_pool.get_status()
+    return JSONResponse({"status": "ok" if status["up"] else "down", **status},
+                        status_code=200 if status["up"] else 503)
+
+
+@app.get("/cluster/status")
+async def cluster_status():
+    return JSONResponse({"status": "success", **worker_pool.get_status()})
+
+
+@app.get("/metrics")
+async def cluster_metrics():
+    """Métricas del front (worker="front") y de cada worker, una familia por bloque"""
+    return PlainTextResponse(await worker_pool.scrape(metrics.render_prometheus()),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/webhook")
+async def webhook(request: Request):
+    """Reenvía el mensaje de Twilio al worker dueño del número"""
+    body = await request.body()
+    numero = parse_qs(body.decode("utf-8")).get("From", [""])[0].replace("whatsapp:", "")
+    worker = worker_pool.route(numero)
+    if worker is None:
+        # Sin workers sanos: 503 para que Twilio reintente
+        metrics.inc("cluster_proxy_requests_total", worker="none", outcome="unavailable")
+        logger.log_api_failure("cluster_no_workers", "no hay workers sanos", user_id=numero)
+        return PlainTextResponse("", status_code=503)
+
+    start = time.perf_counter()
+    try:
+        response = await worker_pool.client.post(f"{worker.url}/webhook", content=body, headers=_headers(request),
+                                                 timeout=CLUSTER_PROXY_TIMEOUT_S)
+        outcome = "ok" if response.status_code < 500 else "error"
+        status_code = response.status_code
+    except httpx.TimeoutException:
+        # El worker puede terminar y responder por Twilio igual: 200 para que Twilio no reintente
+        # (un reintento duplicaría la respuesta al usuario)
+        outcome, status_code = "timeout", 200
+        logger.warn("cluster_proxy_timeout", worker=worker.id, user_id=numero)
+    except httpx.HTTPError as e:
+        outcome, status_code = "error", 502
+        logger.log_api_failure("cluster_proxy", f"worker {worker.id}: {e}", user_id=numero)
+    metrics.observe("cluster_proxy_duration_seconds", time.perf_counter() - start, worker=str(worker.id))
+    metrics.inc("cluster_proxy_requests_total", worker=str(worker.id), outcome=outcome)
+    return PlainTextResponse("", status_code=status_code, headers={"X-Cluster-Worker": str(worker.id)})
+
+
+def _pick(request: Request) -> Optional[Worker]:
+    worker_id = request.query_params.get("worker")
+    if worker_id is not None and worker_id.isdigit():
+        return worker_pool.get(int(worker_id))
+    return worker_pool.route(request.query_params.get("user_id", "test_user"))
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def proxy(path: str, request: Request):
+    """Endpoints de prueba y debug: se reenvían tal cual (streaming, p.ej. /test-batch)"""
+    worker = _pick(request)
+    if worker is None:
+        return JSONResponse({"status": "error", "error": "worker no disponible"}, status_code=503)
+    params = [(k, v) for k, v in request.query_params.multi_items() if k != "worker"]
+    upstream = worker_pool.client.build_request(request.method, f"{worker.url}/{path}", params=params,
+                                                content=await request.body(), headers=_headers(request))
+    try:
+        response = await worker_pool.client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        logger.log_api_failure("cluster_proxy", f"worker {worker.id}: {e}")
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=502)
+    metrics.inc("cluster_proxy_requests_total", worker=str(worker.id), outcome="debug")
+    return StreamingResponse(response.aiter_raw(), status_code=response.status_code,
+                             media_type=response.headers.get("content-type"),
+                             headers={"X-Cluster-Worker": str(worker.id)},
+                             background=BackgroundTask(response.aclose))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Front multi-proceso con afinidad por usuario")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.api import webhook, testing, debug
+from src.api import webhook, testing, debug, metrics
+from src.services.lead_outbox import lead_outbox
+from src.services.heap_service import heap_profiler
+from src.services.journal_service import journal
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El dispatcher arranca con la app para drenar leads pendientes de un reinicio
+    lead_outbox.start()
+    # tracemalloc desde el arranque (solo con HEAP_PROFILING_ENABLED) para ver todo el crecimiento
+    heap_profiler.start()
+    yield
+    lead_outbox.stop()
+    # Escribe lo que quede en cola y cierra el segmento activo del journal
+    journal.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(webhook.router)
 app.include_router(testing.router)
 app.include_router(debug.router)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     print("🚀 ChatGPT WhatsApp Bot con RAG y Guardrails iniciando...")
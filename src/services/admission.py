@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.config.settings import (
+    ADMISSION_LIMITS,
+    ADMISSION_DEFER_ENABLED,
+    ADMISSION_DEFER_QUEUE_SIZE,
+    ADMISSION_DEFER_WORKERS,
+    ADMISSION_DEFER_MAX_WAIT_S
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.deadline import deadlines
+
+# En el worker diferido se espera más y sin límite de cola (ya está fuera del request)
+_patient_wait: ContextVar[Optional[float]] = ContextVar("admission_patient_wait", default=None)
+
+
+class AdmissionRejected(RuntimeError):
+    """La etapa está saturada: cola llena o se venció la espera"""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"Admission rejected for '{stage}': {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+class StageLimiter:
+    """Límite de requests en vuelo para una etapa cara, con cola de espera acotada y deadline"""
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, max_wait_s: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self._cond = threading.Condition()
+        metrics.register_callback("admission_in_flight", lambda: self.in_flight, stage=name)
+        metrics.register_callback("admission_waiting", lambda: self.waiting, stage=name)
+
+    def _reject(self, reason: str):
+        self.shed[reason] += 1
+        metrics.inc("admission_shed_total", stage=self.name, reason=reason)
+        raise AdmissionRejected(self.name, reason)
+
+    @contextmanager
+    def admit(self):
+        patient_wait = _patient_wait.get()
+        # En el request la espera en cola también sale del deadline
+        max_wait = patient_wait if patient_wait is not None else deadlines.timeout(self.max_wait_s)
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight >= self.max_in_flight or self.waiting:
+                if patient_wait is None and self.waiting >= self.max_queue:
+                    self._reject("queue_full")
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                try:
+                    deadline = start + max_wait
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+        metrics.observe("admission_wait_seconds", time.monotonic() - start, stage=self.name)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait_s,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "shed": dict(self.shed)
+        }
+
+
+class AdmissionController:
+    """Limitadores por etapa (completion, topic_llm, embeddings) y cola de procesamiento diferido"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, int, float]], defer_enabled: bool,
+                 defer_queue_size: int, defer_workers: int, defer_max_wait_s: float):
+        self.stages = {
+            name: StageLimiter(name, in_flight, max_queue, max_wait)
+            for name, (in_flight, max_queue, max_wait) in limits.items()
+        }
+        self.defer_enabled = defer_enabled
+        self.defer_max_wait_s = defer_max_wait_s
+        self.defer_workers = defer_workers
+        self._deferred: "queue.Queue[Tuple[Callable[[], Any], Optional[Callable[[], Any]], float]]" = \
+            queue.Queue(maxsize=defer_queue_size)
+        self._workers_started = False
+        self._lock = threading.Lock()
+        self.deferred_stats = {"queued": 0, "dropped": 0, "completed": 0, "failed": 0}
+        metrics.register_callback("admission_deferred_depth", self._deferred.qsize)
+
+    @contextmanager
+    def admit(self, stage: str):
+        """Entra a la etapa o levanta AdmissionRejected; etapas sin límite configurado pasan directo"""
+        limiter = self.stages.get(stage)
+        if limiter is None:
+            yield
+            return
+        with limiter.admit():
+            yield
+
+    def in_deferred(self) -> bool:
+        return _patient_wait.get() is not None
+
+    def defer(self, job: Callable[[], Any], on_failure: Optional[Callable[[], Any]] = None) -> bool:
+        """Encola un trabajo para reintentar fuera del request; False si la cola está llena.
+        Si el trabajo falla se llama on_failure (p.ej. avisarle al usuario que quedó esperando)"""
+        if not self.defer_enabled:
+            return False
+        self._ensure_workers()
+        try:
+            self._deferred.put_nowait((job, on_failure, time.monotonic()))
+        except queue.Full:
+            self.deferred_stats["dropped"] += 1
+            metrics.inc("admission_deferred_total", result="dropped")
+            return False
+        self.deferred_stats["queued"] += 1
+        metrics.inc("admission_deferred_total", result="queued")
+        return True
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._workers_started:
+                return
+            for i in range(self.defer_workers):
+                threading.Thread(target=self._run_deferred, name=f"admission-deferred-{i}", daemon=True).start()
+            self._workers_started = True
+
+    def _run_deferred(self):
+        while True:
+            job, on_failure, queued_at = self._deferred.get()
+            token = _patient_wait.set(self.defer_max_wait_s)
+            try:
+                job()
+                self.deferred_stats["completed"] += 1
+                metrics.inc("admission_deferred_total", result="completed")
+                logger.info("admission_deferred_completed", queued_s=round(time.monotonic() - queued_at, 1))
+            except Exception as e:
+                self.deferred_stats["failed"] += 1
+                metrics.inc("admission_deferred_total", result="failed")
+                logger.log_api_failure("admission_deferred", str(e))
+                if on_failure is not None:
+                    try:
+                        on_failure()
+                    except Exception as fallback_error:
+                        logger.log_api_failure("admission_deferred_fallback", str(fallback_error))
+            finally:
+                _patient_wait.reset(token)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "stages": {name: limiter.get_status() for name, limiter in self.stages.items()},
+            "deferred": {
+                "enabled": self.defer_enabled,
+                "depth": self._deferred.qsize(),
+                "capacity": self._deferred.maxsize,
+                **self.deferred_stats
+            }
+        }
+
+
+# Instancia global
+admission = AdmissionController(
+    ADMISSION_LIMITS,
+    defer_enabled=ADMISSION_DEFER_ENABLED,
+    defer_queue_size=ADMISSION_DEFER_QUEUE_SIZE,
+    defer_workers=ADMISSION_DEFER_WORKERS,
+    defer_max_wait_s=ADMISSION_DEFER_MAX_WAIT_S
+)
+metrics.describe("admission_in_flight", "Requests en vuelo por etapa con control de admisión")
+metrics.describe("admission_waiting", "Requests esperando admisión por etapa")
+metrics.describe("admission_shed_total", "Requests rechazados por saturación, por etapa y motivo")
+metrics.describe("admission_wait_seconds", "Espera hasta ser admitido, por etapa")
+metrics.describe("admission_deferred_depth", "Mensajes en la cola de procesamiento diferido")
+metrics.describe("admission_deferred_total", "Trabajos diferidos por resultado")
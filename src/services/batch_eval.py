@@ -0,0 +1,185 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from src.config.settings import BATCH_EVAL_MAX_CONCURRENCY, BATCH_EVAL_MAX_ITEMS
+from src.services.chatbot_service import chatbot_service
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tenant_service import tenants
+from src.services.tracing_service import tracer
+from src.services.usage_service import usage_tracker
+
+
+class BatchInputError(ValueError):
+    """Línea del set de evaluación inválida"""
+
+
+def parse_items(lines: Iterable[str], max_items: int = BATCH_EVAL_MAX_ITEMS) -> List[Dict[str, Any]]:
+    """JSONL → items ordenados. Cada línea es {"user_id", "message"} o un guion
+    {"user_id", "messages": [...]}; opcionales: "id" y "tenant"."""
+    items: List[Dict[str, Any]] = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BatchInputError(f"línea {line_number}: JSON inválido ({e})")
+        if not isinstance(entry, dict) or not entry.get("user_id"):
+            raise BatchInputError(f"línea {line_number}: falta user_id")
+
+        messages = entry.get("messages")
+        if messages is None:
+            messages = [entry.get("message")]
+        if not isinstance(messages, list) or not all(isinstance(m, str) and m for m in messages):
+            raise BatchInputError(f"línea {line_number}: 'message' o 'messages' debe ser texto no vacío")
+
+        base_id = entry.get("id") or f"L{line_number}"
+        for turn, message in enumerate(messages):
+            items.append({
+                "id": base_id if len(messages) == 1 else f"{base_id}.{turn}",
+                "user_id": str(entry["user_id"]),
+                "tenant": entry.get("tenant"),
+                "turn": turn,
+                "message": message
+            })
+        if len(items) > max_items:
+            raise BatchInputError(f"el set supera el máximo de {max_items} mensajes")
+    return items
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BatchEvaluator:
+    """Corre un set de mensajes por ChatbotService con concurrencia acotada y orden por usuario"""
+
+    def __init__(self, max_concurrency: int = BATCH_EVAL_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+
+    def _process(self, item: Dict[str, Any], session_user: str) -> Dict[str, Any]:
+        with tenants.use(tenants.get(item["tenant"])) as tenant, chatbot_service.dry_run(), \
+                tracer.trace("batch_eval", user_id=session_user, tenant=tenant.id) as trace, \
+                usage_tracker.track_request(session_user) as usage:
+            start = time.perf_counter()
+            error = None
+            try:
+                reply = chatbot_service.procesar_mensaje(item["message"], session_user)
+            except Exception as e:
+                reply, error = None, str(e)
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        return {
+            "type": "result",
+            **item,
+            "tenant": tenant.id,
+            "reply": reply,
+            **({"error": error} if error else {}),
+            "latency_ms": latency_ms,
+            "stage_timings": trace.stage_timings(),
+            "usage": usage.to_dict(),
+            "trace_id": trace.trace_id
+        }
+
+    def run(self, items: List[Dict[str, Any]], concurrency: int = 4,
+            fresh_sessions: bool = True) -> Iterator[Dict[str, Any]]:
+        """Genera un resultado por item a medida que terminan y al final un resumen.
+        Los mensajes de un mismo usuario van en orden, uno por vez (su 'carril')."""
+        concurrency = max(1, min(concurrency, self.max_concurrency))
+        run_id = os.urandom(3).hex()
+        lanes: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for item in items:
+            lanes.setdefault(item["user_id"], []).append(item)
+
+        results: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        stop = threading.Event()
+
+        def run_lane(user_id: str, lane: List[Dict[str, Any]]):
+            # Sesiones nuevas por corrida: el set no hereda memoria de corridas anteriores
+            session_user = f"eval-{run_id}-{user_id}" if fresh_sessions else user_id
+            for item in lane:
+                if stop.is_set():
+                    return
+                results.put(self._process(item, session_user))
+
+        logger.info("batch_eval_started", run_id=run_id, items=len(items), users=len(lanes),
+                    concurrency=concurrency)
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-eval")
+        futures = [executor.submit(run_lane, user_id, lane) for user_id, lane in lanes.items()]
+
+        def signal_done():
+            for future in futures:
+                future.exception()  # Espera a cada carril (los errores ya van en cada resultado)
+            results.put(None)
+
+        threading.Thread(target=signal_done, name="batch-eval-done", daemon=True).start()
+
+        collected: List[Dict[str, Any]] = []
+        try:
+            while True:
+                result = results.get()
+                if result is None:
+                    break
+                collected.append(result)
+                metrics.inc("batch_eval_items_total", outcome="error" if "error" in result else "ok")
+                yield result
+        finally:
+            # Cliente desconectado o generador cerrado: no seguir gastando en el resto del set
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield self._summary(run_id, collected, len(items), time.perf_counter() - started, concurrency)
+
+    def _summary(self, run_id: str, results: List[Dict[str, Any]], total: int,
+                 wall_s: float, concurrency: int) -> Dict[str, Any]:
+        latencies = [r["latency_ms"] for r in results]
+        stages: Dict[str, List[float]] = {}
+        cost = 0.0
+        tokens = {"prompt": 0, "completion": 0}
+        for result in results:
+            for stage, ms in result["stage_timings"].items():
+                stages.setdefault(stage, []).append(ms)
+            cost += result["usage"]["cost_usd"]
+            tokens["prompt"] += result["usage"]["prompt_tokens"]
+            tokens["completion"] += result["usage"]["completion_tokens"]
+
+        summary = {
+            "type": "summary",
+            "run_id": run_id,
+            "items": total,
+            "completed": len(results),
+            "errors": sum(1 for r in results if "error" in r),
+            "concurrency": concurrency,
+            "wall_s": round(wall_s, 2),
+            "items_per_s": round(len(results) / wall_s, 2) if wall_s else 0.0,
+            "latency_ms": {
+                "p50": _percentile(latencies, 0.50),
+                "p95": _percentile(latencies, 0.95),
+                "max": max(latencies, default=0.0)
+            },
+            "stages_ms": {
+                stage: {"mean": round(sum(values) / len(values), 2), "p95": _percentile(values, 0.95),
+                        "count": len(values)}
+                for stage, values in sorted(stages.items())
+            },
+            "cost_usd": round(cost, 6),
+            "cost_per_item_usd": round(cost / len(results), 6) if results else 0.0,
+            "tokens": tokens
+        }
+        logger.info("batch_eval_finished", **{k: v for k, v in summary.items() if k not in ("type", "stages_ms")})
+        return summary
+
+
+# Instancia global
+batch_evaluator = BatchEvaluator()
+metrics.describe("batch_eval_items_total", "Mensajes procesados por la evaluación batch, por resultado")
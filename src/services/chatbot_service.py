@@ -1,24 +1,110 @@
-from src.config.settings import openai_client
+from src.config.settings import openai_client, OPENAI_READ_TIMEOUT_S
 from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tracing_service import tracer
+from src.services.usage_service import usage_tracker
+from src.services.model_router import ModelRouter
+from src.services.resilience import breakers, CircuitOpenError
+from src.services.rate_limiter import rate_limiter
+from src.services.intent_router import intent_router
+from src.services.admission import admission, AdmissionRejected
 from src.services.rag_service import get_rag_manager
+from src.services.tenant_service import tenants, Tenant
+from src.services.profiler import profiler
 from src.services.guardrails_service import guardrails_service
+from src.services.deadline import deadlines, DeadlineExceeded
 from src.services.memory_service import conversation_memory
-from src.services.email_service import send_lead_email
-from src.templates.prompts import SYSTEM_PROMPT, FALLBACK_PROMPT
+from src.services.lead_outbox import lead_outbox, lead_idempotency_key
 import re
-from typing import Dict, Optional
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Evaluación batch: mismo pipeline pero sin efectos hacia afuera (leads, envíos diferidos)
+# ni rate limit por usuario, que cortaría los sets de regresión (el global sí aplica)
+_dry_run: ContextVar[bool] = ContextVar("chatbot_dry_run", default=False)
 
 class ChatbotService:
+    # Respuestas fijas: {telefono}, {email} y {whatsapp_staff} salen del contacto del tenant
+    DEGRADED_REPLY = (
+        "En este momento no puedo responder tu consulta 🙏 Podés comunicarte al {telefono}, "
+        "por WhatsApp al {whatsapp_staff} o a {email}"
+    )
+    RATE_LIMITED_REPLY = (
+        "Estoy recibiendo muchos mensajes seguidos 🙏 Dame un minuto y te respondo. "
+        "Si es urgente llamanos al {telefono}"
+    )
+    BUDGET_REPLY = (
+        "Recibimos muchas consultas desde este número. Para seguir, escribinos a "
+        "{email} o llamanos al {telefono} 📞"
+    )
+    SHED_REPLY_DEFERRED = "¡Gracias por escribirnos! Tenemos muchas consultas en este momento, te respondemos en breve 🙏"
+    SHED_REPLY = (
+        "¡Gracias por escribirnos! Tenemos muchas consultas en este momento 🙏 "
+        "Escribinos de nuevo en unos minutos o llamanos al {telefono}"
+    )
+    
     def __init__(self):
         self.model = "gpt-3.5-turbo"
         self.max_tokens = 150
         self.temperature = 0.3
+        self.router = ModelRouter(self.model, self.max_tokens, self.temperature)
+        # Lo registra el webhook: envía por WhatsApp las respuestas procesadas en diferido
+        self.reply_sender: Optional[Callable[[str, str], None]] = None
     
     def procesar_mensaje(self, mensaje_usuario: str, user_id: str) -> str:
         """Procesa mensaje con memoria, RAG, guardrails y captura de leads"""
+        # Reutiliza la traza del webhook si existe; si no (endpoints de testing) abre una
+        with tracer.trace("procesar_mensaje", user_id=user_id), usage_tracker.track_request(user_id), \
+                profiler.profile_request(user_id):
+            return self._procesar_mensaje(mensaje_usuario, user_id)
+    
+    @contextmanager
+    def dry_run(self):
+        """Procesa sin encolar leads, sin diferir respuestas y sin rate limit por usuario (evaluación batch)"""
+        token = _dry_run.set(True)
         try:
+            yield
+        finally:
+            _dry_run.reset(token)
+    
+    def _reply(self, template: str) -> str:
+        """Respuesta fija con los datos de contacto del tenant del request"""
+        return template.format(**tenants.current().contact)
+    
+    def _procesar_mensaje(self, mensaje_usuario: str, user_id: str) -> str:
+        tenant = tenants.current()
+        # Memoria por tenant: el mismo número en dos negocios son dos conversaciones
+        session_id = tenant.session_key(user_id)
+        try:
+            # 0. Rate limit (token bucket por usuario y global): corta antes de cualquier API.
+            #    Un mensaje diferido ya pagó su token y ya recibió "te respondemos en breve"
+            deferred = admission.in_deferred()
+            limited_scope = None if deferred else rate_limiter.check(user_id, user_scope=not _dry_run.get())
+            if limited_scope is not None:
+                logger.log_guardrail_block(user_id, "rate_limit", f"{limited_scope}_bucket_empty")
+                return self._reply(self.RATE_LIMITED_REPLY)
+            
+            # 0b. Presupuesto por usuario (ventana móvil de costo real). El diferido ya pasó el
+            #     corte en el request original: excedido, responde igual pero con el modelo barato
+            budget_status = usage_tracker.budget_status(user_id)
+            if budget_status == "throttle" and deferred:
+                budget_status = "downgrade"
+            if budget_status == "throttle":
+                logger.log_guardrail_block(user_id, "budget", "user_budget_exceeded")
+                return self._reply(self.BUDGET_REPLY)
+            
+            # 0c. Intents triviales (saludos, gracias, datos de contacto): respuesta fija sin
+            #     guardrails, RAG ni LLM. Nunca pisa la bienvenida de la primera interacción
+            intent_reply = self._match_intent(mensaje_usuario, user_id, session_id)
+            if intent_reply is not None:
+                return intent_reply
+            
             # 1. Validar input con guardrails
-            validacion_input = guardrails_service.validar_input(mensaje_usuario, user_id)
+            with tracer.span("guardrails"):
+                validacion_input = guardrails_service.validar_input(mensaje_usuario, user_id)
             if not validacion_input["es_valido"]:
                 # Crash fast: guardrails must provide valid rejection response
                 respuesta_rechazo = validacion_input.get("respuesta_rechazo")
@@ -28,46 +114,79 @@ class ChatbotService:
                 return respuesta_rechazo
             
             # 2. Verificar si es primera interacción → Respuesta fija determinista
-            is_first = conversation_memory.is_first_interaction(user_id)
+            with tracer.span("memory_read"):
+                is_first = conversation_memory.is_first_interaction(session_id)
+                if is_first:
+                    conversation_memory.mark_interaction_complete(session_id)
+                else:
+                    # 3. Obtener conversación existente (solo para interacciones posteriores)
+                    conversation_state = conversation_memory.get_conversation_state(session_id)
+                    lead_data = conversation_state.get("lead_data", {})
+                    history = self._last_exchange(conversation_state)
+            
             if is_first:
-                conversation_memory.mark_interaction_complete(user_id)
-                logger.info("first_interaction_welcome_sent", user_id=user_id)
-                return "Hola, soy Eva, la asistente virtual de Argenfuego 🧯 ¿En qué te puedo ayudar?"
+                logger.info("first_interaction_welcome_sent", user_id=user_id, tenant=tenant.id)
+                return tenant.welcome
             
-            # 3. Obtener conversación existente (solo para interacciones posteriores)
-            conversation_state = conversation_memory.get_conversation_state(user_id)
-            lead_data = conversation_state.get("lead_data", {})
+            # 4. Buscar contexto relevante en RAG (con el embedding del clasificador de tema, si lo hubo)
+            contexto = get_rag_manager().search_relevant_context(
+                mensaje_usuario, query_embedding=validacion_input.get("embedding")
+            )
             
-            # 4. Buscar contexto relevante en RAG
-            contexto = get_rag_manager().search_relevant_context(mensaje_usuario)
+            # 5. Construir prompt: instrucciones fijas primero, contexto e historial después
+            with tracer.span("prompt_render"):
+                messages, prompt_tokens = tenant.assembler.build_chat_messages(
+                    mensaje_usuario, contexto, history
+                )
+                tracer.set_attribute("prompt.tokens_estimated", sum(prompt_tokens.values()))
+                if contexto:
+                    logger.debug("rag_context_used", context_length=len(contexto))
+                else:
+                    logger.debug("rag_context_empty", fallback="generic_prompt")
             
-            # 5. Construir prompt con contexto (sin lógica de presentación)
-            if contexto:
-                system_prompt = SYSTEM_PROMPT.render(contexto_relevante=contexto)
-                logger.debug("rag_context_used", context_length=len(contexto))
-            else:
-                system_prompt = FALLBACK_PROMPT
-                logger.debug("rag_context_empty", fallback="generic_prompt")
-            
-            # 6. Generar respuesta con OpenAI
-            response = openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": mensaje_usuario}
-                ],
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
+            # 6. Elegir modelo y presupuesto de salida (incluye downgrade por presupuesto de usuario)
+            route = self.router.route(
+                mensaje_usuario, contexto, lead_data,
+                topic_confidence=validacion_input.get("confianza_tema"),
+                budget_status=budget_status,
+                user_id=user_id
             )
             
+            # 7. Generar respuesta con OpenAI (con cupo de concurrencia: si la etapa
+            #    está saturada se levanta AdmissionRejected y se responde sin LLM).
+            #    Con poco presupuesto se acota max_tokens; sin el mínimo, respuesta fija
+            deadlines.require("completion")
+            max_tokens = deadlines.cap_max_tokens(route["max_tokens"])
+            
+            def complete():
+                with metrics.time_dependency("openai_completion"), \
+                        deadlines.bounded("completion_timeout", OPENAI_READ_TIMEOUT_S):
+                    client = deadlines.openai(openai_client, OPENAI_READ_TIMEOUT_S)
+                    return client.chat.completions.create(
+                        model=route["model"],
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=route["temperature"]
+                    )
+            
+            with admission.admit("completion"), \
+                    tracer.span("completion", model=route["model"], route=route["route"]):
+                completion_start = time.perf_counter()
+                response = breakers.get("openai_completion").call(complete)
+            usage_tracker.record("completion", route["model"], response.usage)
+            self.router.record_outcome(route, response,
+                                       int((time.perf_counter() - completion_start) * 1000),
+                                       user_id=user_id)
+            
             # Crash fast: OpenAI must return valid content
             respuesta_ia = response.choices[0].message.content
             if respuesta_ia is None or respuesta_ia.strip() == "":
                 logger.log_api_failure("openai_null_response", "OpenAI returned None/empty content")
                 raise ValueError("OpenAI returned None or empty response")
             
-            # 7. Validar output con guardrails
-            validacion_output = guardrails_service.validar_output(respuesta_ia, user_id)
+            # 8. Validar output con guardrails
+            with tracer.span("output_moderation"):
+                validacion_output = guardrails_service.validar_output(respuesta_ia, user_id)
             if not validacion_output["es_valido"]:
                 fallback_response = validacion_output.get("respuesta_fallback")
                 if fallback_response is None or fallback_response.strip() == "":
@@ -75,21 +194,23 @@ class ChatbotService:
                     raise ValueError("Output validation failed to provide valid fallback response")
                 respuesta_ia = fallback_response
             
-            # 8. Actualizar información de lead
-            updated_lead_data = self._update_lead_data(
-                mensaje_usuario, respuesta_ia, lead_data, user_id
-            )
-            
-            # 9. Guardar estado actualizado
-            new_state = {
-                "lead_data": updated_lead_data,
-                "last_message": mensaje_usuario,
-                "last_response": respuesta_ia
-            }
-            conversation_memory.save_conversation_state(user_id, new_state)
+            # 9. Actualizar información de lead
+            with tracer.span("lead_update"):
+                updated_lead_data = self._update_lead_data(
+                    mensaje_usuario, respuesta_ia, lead_data, user_id
+                )
+                
+                # 10. Guardar estado actualizado
+                new_state = {
+                    "lead_data": updated_lead_data,
+                    "last_message": mensaje_usuario,
+                    "last_response": respuesta_ia
+                }
+                conversation_memory.save_conversation_state(session_id, new_state)
             
-            # 10. Verificar si enviar lead
-            lead_result = self._try_send_lead(updated_lead_data, user_id)
+            # 11. Verificar si enviar lead
+            with tracer.span("email"):
+                lead_result = self._try_send_lead(updated_lead_data, user_id)
             if lead_result and lead_result.strip() != "":
                 return lead_result
             
@@ -100,11 +221,69 @@ class ChatbotService:
             
             return respuesta_ia
             
+        except CircuitOpenError as e:
+            # Modo degradado: proveedor caído, respuesta inmediata con datos de contacto
+            metrics.inc("degraded_mode_total", reason="static_contact_reply")
+            logger.warn("degraded_reply_sent", user_id=user_id, dependency=e.name)
+            return self._reply(self.DEGRADED_REPLY)
+            
+        except DeadlineExceeded as e:
+            # Sin tiempo para el LLM: mejor una respuesta fija a tiempo que una completa tarde
+            logger.warn("deadline_reply_sent", user_id=user_id, stage=e.stage,
+                        remaining_s=round(e.remaining_s, 3))
+            return self._reply(self.DEGRADED_REPLY)
+            
+        except AdmissionRejected as e:
+            # Load shedding: respuesta rápida y, si está habilitado, se procesa más tarde
+            logger.warn("request_shed", user_id=user_id, stage=e.stage, reason=e.reason)
+            if admission.in_deferred():
+                return self._reply(self.DEGRADED_REPLY)
+            if self.reply_sender is not None and not _dry_run.get() and admission.defer(
+                    lambda: self._process_deferred(tenant, mensaje_usuario, user_id),
+                    on_failure=lambda: self._send_deferred_fallback(tenant, user_id)):
+                return self.SHED_REPLY_DEFERRED
+            return self._reply(self.SHED_REPLY)
+            
         except Exception as e:
             logger.log_api_failure("chatbot_processing", str(e))
             # Ensure exception handler never returns None
             return "Disculpa, tengo problemas técnicos en este momento. ¿Puedo ayudarte con algo sobre seguridad contra incendios? 🤖"
     
+    def _process_deferred(self, tenant: Tenant, mensaje_usuario: str, user_id: str):
+        """Reprocesa un mensaje diferido en el worker, con el tenant del request original"""
+        with tenants.use(tenant):
+            self.reply_sender(user_id, self.procesar_mensaje(mensaje_usuario, user_id))
+    
+    def _send_deferred_fallback(self, tenant: Tenant, user_id: str):
+        """El diferido falló: el usuario ya recibió "te respondemos en breve", no puede quedar sin respuesta"""
+        with tenants.use(tenant):
+            self.reply_sender(user_id, self._reply(self.SHED_REPLY))
+    
+    def _match_intent(self, mensaje_usuario: str, user_id: str, session_id: str) -> Optional[str]:
+        """Respuesta del router de intents, o None si el mensaje sigue por el pipeline"""
+        if not intent_router.enabled or conversation_memory.is_first_interaction(session_id):
+            return None
+        conversation_state = conversation_memory.get_conversation_state(session_id)
+        match = intent_router.match(
+            mensaje_usuario,
+            lead_data=conversation_state.get("lead_data", {}),
+            last_response=conversation_state.get("last_response"),
+            contact=tenants.current().contact
+        )
+        if match is None:
+            return None
+        tracer.set_attribute("intent", match.intent)
+        logger.info("intent_reply_sent", user_id=user_id, intent=match.intent)
+        return match.reply
+    
+    def _last_exchange(self, conversation_state: Dict) -> list:
+        """Último intercambio guardado como historial (va después del prefijo fijo)"""
+        last_message = conversation_state.get("last_message")
+        last_response = conversation_state.get("last_response")
+        if last_message and last_response:
+            return [(last_message, last_response)]
+        return []
+    
     def _update_lead_data(self, user_message: str, bot_response: str, 
                          current_lead: dict, user_id: str) -> dict:
         """Actualiza información de lead de manera incremental"""
@@ -197,8 +376,8 @@ class ChatbotService:
             
             # Preparar datos para el tool
             telefono = user_id.replace("whatsapp:", "")
+            tenant = tenants.current()
             
-            # Usar el método invoke (fix deprecation)
             tool_input = {
                 "intent": lead_data.get('intent', 'Consulta general'),
                 "nombre": lead_data.get('nombre', 'No proporcionado'),
@@ -206,22 +385,35 @@ class ChatbotService:
                 "email": lead_data.get('email', 'No proporcionado'),
                 "producto_info": lead_data.get('ubicacion', 'No especificado'),
                 "ubicacion": lead_data.get('ubicacion', 'No especificada'),
-                "observaciones": f"Lead capturado automáticamente por Eva"
+                "observaciones": f"Lead capturado automáticamente por Eva",
+                "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M")
             }
+            if not tenant.is_default:
+                # El dispatcher usa el destinatario y remitente de este tenant
+                tool_input["tenant"] = tenant.id
             
-            result = send_lead_email.invoke(tool_input)
+            # El outbox persiste el lead y lo envía en background (con reintentos):
+            # el cliente recibe la confirmación sin esperar a SendGrid
+            idempotency_key = lead_idempotency_key(tool_input)
+            created = True if _dry_run.get() else lead_outbox.enqueue(tool_input, idempotency_key)
             
             # Marcar como enviado para evitar duplicados
             lead_data['email_sent'] = True
             updated_state = {"lead_data": lead_data}
-            conversation_memory.save_conversation_state(user_id, updated_state)
+            conversation_memory.save_conversation_state(tenant.session_key(user_id), updated_state)
             
-            logger.info("lead_sent_successfully", 
+            logger.info("lead_queued", 
                        user_id=user_id, 
                        nombre=lead_data.get('nombre'),
-                       email=lead_data.get('email'))
+                       email=lead_data.get('email'),
+                       idempotency_key=idempotency_key,
+                       duplicate=not created)
             
-            return result
+            if not created:
+                return None
+            nombre = lead_data.get('nombre')
+            saludo = f"✅ Perfecto {nombre}!" if nombre else "✅ Perfecto!"
+            return f"{saludo} Envié tu consulta al equipo comercial de {tenant.name}. Te contactarán pronto por WhatsApp o email 🔥"
             
         except Exception as e:
             logger.log_api_failure("send_lead_error", str(e))
@@ -230,7 +422,7 @@ class ChatbotService:
     
     def get_lead_status(self, user_id: str) -> dict:
         """Obtiene el estado actual del lead para debugging"""
-        conversation_state = conversation_memory.get_conversation_state(user_id)
+        conversation_state = conversation_memory.get_conversation_state(tenants.current().session_key(user_id))
         return conversation_state.get("lead_data", {})
 
 chatbot_service = ChatbotService()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from src.config.settings import (
+    DEADLINE_ENABLED,
+    DEADLINE_WEBHOOK_S,
+    DEADLINE_SEND_RESERVE_S,
+    DEADLINE_MIN_TIMEOUT_S,
+    DEADLINE_TOPIC_LLM_MIN_S,
+    DEADLINE_RAG_MIN_S,
+    DEADLINE_FULL_COMPLETION_S,
+    DEADLINE_COMPLETION_MIN_S,
+    DEADLINE_CAPPED_MAX_TOKENS
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tracing_service import tracer
+
+_current: ContextVar[Optional["Deadline"]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """No queda presupuesto para una etapa obligatoria (la respuesta sale degradada)"""
+
+    def __init__(self, stage: str, remaining_s: float):
+        super().__init__(f"Deadline exceeded before '{stage}' ({remaining_s:.2f}s left)")
+        self.stage = stage
+        self.remaining_s = remaining_s
+
+
+def _is_timeout(error: Exception) -> bool:
+    """Timeout de la llamada (APITimeoutError de OpenAI, timeouts de httpx/urllib3/requests)"""
+    return isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(error).__mro__)
+
+
+class Deadline:
+    """Presupuesto de tiempo de un request, medido desde que llega al webhook"""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_s
+        self.degradations: list = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+class DeadlineManager:
+    """Deadline por request (contextvar, llega a los threads del pipeline) y degradaciones declaradas.
+
+    Cada etapa degradable declara el presupuesto mínimo que necesita (incluida la reserva para
+    enviar por Twilio); con menos, se degrada en vez de arriesgar pasarse del deadline:
+    topic_llm → se saltea la validación con LLM, rag → sin contexto (o el cacheado),
+    full_completion → max_tokens acotado, completion → respuesta fija sin LLM."""
+
+    def __init__(self, enabled: bool, budget_s: float, send_reserve_s: float, min_timeout_s: float,
+                 stage_minimums: Dict[str, float], capped_max_tokens: int):
+        self.enabled = enabled
+        self.budget_s = budget_s
+        self.send_reserve_s = send_reserve_s
+        self.min_timeout_s = min_timeout_s
+        self.stage_minimums = stage_minimums
+        self.capped_max_tokens = capped_max_tokens
+
+    @contextmanager
+    def start(self, budget_s: Optional[float] = None):
+        """Abre el deadline del request (sin efecto si está deshabilitado)"""
+        if not self.enabled:
+            yield None
+            return
+        deadline = Deadline(budget_s or self.budget_s)
+        token = _current.set(deadline)
+        try:
+            yield deadline
+        finally:
+            _current.reset(token)
+            self._finish(deadline)
+
+    def current(self) -> Optional[Deadline]:
+        return _current.get()
+
+    def timeout(self, default: float, reserve: Optional[float] = None) -> float:
+        """Timeout para una llamada: lo que queda del deadline menos la reserva de envío, nunca más
+        que el default de la dependencia ni menos que el mínimo. Sin deadline, el default."""
+        deadline = _current.get()
+        if deadline is None:
+            return default
+        reserve = self.send_reserve_s if reserve is None else reserve
+        return max(self.min_timeout_s, min(default, deadline.remaining() - reserve))
+
+    def send_timeout(self, default: float) -> float:
+        """Timeout del envío por Twilio: lo que queda, pero al menos la reserva (la respuesta
+        ya está lista y hay que entregarla aunque el resto del pipeline se haya demorado)"""
+        deadline = _current.get()
+        if deadline is None:
+            return default
+        return max(self.send_reserve_s, min(default, deadline.remaining()))
+
+    def openai(self, client, default_timeout: float):
+        """Cliente de OpenAI para una llamada del request: timeout acotado al deadline y sin
+        reintentos del SDK (cada reintento volvería a gastar el timeout completo)"""
+        if _current.get() is None:
+            return client
+        return client.with_options(timeout=self.timeout(default_timeout), max_retries=0)
+
+    @contextmanager
+    def bounded(self, stage: str, default_timeout: float):
+        """Envuelve una llamada cuyo timeout sale de timeout()/openai(). Si el deadline lo recortó
+        y la llamada vence, levanta DeadlineExceeded: se quedó sin tiempo el request, no falló la
+        dependencia (el breaker no lo cuenta como falla)"""
+        deadline = _current.get()
+        capped = deadline is not None and self.timeout(default_timeout) < default_timeout
+        try:
+            yield
+        except Exception as e:
+            if not capped or not _is_timeout(e):
+                raise
+            self._record(deadline, stage, deadline.remaining())
+            raise DeadlineExceeded(stage, deadline.remaining()) from e
+
+    def _record(self, deadline: Deadline, stage: str, remaining: float):
+        deadline.degradations.append(stage)
+        metrics.inc("deadline_degradations_total", stage=stage)
+        tracer.set_attribute(f"deadline.degraded.{stage}", round(remaining, 3))
+        logger.warn("deadline_degradation", stage=stage, remaining_s=round(remaining, 3),
+                    budget_s=deadline.budget_s)
+
+    def degrade(self, stage: str) -> bool:
+        """True si la etapa debe degradarse por falta de presupuesto (y lo registra)"""
+        deadline = _current.get()
+        if deadline is None:
+            return False
+        remaining = deadline.remaining()
+        if remaining >= self.stage_minimums[stage]:
+            return False
+        self._record(deadline, stage, remaining)
+        return True
+
+    def cap_max_tokens(self, max_tokens: int) -> int:
+        """max_tokens acotado si no queda presupuesto para una respuesta completa"""
+        if self.degrade("full_completion"):
+            return min(max_tokens, self.capped_max_tokens)
+        return max_tokens
+
+    def require(self, stage: str):
+        """Etapa obligatoria: sin presupuesto mínimo levanta DeadlineExceeded"""
+        if self.degrade(stage):
+            raise DeadlineExceeded(stage, self.current().remaining())
+
+    def _finish(self, deadline: Deadline):
+        metrics.observe("deadline_elapsed_seconds", deadline.elapsed())
+        if deadline.remaining() < 0:
+            metrics.inc("deadline_overrun_total")
+            logger.warn("deadline_overrun", budget_s=deadline.budget_s,
+                        elapsed_s=round(deadline.elapsed(), 3), degradations=deadline.degradations)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "budget_s": self.budget_s,
+            "send_reserve_s": self.send_reserve_s,
+            "min_timeout_s": self.min_timeout_s,
+            "stage_minimums_s": self.stage_minimums,
+            "capped_max_tokens": self.capped_max_tokens
+        }
+
+
+# Instancia global
+deadlines = DeadlineManager(
+    enabled=DEADLINE_ENABLED,
+    budget_s=DEADLINE_WEBHOOK_S,
+    send_reserve_s=DEADLINE_SEND_RESERVE_S,
+    min_timeout_s=DEADLINE_MIN_TIMEOUT_S,
+    stage_minimums={
+        "topic_llm": DEADLINE_TOPIC_LLM_MIN_S,
+        "rag": DEADLINE_RAG_MIN_S,
+        "full_completion": DEADLINE_FULL_COMPLETION_S,
+        "completion": DEADLINE_COMPLETION_MIN_S
+    },
+    capped_max_tokens=DEADLINE_CAPPED_MAX_TOKENS
+)
+metrics.describe("deadline_degradations_total",
+                 "Etapas degradadas por falta de presupuesto (topic_llm, rag, full_completion, completion; "
+                 "con sufijo _timeout si la llamada venció con el timeout recortado)")
+metrics.describe("deadline_overrun_total", "Requests que terminaron después de su deadline")
+metrics.describe("deadline_elapsed_seconds", "Duración de los requests con deadline (webhook completo)")
@@ -1,9 +1,23 @@
+import base64
+import csv
+import html
+import io
 import os
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from langchain_core.tools import tool
+from src.config.settings import (
+    http_client_factory,
+    SENDGRID_CONNECT_TIMEOUT_S,
+    SENDGRID_READ_TIMEOUT_S,
+    SENDGRID_API_BASE_URL
+)
 from src.services.logging_service import logger
-import sendgrid
-from sendgrid.helpers.mail import Mail, Email, To, Content
+from src.services.metrics_service import metrics
+from sendgrid.helpers.mail import (
+    Mail, Email, To, Content, Header,
+    Attachment, FileContent, FileName, FileType, Disposition
+)
 
 class EmailService:
     def __init__(self):
@@ -12,21 +26,31 @@ class EmailService:
         self.sender_email = os.getenv('SENDGRID_FROM_EMAIL', 'eva@argenfuego.com')
         self.sender_name = os.getenv('SENDGRID_FROM_NAME', 'Eva - Argenfuego')
         
+        self.client = None
         if not self.api_key:
             logger.log_api_failure("sendgrid_init", "SENDGRID_API_KEY not configured")
+        else:
+            # Un solo cliente con pool keep-alive para todos los envíos
+            self.client = http_client_factory.sendgrid_client(
+                self.api_key, SENDGRID_CONNECT_TIMEOUT_S, SENDGRID_READ_TIMEOUT_S,
+                base_url=SENDGRID_API_BASE_URL
+            )
     
-    def send_email(self, subject: str, html_content: str, text_content: str = None) -> bool:
-        """Envía email usando SendGrid API"""
+    def send_email(self, subject: str, html_content: str, text_content: str = None,
+                   headers: Optional[Dict[str, str]] = None,
+                   attachments: Optional[List[Tuple[str, bytes, str]]] = None,
+                   recipient: Optional[str] = None, sender_email: Optional[str] = None,
+                   sender_name: Optional[str] = None) -> bool:
+        """Envía email usando SendGrid API (destinatario y remitente por defecto salvo override del tenant)"""
         try:
-            if not self.api_key:
+            if not self.client:
                 logger.log_api_failure("sendgrid_no_api_key", "SendGrid API key not configured")
                 return False
             
-            sg = sendgrid.SendGridAPIClient(api_key=self.api_key)
-            
             # Crear email
-            from_email = Email(self.sender_email, self.sender_name)
-            to_email = To(self.recipient)
+            recipient = recipient or self.recipient
+            from_email = Email(sender_email or self.sender_email, sender_name or self.sender_name)
+            to_email = To(recipient)
             
             # Si no se proporciona texto plano, extraer del HTML
             if not text_content:
@@ -39,19 +63,29 @@ class EmailService:
                 html_content=html_content,
                 plain_text_content=text_content
             )
+            if headers:
+                mail.header = [Header(key, value) for key, value in headers.items()]
+            for filename, content, mime_type in attachments or []:
+                mail.add_attachment(Attachment(
+                    FileContent(base64.b64encode(content).decode()),
+                    FileName(filename),
+                    FileType(mime_type),
+                    Disposition("attachment")
+                ))
             
             # Enviar
-            response = sg.send(mail)
+            with metrics.time_dependency("sendgrid_send"):
+                response = self.client.send(mail)
             
             if response.status_code in [200, 201, 202]:
                 logger.info("sendgrid_email_sent", 
-                           recipient=self.recipient,
+                           recipient=recipient,
                            subject=subject,
                            status_code=response.status_code)
                 return True
             else:
                 logger.log_api_failure("sendgrid_bad_status", 
-                                     f"Status: {response.status_code}, Body: {response.body}")
+                                     f"Status: {response.status_code}, Body: {response.text}")
                 return False
                 
         except Exception as e:
@@ -92,31 +126,19 @@ class EmailService:
 # Instancia global
 email_service = EmailService()
 
-@tool
-def send_lead_email(
+def build_lead_email(
     intent: str,
     nombre: str = "No proporcionado",
     telefono: str = "",
-    email: str = "No proporcionado", 
+    email: str = "No proporcionado",
     producto_info: str = "",
     ubicacion: str = "No especificada",
-    observaciones: str = ""
-) -> str:
-    """
-    Envía email con información del lead cuando se han capturado datos suficientes.
-    
-    Args:
-        intent: Intención del cliente (ej: "Necesita extintores para restaurant")
-        nombre: Nombre del cliente
-        telefono: Teléfono WhatsApp del cliente
-        email: Email del cliente para contacto
-        producto_info: Información del producto solicitado
-        ubicacion: Ubicación o características del espacio
-        observaciones: Información adicional relevante
-    """
-    
-    # Crear timestamp
-    timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
+    observaciones: str = "",
+    timestamp: Optional[str] = None
+) -> Tuple[str, str]:
+    """Arma (subject, html) del email de lead"""
+    # Crear timestamp (el de captura si el lead viene del outbox)
+    timestamp = timestamp or datetime.now().strftime("%d/%m/%Y %H:%M")
     
     # Template HTML del email
     html_content = f"""
@@ -188,6 +210,74 @@ def send_lead_email(
     cliente_info = nombre if nombre != "No proporcionado" else telefono[-4:]
     subject = f"🔥 NUEVO LEAD WhatsApp - {cliente_info} ({intent[:40]}{'...' if len(intent) > 40 else ''})"
     
+    return subject, html_content
+
+DIGEST_COLUMNS = [
+    ("timestamp", "Fecha"),
+    ("nombre", "Nombre"),
+    ("telefono", "WhatsApp"),
+    ("email", "Email"),
+    ("intent", "Consulta"),
+    ("ubicacion", "Ubicación/Detalles")
+]
+
+def build_lead_digest_email(leads: List[Dict[str, Any]]) -> Tuple[str, str, str, bytes]:
+    """Arma (subject, html, texto, csv) de un resumen con varios leads"""
+    rows = [[str(lead.get(field) or "") for field, _ in DIGEST_COLUMNS] for lead in leads]
+    headers = [title for _, title in DIGEST_COLUMNS]
+    
+    cell = 'style="border:1px solid #ddd;padding:6px;vertical-align:top"'
+    table_rows = "".join(
+        "<tr>" + "".join(f"<td {cell}>{html.escape(value)}</td>" for value in row) + "</tr>"
+        for row in rows
+    )
+    html_content = (
+        '<html><body style="font-family:Arial,sans-serif">'
+        f"<h2>🔥 Resumen de leads - Eva WhatsApp Bot ({len(leads)})</h2>"
+        '<table style="border-collapse:collapse;font-size:13px"><tr>'
+        + "".join(f'<th {cell} bgcolor="#ff6b35">{title}</th>' for title in headers)
+        + f"</tr>{table_rows}</table>"
+        "<p>Detalle completo en el CSV adjunto.</p></body></html>"
+    )
+    # Texto plano armado directo (sin pasar el HTML por _html_to_text)
+    text_content = f"Resumen de leads ({len(leads)})\n\n" + "\n".join(" | ".join(row) for row in rows)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    csv_content = buffer.getvalue().encode("utf-8-sig")  # BOM: Excel abre bien los acentos
+    
+    subject = f"🔥 Resumen de {len(leads)} leads WhatsApp - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+    return subject, html_content, text_content, csv_content
+
+@tool
+def send_lead_email(
+    intent: str,
+    nombre: str = "No proporcionado",
+    telefono: str = "",
+    email: str = "No proporcionado", 
+    producto_info: str = "",
+    ubicacion: str = "No especificada",
+    observaciones: str = ""
+) -> str:
+    """
+    Envía email con información del lead cuando se han capturado datos suficientes.
+    
+    Args:
+        intent: Intención del cliente (ej: "Necesita extintores para restaurant")
+        nombre: Nombre del cliente
+        telefono: Teléfono WhatsApp del cliente
+        email: Email del cliente para contacto
+        producto_info: Información del producto solicitado
+        ubicacion: Ubicación o características del espacio
+        observaciones: Información adicional relevante
+    """
+    
+    subject, html_content = build_lead_email(
+        intent, nombre, telefono, email, producto_info, ubicacion, observaciones
+    )
+    
     try:
         success = email_service.send_email(subject, html_content)
         if success:
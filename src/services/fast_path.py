@@ -0,0 +1,58 @@
+from typing import List, NamedTuple, Optional
+from src.services.metrics_service import metrics
+
+# Máximo de adjuntos por mensaje que envía Twilio
+MAX_MEDIA = 10
+
+
+class FastPathReply(NamedTuple):
+    kind: str
+    reply: str
+
+
+class InboundFastPath:
+    """Respuestas deterministas para mensajes sin texto útil (audios, archivos, stickers, vacíos)"""
+
+    # Mismos textos que los CASOS ESPECIALES de SYSTEM_INSTRUCTIONS
+    AUDIO_REPLY = "No puedo procesar audios, pero si me escribes tu consulta estaré encantada de ayudarte 🙂"
+    FILE_REPLY = "No puedo recibir archivos por WhatsApp. Si me escribes tu consulta, te ayudo con gusto 🙂"
+    STICKER_REPLY = "😊 ¿En qué te puedo ayudar con la seguridad contra incendios de tu espacio?"
+    EMPTY_REPLY = "¿En qué te puedo ayudar? Escribime tu consulta sobre seguridad contra incendios 🧯"
+
+    def classify(self, body: str, media_types: List[str]) -> Optional[FastPathReply]:
+        """Devuelve la respuesta fija si el mensaje no necesita LLM; None si va al pipeline"""
+        if body and body.strip():
+            # Con texto (incluye captions y emojis como "👍" confirmando un lead) va al pipeline
+            return None
+
+        if not media_types:
+            result = FastPathReply("empty", self.EMPTY_REPLY)
+        elif all(t == "image/webp" for t in media_types):
+            # WhatsApp entrega los stickers como image/webp
+            result = FastPathReply("sticker", self.STICKER_REPLY)
+        elif any(t.startswith("audio/") for t in media_types):
+            result = FastPathReply("audio", self.AUDIO_REPLY)
+        else:
+            result = FastPathReply("file", self.FILE_REPLY)
+
+        metrics.inc("fast_path_total", kind=result.kind)
+        return result
+
+
+def media_content_types(form) -> List[str]:
+    """Lee NumMedia y MediaContentType{i} del form de Twilio"""
+    try:
+        num_media = int(form.get("NumMedia") or 0)
+    except ValueError:
+        num_media = 0
+    # El form no está autenticado: Twilio manda como mucho 10 adjuntos, más que eso no se itera
+    num_media = max(0, min(num_media, MAX_MEDIA))
+    return [
+        (form.get(f"MediaContentType{i}") or "application/octet-stream").lower()
+        for i in range(num_media)
+    ]
+
+
+# Instancia global
+inbound_fast_path = InboundFastPath()
+metrics.describe("fast_path_total", "Mensajes respondidos sin LLM (media, stickers, vacíos), por tipo")
@@ -1,11 +1,21 @@
 from src.config.settings import (
     openai_client, 
+    OPENAI_READ_TIMEOUT_S,
     ENABLE_INPUT_MODERATION, 
     ENABLE_TOPIC_VALIDATION, 
     ENABLE_OUTPUT_MODERATION
 )
 from src.services.logging_service import logger
-import asyncio
+from src.services.metrics_service import metrics
+from src.services.usage_service import usage_tracker
+from src.guardrails.validators import validar_tema_incendios
+from src.services.resilience import breakers, CircuitOpenError
+from src.services.admission import admission, AdmissionRejected
+from src.services.topic_classifier import topic_classifier
+from src.services.journal_service import journal
+from src.services.deadline import deadlines, DeadlineExceeded
+from src.templates.assembler import prompt_assembler
+import time
 
 class GuardrailsService:
     def __init__(self):
@@ -27,7 +37,15 @@ class GuardrailsService:
     def validar_contenido_inapropiado(self, texto: str, user_id: str = None) -> dict:
         """Usa OpenAI Moderation API para detectar contenido inapropiado"""
         try:
-            response = openai_client.moderations.create(input=texto)
+            def moderate():
+                with metrics.time_dependency("openai_moderation"), \
+                        deadlines.bounded("moderation_timeout", OPENAI_READ_TIMEOUT_S):
+                    client = deadlines.openai(openai_client, OPENAI_READ_TIMEOUT_S)
+                    return client.moderations.create(input=texto)
+            
+            response = breakers.get("openai_moderation").call(moderate)
+            usage_tracker.record("moderation", getattr(response, "model", "omni-moderation-latest"),
+                                 user_id=user_id)
             result = response.results[0]
             
             if result.flagged:
@@ -42,42 +60,43 @@ class GuardrailsService:
             logger.debug("input_moderation_passed", user_id=user_id)
             return {"es_valido": True}
             
+        except CircuitOpenError:
+            # Modo degradado: sin moderación mientras el breaker esté abierto (fail-open)
+            metrics.inc("degraded_mode_total", reason="moderation_skipped")
+            logger.warn("moderation_skipped", reason="breaker_open", user_id=user_id)
+            return {"es_valido": True}
+            
+        except DeadlineExceeded:
+            # Se agotó el deadline del request esperando la moderación: mismo criterio fail-open
+            logger.warn("moderation_skipped", reason="deadline", user_id=user_id)
+            return {"es_valido": True}
+            
         except Exception as e:
             logger.log_api_failure("openai_moderation", str(e))
             raise RuntimeError(f"OpenAI Moderation API failed: {e}")
     
     def validar_tema_con_llm(self, mensaje: str, user_id: str = None) -> dict:
         """Valida si el mensaje está relacionado con seguridad contra incendios usando LLM"""
+        if deadlines.degrade("topic_llm"):
+            # Sin presupuesto para el LLM: mismo criterio fail-open que con el breaker abierto
+            return {"es_valido": True}
         try:
-            prompt = f"""Eres un validador para Argenfuego, empresa especializada en seguridad contra incendios.
-
-SERVICIOS DE ARGENFUEGO:
-- Venta de matafuegos/extintores y elementos de protección personal
-- Mantenimiento y recarga de extintores
-- Control anual e inspecciones de sistemas contra incendios
-- Instalación de redes de incendio y sistemas fijos
-- Habilitaciones y certificaciones de seguridad
-- Asesoramiento y capacitación en prevención de incendios
-
-Responde SOLO 'SÍ' si el mensaje está relacionado con:
-- Cualquier consulta sobre nuestros servicios/productos
-- Preguntas técnicas sobre seguridad contra incendios
-- Consultas de ventas, precios, mantenimiento
-- Saludos y conversación básica de atención al cliente
-- Solicitudes de información o asesoramiento
-
-Responde 'NO' solo para temas COMPLETAMENTE ajenos (deportes, política, cocina, etc.)
-
-Mensaje del cliente: "{mensaje}"
-
-Respuesta:"""
+            messages = prompt_assembler.build_topic_messages(mensaje)
             
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=5,
-                temperature=0.2
-            )
+            def classify():
+                with metrics.time_dependency("openai_topic_llm"), \
+                        deadlines.bounded("topic_llm_timeout", OPENAI_READ_TIMEOUT_S):
+                    client = deadlines.openai(openai_client, OPENAI_READ_TIMEOUT_S)
+                    return client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=messages,
+                        max_tokens=5,
+                        temperature=0.2
+                    )
+            
+            with admission.admit("topic_llm"):
+                response = breakers.get("openai_topic_llm").call(classify)
+            usage_tracker.record("topic_validation", "gpt-3.5-turbo", response.usage, user_id=user_id)
             
             # Defensive programming: handle None response
             response_content = response.choices[0].message.content
@@ -97,13 +116,50 @@ Respuesta:"""
                     "razon": "tema_fuera_alcance"
                 }
             
-            logger.debug("topic_validation_passed", query_preview=mensaje[:30] + "...")
+            logger.debug("topic_validation_passed", query_preview=lambda: mensaje[:30] + "...")
+            return {"es_valido": True}
+            
+        except CircuitOpenError:
+            # Modo degradado: mismo criterio que ante respuesta vacía, se permite el mensaje
+            metrics.inc("degraded_mode_total", reason="topic_validation_skipped")
+            logger.warn("topic_validation_skipped", reason="breaker_open", user_id=user_id)
+            return {"es_valido": True}
+            
+        except DeadlineExceeded:
+            # Sin tiempo para esperar al LLM: mismo criterio fail-open que con el breaker abierto
+            logger.warn("topic_validation_skipped", reason="deadline", user_id=user_id)
+            return {"es_valido": True}
+            
+        except AdmissionRejected as e:
+            # Etapa saturada: se saltea la validación en vez de rechazar el mensaje completo
+            metrics.inc("degraded_mode_total", reason="topic_validation_shed")
+            logger.warn("topic_validation_skipped", reason=f"admission_{e.reason}", user_id=user_id)
             return {"es_valido": True}
             
         except Exception as e:
             logger.log_api_failure("topic_validation", str(e))
             raise RuntimeError(f"Topic validation failed: {e}")
     
+    def validar_tema(self, mensaje: str, user_id: str = None) -> tuple:
+        """Clasificador por embeddings y, solo si queda en la banda de duda, el LLM.
+        Devuelve (validación, embedding del mensaje o None) para reusar el vector en el RAG"""
+        if not topic_classifier.enabled:
+            return self.validar_tema_con_llm(mensaje, user_id), None
+        
+        score = topic_classifier.score(mensaje)
+        if score.decision == "on_topic":
+            logger.debug("topic_validation_passed", source="embeddings", margin=round(score.margin, 4))
+            return {"es_valido": True}, score.embedding
+        if score.decision == "off_topic":
+            logger.log_guardrail_block(user_id, "topic-drift", mensaje[:50] + "...")
+            return {
+                "es_valido": False,
+                "respuesta_rechazo": self.respuestas_rechazo["tema_fuera_alcance"],
+                "razon": "tema_fuera_alcance"
+            }, score.embedding
+        # uncertain / unavailable: decide el LLM como antes
+        return self.validar_tema_con_llm(mensaje, user_id), score.embedding
+    
     def validar_input(self, mensaje: str, user_id: str = None) -> dict:
         """Valida el input del usuario con configuración dinámica de guardrails"""
         try:
@@ -128,8 +184,10 @@ Respuesta:"""
                 logger.debug("input_moderation_skipped", reason="disabled")
             
             # Nivel 2: Validación de tema (condicional)
+            tema_validado_llm = False
+            embedding = None
             if ENABLE_TOPIC_VALIDATION:
-                validacion_tema = self.validar_tema_con_llm(mensaje, user_id)
+                validacion_tema, embedding = self.validar_tema(mensaje, user_id)
                 if not validacion_tema["es_valido"]:
                     # Defensive check: ensure response is not None
                     respuesta_rechazo = validacion_tema.get("respuesta_rechazo")
@@ -140,16 +198,28 @@ Respuesta:"""
                         "respuesta_rechazo": respuesta_rechazo,
                         "razon": validacion_tema.get("razon", "tema_fuera_alcance")
                     }
+                tema_validado_llm = True
             else:
                 logger.debug("topic_validation_skipped", reason="disabled")
             
             logger.debug("input_validation_passed", message="guardrails_approved")
-            return {"es_valido": True}
+            return {
+                "es_valido": True,
+                "confianza_tema": self._confianza_tema(mensaje, tema_validado_llm),
+                "embedding": embedding
+            }
             
         except Exception as e:
             logger.log_api_failure("guardrails_validation_error", str(e))
             raise RuntimeError(f"Guardrails validation failed: {e}")
     
+    def _confianza_tema(self, mensaje: str, tema_validado_llm: bool) -> float:
+        """Confianza heurística de que el mensaje es del dominio (keywords + validación LLM)"""
+        tiene_keywords = validar_tema_incendios(mensaje)
+        if tiene_keywords:
+            return 1.0 if tema_validado_llm else 0.8
+        return 0.6 if tema_validado_llm else 0.3
+    
     def validar_output(self, respuesta: str, user_id: str = None) -> dict:
         """Valida la respuesta del chatbot con configuración dinámica"""
         if not ENABLE_OUTPUT_MODERATION:
@@ -173,21 +243,15 @@ Respuesta:"""
         return {"es_valido": True, "respuesta": respuesta}
 
     async def log_conversation_async(self, user_id: str, mensaje: str, respuesta: str, metadata: dict = None):
-        """Log conversaciones de manera async sin impactar latencia"""
+        """Registra el turno en el journal de conversaciones sin impactar latencia (solo encola)"""
         try:
-            # TODO: Implementar logging real (archivo, base de datos, etc.)
-            log_data = {
-                "timestamp": asyncio.get_event_loop().time(),
-                "user_id": user_id,
-                "input": mensaje,
-                "output": respuesta,
-                "metadata": metadata or {}
-            }
-            logger.info("conversation_logged", 
-                       user_id=user_id,
-                       input_preview=mensaje[:30] + "...",
-                       output_preview=respuesta[:30] + "...",
-                       metadata=metadata)
+            journal.record({
+                "ts": round(time.time(), 3),
+                "user": logger.hash_user_id(user_id),
+                "message": mensaje,
+                "reply": respuesta,
+                **(metadata or {})
+            })
         except Exception as e:
             logger.warn("async_logging_failed", error=str(e))
 
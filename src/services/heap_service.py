@@ -0,0 +1,149 @@
+import gc
+import linecache
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+from src.config.settings import HEAP_PROFILING_ENABLED, HEAP_TRACEMALLOC_FRAMES
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+# Asignaciones propias de tracemalloc e imports no son de la app
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+]
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _short_path(filename: str) -> str:
+    return filename[len(_ROOT) + 1:] if filename.startswith(_ROOT) else filename
+
+
+def _rss_bytes() -> Optional[int]:
+    """RSS actual desde /proc (Linux); None si no está disponible"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class HeapProfiler:
+    """Snapshots de tracemalloc con diff contra el anterior y conteo de objetos de la app"""
+
+    def __init__(self, enabled: bool, frames: int):
+        self.enabled = enabled
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Estructuras de vida larga a vigilar: nombre → función que devuelve su tamaño
+        self.watched: Dict[str, Callable[[], int]] = {}
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info("tracemalloc_started", frames=self.frames)
+
+    def watch(self, name: str, size: Callable[[], int]):
+        """Registra una estructura (dict de sesiones, storage, etc.) para reportar su tamaño"""
+        self.watched[name] = size
+
+    def _format_stat(self, stat, traceback_lines: int) -> Dict[str, Any]:
+        # El Traceback va del frame más viejo al más reciente: el sitio de la asignación es el último
+        frame = stat.traceback[-1]
+        item = {
+            "site": f"{_short_path(frame.filename)}:{frame.lineno}",
+            "code": linecache.getline(frame.filename, frame.lineno).strip(),
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count
+        }
+        if traceback_lines > 1:
+            item["traceback"] = [f"{_short_path(f.filename)}:{f.lineno}"
+                                 for f in reversed(stat.traceback[-traceback_lines:])]
+        return item
+
+    def _format_diff(self, stat, traceback_lines: int) -> Dict[str, Any]:
+        item = self._format_stat(stat, traceback_lines)
+        item["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        item["count_diff"] = stat.count_diff
+        return item
+
+    def object_counts(self, prefix: str = "src.") -> Dict[str, int]:
+        """Instancias vivas por clase de nuestros módulos (gc.get_objects, solo objetos trackeados)"""
+        counts: Counter = Counter()
+        for obj in gc.get_objects():
+            cls = type(obj)
+            module = getattr(cls, "__module__", "") or ""
+            if module.startswith(prefix):
+                counts[f"{module}.{cls.__qualname__}"] += 1
+        return dict(counts.most_common())
+
+    def report(self, top: int = 20, group_by: str = "lineno", traceback_lines: int = 1,
+               reset_baseline: bool = False) -> Dict[str, Any]:
+        """Top de sitios de asignación, diff con el snapshot anterior y conteos de objetos"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                self.start()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            key = "traceback" if traceback_lines > 1 else group_by
+            current, peak = tracemalloc.get_traced_memory()
+            rss = _rss_bytes()
+
+            result: Dict[str, Any] = {
+                "rss_mb": round(rss / 1024 / 1024, 1) if rss else None,
+                "traced_mb": round(current / 1024 / 1024, 2),
+                "traced_peak_mb": round(peak / 1024 / 1024, 2),
+                "tracemalloc_overhead_mb": round(tracemalloc.get_tracemalloc_memory() / 1024 / 1024, 2),
+                "top": [self._format_stat(stat, traceback_lines) for stat in snapshot.statistics(key)[:top]]
+            }
+
+            if self._previous is not None and not reset_baseline:
+                diff = snapshot.compare_to(self._previous, key)
+                growth = [stat for stat in diff if stat.size_diff > 0][:top]
+                result["diff"] = {
+                    "since_seconds": round(time.time() - self._previous_at, 1),
+                    "total_diff_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+                    "top_growth": [self._format_diff(stat, traceback_lines) for stat in growth]
+                }
+            else:
+                result["diff"] = None  # Primer snapshot: queda como baseline del próximo
+
+            self._previous = snapshot
+            self._previous_at = time.time()
+
+        result["objects"] = self.object_counts()
+        result["watched"] = {}
+        for name, size in self.watched.items():
+            try:
+                result["watched"][name] = size()
+            except Exception as e:
+                result["watched"][name] = f"error: {e}"
+        gc_counts = gc.get_count()
+        result["gc"] = {"counts": list(gc_counts), "garbage": len(gc.garbage)}
+        metrics.inc("heap_snapshots_total")
+        logger.info("heap_snapshot", traced_mb=result["traced_mb"], rss_mb=result["rss_mb"],
+                    diff_kb=result["diff"]["total_diff_kb"] if result["diff"] else None)
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "tracing": tracemalloc.is_tracing(),
+            "frames": self.frames,
+            "baseline_age_seconds": round(time.time() - self._previous_at, 1) if self._previous_at else None
+        }
+
+
+# Instancia global
+heap_profiler = HeapProfiler(HEAP_PROFILING_ENABLED, HEAP_TRACEMALLOC_FRAMES)
+metrics.describe("heap_snapshots_total", "Snapshots de tracemalloc tomados desde /debug/heap")
@@ -0,0 +1,139 @@
+import json
+import re
+import unicodedata
+from typing import Any, Dict, List, NamedTuple, Optional
+from jinja2 import Environment
+from src.config.settings import (
+    INTENT_ROUTER_ENABLED,
+    INTENT_ROUTER_INTENTS,
+    INTENT_ROUTER_FILE
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.templates.prompts import CONTACT_INFO
+
+# Intents por defecto, evaluados en orden: gana el primero cuyo patrón matchea el mensaje
+# COMPLETO ya normalizado (minúsculas, sin tildes ni signos). Así "hola, necesito
+# extintores" no es un saludo y sigue al LLM.
+# Condiciones opcionales: when_lead_active (default false: con un lead en curso va al LLM),
+# after_question (default true; false = no responder si el bot acaba de preguntar algo,
+# porque un "dale" u "ok" ahí es una respuesta a la pregunta).
+# Variables en las respuestas: telefono, email, whatsapp_staff, nombre.
+DEFAULT_INTENTS: List[Dict[str, Any]] = [
+    {"name": "saludo",
+     "patterns": [r"(hola+|buenas|buen dia|buenos dias|buenas tardes|buenas noches|que tal|holis)"
+                  r"( eva)?( (como (estas|va|andas)|que tal))?"],
+     "reply": "¡Hola{% if nombre %} {{ nombre }}{% endif %}! 😊 ¿En qué te puedo ayudar?"},
+    {"name": "agradecimiento",
+     "patterns": [r"((ok|oka|dale|genial|perfecto|buenisimo|listo) )?(muchas |mil )?(gracias|grax|graciass+)"
+                  r"( eva)?( por todo| por la (info|informacion|ayuda))?( (saludos|chau))?"],
+     "reply": "¡De nada{% if nombre %} {{ nombre }}{% endif %}! Cualquier otra consulta sobre "
+              "seguridad contra incendios, acá estoy 🧯"},
+    {"name": "despedida",
+     "patterns": [r"(chau|chao|adios|hasta luego|hasta pronto|nos vemos|bye)( (gracias|saludos))?"],
+     "reply": "¡Hasta luego! 👋 Cuando necesites, escribinos por acá o llamanos al {{ telefono }}"},
+    {"name": "acuse",
+     "patterns": [r"(ok|oka|okey|okis|dale|listo|perfecto|genial|joya|buenisimo|entendido|barbaro|bien)"],
+     "after_question": False,
+     "reply": "👍 ¿Te puedo ayudar con algo más?"},
+    {"name": "telefono",
+     "patterns": [r"((cual es|me pasas|pasame|tenes|tienen|me das|decime|me dan)( el| un| su)? )?"
+                  r"(telefono|numero( de telefono)?|tel|celular)( de contacto)?( para (llamar|llamarlos))?"],
+     "reply": "📞 Podés llamarnos al {{ telefono }} o escribirle al staff por WhatsApp al {{ whatsapp_staff }}"},
+    {"name": "email",
+     "patterns": [r"((cual es|me pasas|pasame|tenes|tienen|me das|decime|me dan)( el| un| su)? )?"
+                  r"(mail|email|e mail|correo( electronico)?)( de contacto)?"],
+     "reply": "📧 Nuestro email es {{ email }}"},
+    {"name": "contacto",
+     "patterns": [r"(como|donde) (los|las) (contacto|ubico|encuentro)",
+                  r"(donde (estan|quedan|se encuentran|estan ubicados))",
+                  r"((cual es|me pasas|pasame) )?(la |su )?(direccion|ubicacion)",
+                  r"(datos de contacto|contacto)"],
+     "reply": "Podés contactarnos al {{ telefono }}, por WhatsApp al staff {{ whatsapp_staff }} "
+              "o por mail a {{ email }} 📍"}
+]
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+# Cierre de la respuesta del bot después de la pregunta: emojis, espacios, puntos ("...? 🏢")
+_TRAILING_NON_WORD = re.compile(r"[^\w?]+$", re.UNICODE)
+
+
+def ends_with_question(text: str) -> bool:
+    """True si el texto termina en pregunta, ignorando emojis y signos finales"""
+    return _TRAILING_NON_WORD.sub("", text).endswith("?")
+
+
+def normalize(mensaje: str) -> str:
+    """Minúsculas, sin tildes y sin signos/emojis; espacios colapsados"""
+    text = unicodedata.normalize("NFKD", mensaje.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def _load_intents() -> List[Dict[str, Any]]:
+    """Intents desde INTENT_ROUTER_INTENTS (JSON) o INTENT_ROUTER_FILE; si no, los default"""
+    try:
+        if INTENT_ROUTER_INTENTS:
+            return json.loads(INTENT_ROUTER_INTENTS)
+        if INTENT_ROUTER_FILE:
+            with open(INTENT_ROUTER_FILE, encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        logger.log_api_failure("intent_router_config", str(e))
+    return DEFAULT_INTENTS
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    reply: str
+
+
+class IntentRouter:
+    """Responde sin LLM los mensajes de intención trivial (saludos, gracias, datos de contacto)"""
+
+    def __init__(self, intents: List[Dict[str, Any]], enabled: bool = True):
+        self.enabled = enabled
+        env = Environment(autoescape=False)
+        self.intents = []
+        for intent in intents:
+            try:
+                # Todos los patrones de un intent en una sola regex anclada
+                pattern = re.compile("|".join(f"(?:{p})" for p in intent["patterns"]))
+                self.intents.append({
+                    "name": intent["name"],
+                    "pattern": pattern,
+                    "template": env.from_string(intent["reply"]),
+                    "when_lead_active": intent.get("when_lead_active", False),
+                    "after_question": intent.get("after_question", True)
+                })
+            except Exception as e:
+                logger.log_api_failure("intent_router_config", f"{intent.get('name')}: {e}")
+
+    def match(self, mensaje: str, lead_data: Optional[dict] = None,
+              last_response: Optional[str] = None,
+              contact: Optional[Dict[str, str]] = None) -> Optional[IntentMatch]:
+        """Devuelve el intent y su respuesta renderizada, o None si el mensaje va al LLM"""
+        if not self.enabled or not self.intents:
+            return None
+        lead_data = lead_data or {}
+        text = normalize(mensaje)
+        lead_active = bool(lead_data.get("intent")) and not lead_data.get("email_sent")
+        bot_asked = bool(last_response) and ends_with_question(last_response)
+
+        for intent in self.intents:
+            if lead_active and not intent["when_lead_active"]:
+                continue
+            if bot_asked and not intent["after_question"]:
+                continue
+            if text and intent["pattern"].fullmatch(text):
+                metrics.inc("intent_router_total", intent=intent["name"])
+                reply = intent["template"].render(nombre=lead_data.get("nombre"), **(contact or CONTACT_INFO))
+                return IntentMatch(intent["name"], reply)
+
+        metrics.inc("intent_router_total", intent="none")
+        return None
+
+
+# Instancia global
+intent_router = IntentRouter(_load_intents(), enabled=INTENT_ROUTER_ENABLED)
+metrics.describe("intent_router_total", "Mensajes evaluados por el router de intents (intent='none' = va al LLM)")
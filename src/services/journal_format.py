@@ -0,0 +1,61 @@
+# Formato del journal de conversaciones y lectura de segmentos. Solo stdlib: se usa offline
+# (python -m analytics.journal) sin las dependencias ni la configuración del server.
+import glob
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Bloque: magic, largo comprimido, cantidad de registros, crc32 del comprimido; después el
+# bloque zlib con un JSON por línea. Un bloque truncado (corte a mitad de escritura) se ignora.
+BLOCK_HEADER = struct.Struct(">4sIII")
+BLOCK_MAGIC = b"CJB1"
+SEGMENT_SUFFIX = ".seg"
+OPEN_SUFFIX = ".seg.open"  # Segmento activo: se renombra a .seg al rotar
+
+
+def encode_block(records: List[Dict[str, Any]]) -> Tuple[bytes, int]:
+    """Bloque listo para escribir y tamaño sin comprimir (para medir la compresión)"""
+    payload = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records).encode("utf-8")
+    compressed = zlib.compress(payload, 6)
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(compressed), len(records), zlib.crc32(compressed))
+    return header + compressed, len(payload)
+
+
+def read_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """Registros de un segmento, bloque por bloque vía mmap (no carga el archivo entero)"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + BLOCK_HEADER.size <= len(data):
+                magic, length, count, crc = BLOCK_HEADER.unpack_from(data, offset)
+                start = offset + BLOCK_HEADER.size
+                if magic != BLOCK_MAGIC or start + length > len(data):
+                    break
+                compressed = data[start:start + length]
+                if zlib.crc32(compressed) != crc:
+                    break
+                for line in zlib.decompress(compressed).decode("utf-8").splitlines():
+                    yield json.loads(line)
+                offset = start + length
+
+
+def list_segments(directory: str, include_open: bool = False) -> List[str]:
+    """Segmentos en orden cronológico (el nombre empieza con el timestamp de apertura)"""
+    paths = glob.glob(os.path.join(directory, f"*{SEGMENT_SUFFIX}"))
+    if include_open:
+        paths += glob.glob(os.path.join(directory, f"*{OPEN_SUFFIX}"))
+    return sorted(paths, key=os.path.basename)
+
+
+def iter_journal(directory: str, include_open: bool = False,
+                 since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Todos los registros del journal en orden, opcionalmente desde un timestamp"""
+    for path in list_segments(directory, include_open):
+        for record in read_segment(path):
+            if since is None or record.get("ts", 0) >= since:
+                yield record
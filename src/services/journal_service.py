@@ -0,0 +1,252 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from src.config.settings import (
+    JOURNAL_ENABLED,
+    JOURNAL_DIR,
+    JOURNAL_SEGMENT_MAX_MB,
+    JOURNAL_SEGMENT_MAX_AGE_S,
+    JOURNAL_BLOCK_RECORDS,
+    JOURNAL_FLUSH_INTERVAL_S,
+    JOURNAL_MAX_QUEUE,
+    JOURNAL_MAX_TOTAL_MB,
+    JOURNAL_RETENTION_DAYS,
+    WORKER_ID
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.journal_format import encode_block, list_segments, OPEN_SUFFIX, SEGMENT_SUFFIX
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        pass
+    return True
+
+
+class ConversationJournal:
+    """Journal append-only de turnos: cola sin bloqueo, escritura en bloques comprimidos en background,
+    rotación de segmentos por tamaño o antigüedad y retención (días y tamaño total) al rotar"""
+
+    def __init__(self, directory: str, enabled: bool, max_segment_bytes: int, max_segment_age_s: float,
+                 block_records: int, flush_interval_s: float, max_queue: int,
+                 max_total_bytes: int = 0, retention_s: float = 0):
+        self.directory = directory
+        self.enabled = enabled
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age_s = max_segment_age_s
+        self.block_records = block_records
+        self.flush_interval_s = flush_interval_s
+        self.max_total_bytes = max_total_bytes
+        self.retention_s = retention_s
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.blocks = 0
+        self.bytes_raw = 0
+        self.bytes_written = 0
+        self._file = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if enabled:
+            self._finalize_orphans()
+            self._apply_retention()
+            self._thread = threading.Thread(target=self._run, name="conversation-journal", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, entry: Dict[str, Any]):
+        """Encola un turno sin bloquear; con la cola llena se descarta y se cuenta"""
+        if not self.enabled:
+            return
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("journal_dropped_total")
+
+    def _drain(self, block: bool) -> List[Dict[str, Any]]:
+        """Junta hasta block_records registros o lo que llegue en flush_interval_s"""
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval_s
+        try:
+            if block:
+                batch.append(self.queue.get(timeout=self.flush_interval_s))
+            while len(batch) < self.block_records:
+                remaining = deadline - time.monotonic()
+                if not block or remaining <= 0:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _finalize_orphans(self):
+        """Al arrancar, cierra los .seg.open que dejó un proceso caído (crash, OOM kill): sin esto
+        quedan fuera de analytics. Los de procesos vivos (otros workers) no se tocan; el lector ya
+        ignora el último bloque si quedó truncado"""
+        for path in glob.glob(os.path.join(self.directory, f"*{OPEN_SUFFIX}")):
+            try:
+                pid = int(os.path.basename(path)[:-len(OPEN_SUFFIX)].rsplit("-", 1)[1])
+            except (IndexError, ValueError):
+                continue
+            # Este proceso todavía no abrió ningún segmento: uno con su pid es de un proceso anterior
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            final_path = path[:-len(OPEN_SUFFIX)] + SEGMENT_SUFFIX
+            try:
+                os.replace(path, final_path)
+                metrics.inc("journal_orphans_finalized_total")
+                logger.warn("journal_orphan_finalized", path=final_path, pid=pid)
+            except OSError as e:
+                logger.log_api_failure("conversation_journal", f"{path}: {e}")
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        # Worker y pid en el nombre: en modo multi-proceso cada proceso escribe sus propios segmentos
+        self._path = os.path.join(self.directory, f"{stamp}-{WORKER_ID or 'main'}-{os.getpid()}{OPEN_SUFFIX}")
+        self._file = open(self._path, "ab")
+        self._opened_at = time.monotonic()
+        logger.info("journal_segment_opened", path=self._path)
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        final_path = self._path[:-len(OPEN_SUFFIX)] + SEGMENT_SUFFIX
+        os.replace(self._path, final_path)
+        metrics.inc("journal_segments_total")
+        logger.info("journal_segment_closed", path=final_path, size_bytes=os.path.getsize(final_path))
+        self._file = None
+        self._path = None
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Borra segmentos cerrados (de todos los workers) por antigüedad y, del más viejo al más
+        nuevo, hasta que el total entre en max_total_bytes. 0 desactiva cada límite"""
+        if not self.max_total_bytes and not self.retention_s:
+            return
+        segments = []
+        for path in list_segments(self.directory):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            segments.append((path, stat.st_size, stat.st_mtime))
+        total = sum(size for _, size, _ in segments)
+        cutoff = time.time() - self.retention_s
+        for path, size, mtime in segments:
+            expired = bool(self.retention_s) and mtime < cutoff
+            over_cap = bool(self.max_total_bytes) and total > self.max_total_bytes
+            if not expired and not over_cap:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Lo borró otro worker
+            except OSError as e:
+                logger.log_api_failure("conversation_journal", f"{path}: {e}")
+                continue
+            total -= size
+            metrics.inc("journal_segments_deleted_total", reason="retention" if expired else "max_total")
+            logger.info("journal_segment_deleted", path=path, size_bytes=size,
+                        reason="retention" if expired else "max_total")
+
+    def _rotate_if_needed(self):
+        if self._file is None:
+            return
+        too_big = self._file.tell() >= self.max_segment_bytes
+        too_old = time.monotonic() - self._opened_at >= self.max_segment_age_s
+        if too_big or too_old:
+            self._close_segment()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            if self._file is None:
+                self._open_segment()
+            block, raw_size = encode_block(batch)
+            self._file.write(block)
+            self._file.flush()
+            self.written += len(batch)
+            self.blocks += 1
+            self.bytes_written += len(block)
+            self.bytes_raw += raw_size
+            metrics.inc("journal_records_total", len(batch))
+            self._rotate_if_needed()
+        except Exception as e:
+            self.dropped += len(batch)
+            metrics.inc("journal_dropped_total", len(batch))
+            logger.log_api_failure("conversation_journal", str(e))
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
+            else:
+                # Sin tráfico también se rota por antigüedad
+                self._rotate_if_needed()
+
+    def close(self):
+        """Detiene el writer, escribe lo pendiente y cierra el segmento activo (llamado en atexit)"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval_s + 2)
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._write(batch)
+        self._close_segment()
+        self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "active_segment": self._path,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "written": self.written,
+            "dropped": self.dropped,
+            "blocks": self.blocks,
+            "compression_ratio": round(self.bytes_raw / self.bytes_written, 2) if self.bytes_written else None,
+            "max_total_mb": round(self.max_total_bytes / (1024 * 1024), 1),
+            "retention_days": round(self.retention_s / 86400, 2)
+        }
+
+
+# Instancia global
+journal = ConversationJournal(
+    directory=JOURNAL_DIR,
+    enabled=JOURNAL_ENABLED,
+    max_segment_bytes=int(JOURNAL_SEGMENT_MAX_MB * 1024 * 1024),
+    max_segment_age_s=JOURNAL_SEGMENT_MAX_AGE_S,
+    block_records=JOURNAL_BLOCK_RECORDS,
+    flush_interval_s=JOURNAL_FLUSH_INTERVAL_S,
+    max_queue=JOURNAL_MAX_QUEUE,
+    max_total_bytes=int(JOURNAL_MAX_TOTAL_MB * 1024 * 1024),
+    retention_s=JOURNAL_RETENTION_DAYS * 86400
+)
+metrics.register_callback("journal_queue_depth", lambda: journal.queue.qsize())
+metrics.describe("journal_records_total", "Turnos escritos en el journal de conversaciones")
+metrics.describe("journal_dropped_total", "Turnos descartados (cola llena o error de escritura)")
+metrics.describe("journal_segments_total", "Segmentos del journal cerrados por rotación")
+metrics.describe("journal_segments_deleted_total", "Segmentos del journal borrados por retención o tamaño total")
+metrics.describe("journal_orphans_finalized_total", "Segmentos abiertos de procesos caídos cerrados al arrancar")
+metrics.describe("journal_queue_depth", "Turnos en cola esperando escritura")
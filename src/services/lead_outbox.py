@@ -0,0 +1,374 @@
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from src.config.settings import (
+    LEAD_OUTBOX_PATH,
+    LEAD_OUTBOX_MAX_ATTEMPTS,
+    LEAD_OUTBOX_BACKOFF_BASE_S,
+    LEAD_OUTBOX_BACKOFF_MAX_S,
+    LEAD_OUTBOX_POLL_INTERVAL_S,
+    LEAD_OUTBOX_CLAIM_LEASE_S,
+    LEAD_DIGEST_ENABLED,
+    LEAD_DIGEST_MAX_LEADS,
+    LEAD_DIGEST_MAX_WAIT_S,
+    LEAD_URGENT_KEYWORDS
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tenant_service import tenants
+from src.services.email_service import email_service, build_lead_email, build_lead_digest_email
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT,
+    urgent INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_lead_outbox_due ON lead_outbox (status, next_attempt_at);
+"""
+
+
+def lead_idempotency_key(lead: Dict[str, Any]) -> str:
+    """Mismo teléfono + intención + contacto (+ tenant) → misma clave (evita emails duplicados)"""
+    parts = [lead.get(field) or "" for field in ("telefono", "intent", "email", "nombre")]
+    if lead.get("tenant"):
+        parts.append(lead["tenant"])
+    return hashlib.sha256("|".join(parts).lower().encode()).hexdigest()[:32]
+
+
+def is_urgent_lead(payload: Dict[str, Any]) -> bool:
+    """Regla de prioridad: palabras de urgencia en la consulta saltean el digest"""
+    text = f"{payload.get('intent', '')} {payload.get('ubicacion', '')}".lower()
+    return any(keyword in text for keyword in LEAD_URGENT_KEYWORDS)
+
+
+def _tenant_email_options(tenant_id: Optional[str]) -> Dict[str, Optional[str]]:
+    """Destinatario y remitente del tenant del lead (None = los de EmailService)"""
+    tenant = tenants.get(tenant_id)
+    return {
+        "recipient": tenant.lead_recipient,
+        "sender_email": tenant.sender_email,
+        "sender_name": tenant.sender_name
+    }
+
+
+def send_lead_payload(payload: Dict[str, Any], idempotency_key: str) -> bool:
+    """Sender por defecto: arma el email del lead y lo manda por SendGrid"""
+    lead = dict(payload)
+    tenant_id = lead.pop("tenant", None)
+    subject, html_content = build_lead_email(**lead)
+    return email_service.send_email(subject, html_content, headers={"X-Lead-Idempotency-Key": idempotency_key},
+                                    **_tenant_email_options(tenant_id))
+
+
+def send_lead_digest(payloads: List[Dict[str, Any]], idempotency_key: str) -> bool:
+    """Sender del digest: un email con tabla + CSV adjunto (el outbox lo llama una vez por tenant)"""
+    subject, html_content, text_content, csv_content = build_lead_digest_email(payloads)
+    return email_service.send_email(
+        subject, html_content, text_content,
+        headers={"X-Lead-Idempotency-Key": idempotency_key},
+        attachments=[(f"leads_{time.strftime('%Y%m%d_%H%M')}.csv", csv_content, "text/csv")],
+        **_tenant_email_options(payloads[0].get("tenant"))
+    )
+
+
+class LeadOutbox:
+    """Outbox persistente de leads en SQLite con un dispatcher en background.
+
+    El request solo inserta la fila; el dispatcher envía con backoff exponencial
+    y la marca como 'sent' o, agotados los intentos, como 'dead'. Cada envío toma la
+    fila con un lease (claimed_at): si el proceso muere a mitad de envío, la fila vuelve
+    a 'pending' cuando vence el lease, sin pisar envíos en curso de otros procesos
+    que compartan el archivo. En modo digest
+    los leads no urgentes se acumulan y salen juntos al llegar a digest_max_leads
+    o cuando el más viejo espera digest_max_wait_s.
+    """
+
+    def __init__(self, path: str, sender: Callable[[Dict[str, Any], str], bool],
+                 max_attempts: int, backoff_base_s: float, backoff_max_s: float, poll_interval_s: float,
+                 claim_lease_s: float = 300,
+                 digest_sender: Optional[Callable[[List[Dict[str, Any]], str], bool]] = None,
+                 digest_max_leads: int = 25, digest_max_wait_s: float = 900,
+                 priority_rule: Callable[[Dict[str, Any]], bool] = is_urgent_lead):
+        self.path = path
+        self.sender = sender
+        self.digest_sender = digest_sender
+        self.digest_max_leads = digest_max_leads
+        self.digest_max_wait_s = digest_max_wait_s
+        self.priority_rule = priority_rule
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.poll_interval_s = poll_interval_s
+        self.claim_lease_s = claim_lease_s
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        metrics.register_callback("lead_outbox_pending", self._pending_gauge)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Abre la base una sola vez (lazy: importar el módulo no crea archivos)"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("SELECT name FROM sqlite_master WHERE name = 'lead_outbox'").fetchone():
+                # Bases creadas antes del modo digest / del lease no tienen 'urgent' / 'claimed_at'
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(lead_outbox)")}
+                if "urgent" not in columns:
+                    conn.execute("ALTER TABLE lead_outbox ADD COLUMN urgent INTEGER NOT NULL DEFAULT 0")
+                if "claimed_at" not in columns:
+                    conn.execute("ALTER TABLE lead_outbox ADD COLUMN claimed_at REAL")
+            conn.executescript(SCHEMA)
+            self._adopt_worker_outboxes(conn)
+            self._conn = conn
+        return self._conn
+
+    def _adopt_worker_outboxes(self, conn: sqlite3.Connection):
+        """Pasa a este outbox los leads sin enviar de los outboxes por worker ('<path>.wN') que
+        usaba antes el modo multi-proceso, y borra esos archivos"""
+        for orphan in glob.glob(f"{glob.escape(self.path)}.w*"):
+            if not re.fullmatch(r"\.w\d+", orphan[len(self.path):]):
+                continue  # -wal / -shm de SQLite
+            try:
+                # ATTACH aplica el WAL pendiente del archivo huérfano antes de leerlo
+                conn.execute("ATTACH DATABASE ? AS orphan", (orphan,))
+                try:
+                    adopted = conn.execute(
+                        "INSERT OR IGNORE INTO lead_outbox (idempotency_key, payload, status, attempts, "
+                        "next_attempt_at, created_at, last_error, urgent) "
+                        "SELECT idempotency_key, payload, 'pending', attempts, next_attempt_at, created_at, "
+                        "last_error, urgent FROM orphan.lead_outbox WHERE status IN ('pending', 'sending')"
+                    ).rowcount
+                finally:
+                    conn.execute("DETACH DATABASE orphan")
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(orphan + suffix):
+                        os.remove(orphan + suffix)
+                logger.warn("lead_outbox_adopted", path=orphan, leads=adopted)
+            except (sqlite3.Error, OSError) as e:
+                # Otro proceso lo está adoptando al mismo tiempo (o ya lo borró)
+                logger.log_api_failure("lead_outbox_adopt", f"{orphan}: {e}")
+
+    def start(self):
+        """Inicia el dispatcher (idempotente)"""
+        with self._lock:
+            self._connection()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="lead-outbox", daemon=True)
+            self._thread.start()
+        logger.info("lead_outbox_started", path=self.path, digest=self.digest_sender is not None,
+                    pending=lambda: self.stats()["pending"])
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def enqueue(self, payload: Dict[str, Any], idempotency_key: str) -> bool:
+        """Registra el lead; False si ya existía uno con la misma clave"""
+        now = time.time()
+        urgent = self.priority_rule(payload)
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT OR IGNORE INTO lead_outbox (idempotency_key, payload, next_attempt_at, created_at, urgent) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (idempotency_key, json.dumps(payload, ensure_ascii=False), now, now, int(urgent))
+            )
+            created = cursor.rowcount == 1
+        metrics.inc("lead_outbox_enqueued_total", result="created" if created else "duplicate",
+                    priority="urgent" if urgent else "normal")
+        if created:
+            if self._thread is None:
+                self.start()
+            self._wakeup.set()
+        return created
+
+    def _backoff_seconds(self, attempts: int) -> float:
+        """Exponencial con jitter: base * 2^(intentos-1), tope backoff_max"""
+        delay = min(self.backoff_max_s, self.backoff_base_s * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _reclaim_stale(self, conn: sqlite3.Connection):
+        """Filas 'sending' con el lease vencido (proceso caído a mitad de envío) vuelven a la cola"""
+        reclaimed = conn.execute(
+            "UPDATE lead_outbox SET status = 'pending', claimed_at = NULL "
+            "WHERE status = 'sending' AND COALESCE(claimed_at, 0) < ?",
+            (time.time() - self.claim_lease_s,)
+        ).rowcount
+        if reclaimed:
+            metrics.inc("lead_outbox_reclaimed_total", reclaimed)
+            logger.warn("lead_outbox_reclaimed", leads=reclaimed, lease_s=self.claim_lease_s)
+
+    def _claim_due(self, limit: int = 10, urgent: Optional[bool] = None) -> List[sqlite3.Row]:
+        """Toma filas vencidas: urgent=True solo urgentes, False solo no urgentes, None todas"""
+        with self._lock:
+            conn = self._connection()
+            self._reclaim_stale(conn)
+            rows = conn.execute(
+                "SELECT id, idempotency_key, payload, attempts FROM lead_outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? AND (? IS NULL OR urgent = ?) "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), urgent, urgent, limit)
+            ).fetchall()
+            # Claim condicional: con varios procesos sobre el mismo archivo solo uno gana cada fila
+            now = time.time()
+            return [
+                row for row in rows
+                if conn.execute("UPDATE lead_outbox SET status = 'sending', claimed_at = ? "
+                                "WHERE id = ? AND status = 'pending'", (now, row[0])).rowcount == 1
+            ]
+
+    def _digest_due(self) -> bool:
+        """Hay digest para mandar: suficientes leads o el más viejo esperó demasiado"""
+        with self._lock:
+            count, oldest = self._connection().execute(
+                "SELECT COUNT(*), MIN(created_at) FROM lead_outbox "
+                "WHERE status = 'pending' AND urgent = 0 AND next_attempt_at <= ?",
+                (time.time(),)
+            ).fetchone()
+        if not count:
+            return False
+        return count >= self.digest_max_leads or time.time() - oldest >= self.digest_max_wait_s
+
+    def _mark(self, row_id: int, status: str, attempts: int, error: Optional[str] = None,
+              next_attempt_at: Optional[float] = None):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE lead_outbox SET status = ?, attempts = ?, last_error = ?, "
+                "next_attempt_at = COALESCE(?, next_attempt_at), "
+                "sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END WHERE id = ?",
+                (status, attempts, error, next_attempt_at, status, time.time(), row_id)
+            )
+
+    def _deliver(self, rows: List[sqlite3.Row], mode: str):
+        """Un envío para todas las filas (1 en modo single, las de un tenant en digest); mismo
+        resultado para todas"""
+        keys = [row[1] for row in rows]
+        try:
+            if mode == "digest":
+                digest_key = hashlib.sha256("|".join(sorted(keys)).encode()).hexdigest()[:32]
+                sent = self.digest_sender([json.loads(row[2]) for row in rows], digest_key)
+            else:
+                sent = self.sender(json.loads(rows[0][2]), keys[0])
+            error = None if sent else "sender_returned_false"
+        except Exception as e:
+            sent, error = False, str(e)
+
+        for row_id, key, _, attempts in rows:
+            attempts += 1
+            if sent:
+                self._mark(row_id, "sent", attempts)
+                result = "sent"
+            elif attempts >= self.max_attempts:
+                self._mark(row_id, "dead", attempts, error)
+                result = "dead"
+                logger.log_api_failure("lead_outbox_dead", f"Lead {key} descartado tras {attempts} intentos: {error}")
+            else:
+                self._mark(row_id, "pending", attempts, error, time.time() + self._backoff_seconds(attempts))
+                result = "retry"
+            metrics.inc("lead_outbox_delivered_total", result=result, mode=mode)
+
+        if sent:
+            logger.info("lead_outbox_sent", mode=mode, leads=len(rows), idempotency_keys=keys)
+        else:
+            logger.warn("lead_outbox_retry", mode=mode, leads=len(rows), error=error)
+
+    def _run(self):
+        digest_mode = self.digest_sender is not None
+        while not self._stop.is_set():
+            try:
+                # En modo digest solo los urgentes salen de a uno
+                rows = self._claim_due(urgent=True if digest_mode else None)
+                for row in rows:
+                    self._deliver([row], "single")
+                if digest_mode and self._digest_due():
+                    # Solo no urgentes: un urgente que venció entre los dos claims sale de a uno
+                    batch = self._claim_due(limit=self.digest_max_leads, urgent=False)
+                    if batch:
+                        # Un digest por tenant, cada uno con su resultado: si falla el de un tenant
+                        # no se reintentan (ni se re-envían) los leads de los demás
+                        by_tenant: Dict[Optional[str], List[sqlite3.Row]] = {}
+                        for row in batch:
+                            by_tenant.setdefault(json.loads(row[2]).get("tenant"), []).append(row)
+                        for group in by_tenant.values():
+                            self._deliver(group, "digest")
+                        continue
+                if rows:
+                    continue
+            except Exception as e:
+                logger.log_api_failure("lead_outbox_dispatcher", str(e))
+            self._wakeup.wait(self.poll_interval_s)
+            self._wakeup.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connection()
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM lead_outbox GROUP BY status").fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM lead_outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0) + counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_age_s": round(time.time() - oldest, 1) if oldest else None,
+            "mode": "digest" if self.digest_sender is not None else "single",
+            "dispatcher_alive": self._thread is not None and self._thread.is_alive()
+        }
+
+    def _pending_gauge(self) -> int:
+        return self.stats()["pending"] if self._conn is not None else 0
+
+    def recent_failures(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Últimos leads con error (reintentando o descartados) para /debug"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT idempotency_key, status, attempts, last_error, created_at FROM lead_outbox "
+                "WHERE last_error IS NOT NULL AND status != 'sent' ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {"idempotency_key": key, "status": status, "attempts": attempts,
+             "last_error": error, "created_at": created_at}
+            for key, status, attempts, error, created_at in rows
+        ]
+
+
+# Instancia global
+lead_outbox = LeadOutbox(
+    LEAD_OUTBOX_PATH,
+    send_lead_payload,
+    max_attempts=LEAD_OUTBOX_MAX_ATTEMPTS,
+    backoff_base_s=LEAD_OUTBOX_BACKOFF_BASE_S,
+    backoff_max_s=LEAD_OUTBOX_BACKOFF_MAX_S,
+    poll_interval_s=LEAD_OUTBOX_POLL_INTERVAL_S,
+    claim_lease_s=LEAD_OUTBOX_CLAIM_LEASE_S,
+    digest_sender=send_lead_digest if LEAD_DIGEST_ENABLED else None,
+    digest_max_leads=LEAD_DIGEST_MAX_LEADS,
+    digest_max_wait_s=LEAD_DIGEST_MAX_WAIT_S
+)
+metrics.describe("lead_outbox_pending", "Leads pendientes de envío en el outbox")
+metrics.describe("lead_outbox_enqueued_total", "Leads registrados en el outbox (created/duplicate)")
+metrics.describe("lead_outbox_delivered_total", "Intentos de envío del outbox por resultado")
+metrics.describe("lead_outbox_reclaimed_total", "Envíos abandonados (lease vencido) que volvieron a la cola")
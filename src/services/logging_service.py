@@ -1,14 +1,109 @@
 import json
 import hashlib
+import atexit
+import queue
+import sys
+import threading
+from functools import lru_cache
 from datetime import datetime
 from typing import Dict, Any, Optional
 from src.config.settings import *
+from src.services.metrics_service import metrics
+
+try:
+    import orjson
+    
+    def _dumps(obj: Dict[str, Any]) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:  # orjson es opcional, json estándar como fallback
+    def _dumps(obj: Dict[str, Any]) -> str:
+        return json.dumps(obj, default=str)
+
+
+@lru_cache(maxsize=4096)
+def _sha256_user_id(user_id: str) -> str:
+    """Hash memoizado: el mismo usuario aparece en muchas líneas por mensaje"""
+    return "hash_" + hashlib.sha256(user_id.encode()).hexdigest()[:8]
+
+
+class BackgroundLogSink:
+    """Escritor en background: encola entradas y las escribe en lotes fuera del request path"""
+    
+    def __init__(self, formatter, queue_size: int, batch_size: int, flush_interval_ms: int):
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, entry: tuple):
+        """Encola sin bloquear; si la cola está llena se descarta y se cuenta"""
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _drain(self, block: bool) -> list:
+        """Toma hasta batch_size entradas de la cola"""
+        batch = []
+        try:
+            if block:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+    
+    def _write(self, batch: list):
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(self.formatter(*entry))
+            except Exception as e:
+                lines.append(f"log_format_error: {e}")
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+        self.written += len(batch)
+        self.batches += 1
+    
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
+    
+    def close(self):
+        """Detiene el writer y vacía lo pendiente (llamado en atexit)"""
+        self._stop.set()
+        self._thread.join(timeout=2)
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._write(batch)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches
+        }
+
 
 class LoggingService:
     def __init__(self):
-        self.log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
-        self.log_format = os.environ.get("LOG_FORMAT", "JSON").upper()
-        self.pii_masking = os.environ.get("LOG_PII_MASKING", "true").lower() == "true"
+        self.log_level = LOG_LEVEL
+        self.log_format = LOG_FORMAT
+        self.pii_masking = LOG_PII_MASKING
         
         # Niveles de logging (menor número = mayor prioridad)
         self.levels = {
@@ -24,13 +119,29 @@ class LoggingService:
             "messages_processed": 0,
             "total_response_time": 0,
             "api_costs": 0.0,
+            "tokens": {
+                "prompt": 0,
+                "completion": 0
+            },
+            "openai_calls": {},
             "guardrail_blocks": {
                 "profanity": 0,
                 "topic-drift": 0, 
                 "rate_limit": 0,
+                "budget": 0,
                 "system_error": 0
             }
         }
+        
+        # Sink asíncrono: json + stdout fuera del request path
+        self.sink = None
+        if LOG_ASYNC:
+            self.sink = BackgroundLogSink(self._format_entry, LOG_QUEUE_SIZE,
+                                          LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_MS)
+            metrics.register_callback("log_queue_depth", self.sink.queue.qsize)
+            metrics.register_callback("log_dropped_total", lambda: self.sink.dropped, metric_type="counter")
+        metrics.register_callback("cache_hits_total", lambda: _sha256_user_id.cache_info().hits,
+                                  metric_type="counter", cache="user_id_hash")
     
     def hash_user_id(self, user_id: str) -> str:
         """Hash irreversible de user ID para compliance PDPA"""
@@ -40,7 +151,7 @@ class LoggingService:
         if user_id is None or user_id == "":
             return "hash_anonymous"
             
-        return "hash_" + hashlib.sha256(user_id.encode()).hexdigest()[:8]
+        return _sha256_user_id(user_id)
     
     def should_log(self, level: str) -> bool:
         """Verifica si el nivel debe ser loggeado"""
@@ -48,7 +159,11 @@ class LoggingService:
     
     def format_log(self, level: str, event: str, data: Dict[str, Any]) -> str:
         """Formatea el log según configuración"""
-        timestamp = datetime.utcnow().isoformat() + "Z"
+        return self._format_entry(datetime.utcnow(), level, event, data)
+    
+    def _format_entry(self, created_at: datetime, level: str, event: str, data: Dict[str, Any]) -> str:
+        """Formatea una entrada con el timestamp capturado al momento del log"""
+        timestamp = created_at.isoformat() + "Z"
         
         log_entry = {
             "timestamp": timestamp,
@@ -58,23 +173,41 @@ class LoggingService:
         }
         
         if self.log_format == "JSON":
-            return json.dumps(log_entry)
+            return _dumps(log_entry)
         else:
             # Formato simple para desarrollo
             return f"[{timestamp}] {level}: {event} - {data}"
     
     def log(self, level: str, event: str, **kwargs):
-        """Log principal con filtrado por nivel"""
+        """Log principal con filtrado por nivel.
+        
+        Los valores callables se evalúan recién después del chequeo de nivel,
+        p.ej. ``preview=lambda: texto[:50]``.
+        """
         if not self.should_log(level):
             return
+        
+        for key, value in kwargs.items():
+            if callable(value):
+                kwargs[key] = value()
             
         # Maskear PII si está habilitado
         if "user_id" in kwargs and self.pii_masking:
             kwargs["user_id"] = self.hash_user_id(kwargs["user_id"])
+        
+        if self.sink is not None:
+            self.sink.submit((datetime.utcnow(), level, event, kwargs))
+            return
             
         log_message = self.format_log(level, event, kwargs)
         print(log_message)
     
+    def get_sink_stats(self) -> Dict[str, Any]:
+        """Profundidad de cola y descartes del sink asíncrono"""
+        if self.sink is None:
+            return {"mode": "sync"}
+        return {"mode": "async", **self.sink.get_stats()}
+    
     def critical(self, event: str, **kwargs):
         """Log crítico - acción inmediata requerida"""
         self.log("CRITICAL", event, **kwargs)
@@ -95,7 +228,8 @@ class LoggingService:
         """Log específico para mensajes procesados"""
         self.metrics["messages_processed"] += 1
         self.metrics["total_response_time"] += response_time
-        self.metrics["api_costs"] += cost
+        # api_costs se acumula por llamada en log_openai_usage, acá solo se loguea
+        metrics.observe("pipeline_duration_seconds", response_time / 1000)
         
         self.info("message_processed", 
                  user_id=user_id,
@@ -104,10 +238,31 @@ class LoggingService:
                  cost_usd=cost,
                  **kwargs)
     
+    def log_openai_usage(self, operation: str, model: str, prompt_tokens: int,
+                         completion_tokens: int, cost: float, user_id: Optional[str] = None):
+        """Registra tokens y costo reales de una llamada a OpenAI"""
+        self.metrics["api_costs"] += cost
+        self.metrics["tokens"]["prompt"] += prompt_tokens
+        self.metrics["tokens"]["completion"] += completion_tokens
+        self.metrics["openai_calls"][operation] = self.metrics["openai_calls"].get(operation, 0) + 1
+        
+        metrics.inc("openai_tokens_total", prompt_tokens, model=model, operation=operation, kind="prompt")
+        metrics.inc("openai_tokens_total", completion_tokens, model=model, operation=operation, kind="completion")
+        metrics.inc("openai_cost_usd_total", cost, model=model, operation=operation)
+        
+        self.debug("openai_usage",
+                  user_id=user_id,
+                  operation=operation,
+                  model=model,
+                  prompt_tokens=prompt_tokens,
+                  completion_tokens=completion_tokens,
+                  cost_usd=round(cost, 6))
+    
     def log_guardrail_block(self, user_id: str, block_type: str, reason: str):
         """Log bloqueos de guardrails"""
         if block_type in self.metrics["guardrail_blocks"]:
             self.metrics["guardrail_blocks"][block_type] += 1
+        metrics.inc("guardrail_blocks_total", block_type=block_type)
             
         self.warn("content_blocked",
                  user_id=user_id,
@@ -124,6 +279,7 @@ class LoggingService:
     
     def log_api_failure(self, service: str, error: str, user_id: Optional[str] = None):
         """Log fallos críticos de API"""
+        metrics.inc("errors_total", service=service)
         self.critical("api_failure",
                      service=service,
                      error=error,
@@ -139,7 +295,13 @@ class LoggingService:
             "total_messages": self.metrics["messages_processed"],
             "avg_response_time_ms": round(avg_response_time, 2),
             "total_api_cost_usd": round(self.metrics["api_costs"], 4),
-            "guardrail_blocks": self.metrics["guardrail_blocks"]
+            "avg_cost_per_message_usd": round(self.metrics["api_costs"] / self.metrics["messages_processed"], 6)
+                                        if self.metrics["messages_processed"] > 0 else 0,
+            "tokens": self.metrics["tokens"],
+            "openai_calls": self.metrics["openai_calls"],
+            "guardrail_blocks": self.metrics["guardrail_blocks"],
+            "latency": metrics.summary(),
+            "log_sink": self.get_sink_stats()
         }
 
 # Instancia global
@@ -1,9 +1,31 @@
 from langgraph.checkpoint.memory import MemorySaver
 from datetime import datetime, timedelta
+from bisect import bisect_right
+from typing import Iterator, Optional, Tuple
+import sys
 import threading
 import time
 from src.services.logging_service import logger
 
+
+def _estimate_size(obj, _seen: set = None) -> int:
+    """Estima bytes ocupados por un objeto recorriendo contenedores anidados"""
+    if _seen is None:
+        _seen = set()
+    obj_id = id(obj)
+    if obj_id in _seen:
+        return 0
+    _seen.add(obj_id)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _estimate_size(key, _seen) + _estimate_size(value, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _estimate_size(item, _seen)
+    return size
+
 class ConversationMemoryService:
     def __init__(self, cleanup_hours: int = 2):
         self.memory = MemorySaver()
@@ -70,6 +92,132 @@ class ConversationMemoryService:
             for user_id, data in self.user_sessions.items()
         }
     
+    def _saved_state_entry(self, user_id: str):
+        """Devuelve el storage crudo de LangGraph para el thread del usuario (sin copiar)"""
+        storage = getattr(self.memory, "storage", None)
+        if not storage:
+            return None
+        return storage.get(f"user_{user_id}")
+    
+    def _describe_session(self, user_id: str, now: datetime) -> Optional[dict]:
+        """Construye la vista de debugging de una sesión con su tamaño estimado"""
+        data = self.user_sessions.get(user_id)
+        if data is None:
+            return None  # Expiró entre el snapshot de claves y la lectura
+        
+        saved_state = self._saved_state_entry(user_id)
+        session_bytes = _estimate_size(user_id) + _estimate_size(data)
+        state_bytes = _estimate_size(saved_state) if saved_state is not None else 0
+        
+        return {
+            'user_id': user_id,
+            'first_interaction': data['first_interaction'],
+            'timestamp': data['timestamp'].isoformat(),
+            'age_seconds': int((now - data['timestamp']).total_seconds()),
+            'has_saved_state': saved_state is not None,
+            'session_bytes': session_bytes,
+            'saved_state_bytes': state_bytes,
+            'estimated_bytes': session_bytes + state_bytes
+        }
+    
+    def _matches_age(self, user_id: str, now: datetime,
+                     min_age_seconds: Optional[int], max_age_seconds: Optional[int]) -> bool:
+        """Filtra sesiones por antigüedad sin construir la vista completa"""
+        data = self.user_sessions.get(user_id)
+        if data is None:
+            return False
+        age = (now - data['timestamp']).total_seconds()
+        if min_age_seconds is not None and age < min_age_seconds:
+            return False
+        if max_age_seconds is not None and age > max_age_seconds:
+            return False
+        return True
+    
+    def list_user_sessions(self, cursor: Optional[str] = None, limit: int = 100,
+                           min_age_seconds: Optional[int] = None,
+                           max_age_seconds: Optional[int] = None) -> Tuple[list, Optional[str]]:
+        """Página de sesiones ordenada por user_id. El cursor es el último user_id devuelto"""
+        user_ids = sorted(self.user_sessions)  # Snapshot de claves, no de valores
+        start = bisect_right(user_ids, cursor) if cursor else 0
+        now = datetime.now()
+        
+        page = []
+        last_scanned = None
+        for user_id in user_ids[start:]:
+            last_scanned = user_id
+            if not self._matches_age(user_id, now, min_age_seconds, max_age_seconds):
+                continue
+            item = self._describe_session(user_id, now)
+            if item is not None:
+                page.append(item)
+            if len(page) >= limit:
+                break
+        
+        # Hay más páginas si quedaron claves sin recorrer después de la última escaneada
+        has_more = last_scanned is not None and last_scanned != user_ids[-1]
+        return page, (last_scanned if has_more else None)
+    
+    def iter_user_sessions(self, min_age_seconds: Optional[int] = None,
+                           max_age_seconds: Optional[int] = None) -> Iterator[dict]:
+        """Itera sesiones de a una para streaming, sin materializar el resultado completo"""
+        now = datetime.now()
+        for user_id in sorted(self.user_sessions):
+            if not self._matches_age(user_id, now, min_age_seconds, max_age_seconds):
+                continue
+            item = self._describe_session(user_id, now)
+            if item is not None:
+                yield item
+    
+    def memory_summary(self, top_n: int = 10) -> dict:
+        """Resumen de conteos y bytes estimados de sesiones y estados guardados"""
+        now = datetime.now()
+        sessions_bytes = 0
+        states_bytes = 0
+        first_interaction_pending = 0
+        oldest_age = 0
+        largest = []
+        
+        for user_id in list(self.user_sessions):
+            item = self._describe_session(user_id, now)
+            if item is None:
+                continue
+            sessions_bytes += item['session_bytes']
+            states_bytes += item['saved_state_bytes']
+            if item['first_interaction']:
+                first_interaction_pending += 1
+            oldest_age = max(oldest_age, item['age_seconds'])
+            largest.append((item['estimated_bytes'], user_id))
+        
+        # Estados guardados sin sesión asociada (p.ej. sesión ya expirada)
+        storage = getattr(self.memory, "storage", None) or {}
+        orphan_states = 0
+        orphan_bytes = 0
+        for thread_id in list(storage):
+            user_id = thread_id[len("user_"):] if thread_id.startswith("user_") else thread_id
+            if user_id not in self.user_sessions:
+                orphan_states += 1
+                orphan_bytes += _estimate_size(storage.get(thread_id))
+        
+        total_sessions = len(largest)
+        total_bytes = sessions_bytes + states_bytes + orphan_bytes
+        largest.sort(reverse=True)
+        
+        return {
+            'total_sessions': total_sessions,
+            'first_interaction_pending': first_interaction_pending,
+            'saved_states': len(storage),
+            'orphan_saved_states': orphan_states,
+            'oldest_session_age_seconds': oldest_age,
+            'user_sessions_bytes': sessions_bytes,
+            'saved_states_bytes': states_bytes + orphan_bytes,
+            'total_estimated_bytes': total_bytes,
+            'avg_bytes_per_session': round(total_bytes / total_sessions, 2) if total_sessions else 0,
+            'largest_sessions': [
+                {'user_id': user_id, 'estimated_bytes': size}
+                for size, user_id in largest[:top_n]
+            ]
+        }
+    
     def _cleanup_expired_sessions(self):
         """Limpia sesiones expiradas de memoria"""
         try:
@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# Buckets en segundos: cubren desde un cache hit hasta el timeout de Twilio
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 7.5, 10.0, 15.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Dict[str, str] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Histograma de buckets fijos con estimación de percentiles por interpolación"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Último bucket = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Percentil aproximado interpolando linealmente dentro del bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                fraction = (rank - cumulative) / bucket_count
+                return min(lower + (upper - lower) * fraction, self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 2) if self.count else 0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 2),
+            "p95_ms": round(self.quantile(0.95) * 1000, 2),
+            "p99_ms": round(self.quantile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2)
+        }
+
+
+class MetricsRegistry:
+    """Registro en memoria de histogramas y contadores con exposición estilo Prometheus"""
+
+    def __init__(self, prefix: str = "chatbot"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._callbacks: Dict[str, Dict[LabelKey, Callable[[], float]]] = {}
+        self._callback_types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Registra una duración (en segundos) en el histograma correspondiente"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def register_callback(self, name: str, callback: Callable[[], float],
+                          metric_type: str = "gauge", **labels):
+        """Valor calculado al momento del scrape (p.ej. profundidad de una cola)"""
+        with self._lock:
+            self._callbacks.setdefault(name, {})[_label_key(labels)] = callback
+            self._callback_types[name] = metric_type
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def time_dependency(self, dependency: str):
+        """Mide la latencia de una llamada a un servicio externo"""
+        return self.timer("dependency_duration_seconds", dependency=dependency)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Percentiles por serie, para endpoints JSON de debugging"""
+        with self._lock:
+            return {
+                name: {
+                    ",".join(f"{k}={v}" for k, v in key) or "all": histogram.summary()
+                    for key, histogram in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+
+    def render_prometheus(self) -> str:
+        """Formato de exposición de texto de Prometheus (0.0.4)"""
+        # Callbacks fuera del lock: pueden consultar otros servicios
+        with self._lock:
+            callbacks = {name: dict(series) for name, series in self._callbacks.items()}
+        callback_values: Dict[str, Dict[LabelKey, float]] = {}
+        for name, series in callbacks.items():
+            for key, callback in series.items():
+                try:
+                    callback_values.setdefault(name, {})[key] = float(callback())
+                except Exception:
+                    continue
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                self._header(lines, name, full_name, "histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, {'le': repr(bound)})} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+
+            # Contadores y valores por callback de la misma familia van juntos
+            families = set(self._counters) | set(callback_values)
+            for name in sorted(families):
+                full_name = f"{self.prefix}_{name}"
+                metric_type = "counter" if name in self._counters else self._callback_types[name]
+                self._header(lines, name, full_name, metric_type)
+                samples = {**callback_values.get(name, {}), **self._counters.get(name, {})}
+                for key, value in samples.items():
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, full_name: str, metric_type: str):
+        if name in self._help:
+            lines.append(f"# HELP {full_name} {self._help[name]}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+
+
+# Instancia global
+metrics = MetricsRegistry()
+metrics.describe("pipeline_duration_seconds", "Latencia total del webhook, desde la recepción hasta el envío por Twilio")
+metrics.describe("dependency_duration_seconds", "Latencia de llamadas a servicios externos")
+metrics.describe("guardrail_blocks_total", "Mensajes bloqueados por guardrails")
+metrics.describe("cache_hits_total", "Aciertos de cache")
+metrics.describe("errors_total", "Fallos registrados por servicio")
@@ -0,0 +1,126 @@
+import json
+from typing import Any, Dict, List, Optional
+from src.config.settings import (
+    MODEL_ROUTER_RULES,
+    MODEL_ROUTER_RULES_FILE,
+    USER_BUDGET_DOWNGRADE_MODEL,
+    USER_BUDGET_DOWNGRADE_MAX_TOKENS
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+# Degradación por presupuesto del usuario: se aplica antes de las reglas, así una
+# configuración propia (MODEL_ROUTER_RULES / _FILE) no puede desactivarla
+BUDGET_DOWNGRADE_RULE: Dict[str, Any] = {
+    "name": "budget_downgrade",
+    "model": USER_BUDGET_DOWNGRADE_MODEL,
+    "max_tokens": USER_BUDGET_DOWNGRADE_MAX_TOKENS
+}
+
+# Reglas por defecto, evaluadas en orden: gana la primera que matchea.
+# Condiciones soportadas: min_words, max_words, has_context, lead_active,
+# min_topic_confidence, max_topic_confidence, budget_status.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"name": "trivial", "max_words": 4, "has_context": False, "lead_active": False,
+     "model": "gpt-4o-mini", "max_tokens": 60},
+    {"name": "lead_capture", "lead_active": True,
+     "model": "gpt-3.5-turbo", "max_tokens": 120},
+    {"name": "technical", "min_words": 12, "has_context": True, "min_topic_confidence": 0.6,
+     "model": "gpt-3.5-turbo", "max_tokens": 250},
+    {"name": "no_context", "has_context": False,
+     "model": "gpt-4o-mini", "max_tokens": 100}
+]
+
+
+def _load_rules() -> List[Dict[str, Any]]:
+    """Reglas desde MODEL_ROUTER_RULES (JSON) o MODEL_ROUTER_RULES_FILE; si no, las default"""
+    try:
+        if MODEL_ROUTER_RULES:
+            return json.loads(MODEL_ROUTER_RULES)
+        if MODEL_ROUTER_RULES_FILE:
+            with open(MODEL_ROUTER_RULES_FILE, encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        logger.log_api_failure("model_router_config", str(e))
+    return DEFAULT_RULES
+
+
+class ModelRouter:
+    """Elige modelo y presupuesto de salida por mensaje según señales ya disponibles"""
+
+    def __init__(self, default_model: str, default_max_tokens: int, default_temperature: float):
+        self.default = {
+            "name": "default",
+            "model": default_model,
+            "max_tokens": default_max_tokens,
+            "temperature": default_temperature
+        }
+        self.rules = _load_rules()
+
+    def _matches(self, rule: Dict[str, Any], signals: Dict[str, Any]) -> bool:
+        words = signals["words"]
+        confidence = signals["topic_confidence"]
+        if "min_words" in rule and words < rule["min_words"]:
+            return False
+        if "max_words" in rule and words > rule["max_words"]:
+            return False
+        if "has_context" in rule and signals["has_context"] != rule["has_context"]:
+            return False
+        if "lead_active" in rule and signals["lead_active"] != rule["lead_active"]:
+            return False
+        if "min_topic_confidence" in rule and confidence < rule["min_topic_confidence"]:
+            return False
+        if "max_topic_confidence" in rule and confidence > rule["max_topic_confidence"]:
+            return False
+        if "budget_status" in rule and signals["budget_status"] != rule["budget_status"]:
+            return False
+        return True
+
+    def route(self, mensaje: str, contexto: str, lead_data: dict,
+              topic_confidence: Optional[float] = None, budget_status: str = "ok",
+              user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Devuelve {'route', 'model', 'max_tokens', 'temperature'} para el mensaje"""
+        signals = {
+            "words": len(mensaje.split()),
+            "has_context": bool(contexto),
+            "lead_active": bool(lead_data.get("intent")) and not lead_data.get("email_sent"),
+            "topic_confidence": topic_confidence if topic_confidence is not None else 1.0,
+            "budget_status": budget_status
+        }
+        if budget_status == "downgrade":
+            rule = BUDGET_DOWNGRADE_RULE
+        else:
+            rule = next((rule for rule in self.rules if self._matches(rule, signals)), self.default)
+        decision = {
+            "route": rule.get("name", "unnamed"),
+            "model": rule.get("model", self.default["model"]),
+            "max_tokens": rule.get("max_tokens", self.default["max_tokens"]),
+            "temperature": rule.get("temperature", self.default["temperature"])
+        }
+
+        metrics.inc("model_route_total", route=decision["route"], model=decision["model"])
+        logger.debug("model_route_decision", user_id=user_id, **decision, **signals)
+        return decision
+
+    def record_outcome(self, decision: Dict[str, Any], response, latency_ms: int,
+                       user_id: Optional[str] = None):
+        """Loguea el resultado de la ruta elegida para poder ajustar las reglas"""
+        finish_reason = response.choices[0].finish_reason if response.choices else None
+        usage = getattr(response, "usage", None)
+        if finish_reason == "length":
+            # Respuesta cortada: el presupuesto de salida de la ruta quedó chico
+            metrics.inc("model_route_truncated_total", route=decision["route"])
+
+        logger.info("model_route_outcome",
+                    user_id=user_id,
+                    route=decision["route"],
+                    model=decision["model"],
+                    max_tokens=decision["max_tokens"],
+                    completion_tokens=getattr(usage, "completion_tokens", None),
+                    prompt_tokens=getattr(usage, "prompt_tokens", None),
+                    finish_reason=finish_reason,
+                    latency_ms=latency_ms)
+
+
+metrics.describe("model_route_total", "Decisiones del router de modelos por ruta y modelo")
+metrics.describe("model_route_truncated_total", "Respuestas cortadas por max_tokens, por ruta")
@@ -0,0 +1,237 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from src.config.settings import (
+    PROFILING_ENABLED,
+    PROFILING_MIN_INTERVAL_MS,
+    PROFILING_MAX_REQUESTS,
+    PROFILING_MAX_CONCURRENT,
+    PROFILING_HEADER_PER_MINUTE,
+    PROFILING_MAX_STORED,
+    PROFILING_OUTPUT_DIR
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.rate_limiter import TokenBucket
+
+# Pedido de profiling por header: lo marca la capa HTTP y lo lee el thread del pipeline
+_requested: ContextVar[bool] = ContextVar("profile_requested", default=False)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _frame_label(frame) -> str:
+    """'src/services/rag_service.py:search_relevant_context' (rutas relativas al repo)"""
+    filename = frame.f_code.co_filename
+    if filename.startswith(_ROOT):
+        filename = filename[len(_ROOT) + 1:]
+    return f"{filename}:{frame.f_code.co_name}"
+
+
+class RequestProfile:
+    """Muestras de un request: stacks colapsados (raíz primero) → cantidad"""
+
+    def __init__(self, label: str, trigger: str, entry_frame):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.trigger = trigger
+        self.entry_frame = entry_frame
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+
+    def sample(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            # Solo lo que corre debajo de procesar_mensaje, sin los frames del threadpool
+            if frame is self.entry_frame:
+                break
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """Formato de flamegraph.pl / speedscope: 'a;b;c N' por línea"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks)
+        }
+
+
+class SamplingProfiler:
+    """Profiler por muestreo (sys._current_frames) para los próximos N requests o uno pedido por header"""
+
+    def __init__(self, enabled: bool, min_interval_ms: float, max_requests: int, max_concurrent: int,
+                 header_per_minute: float, max_stored: int, output_dir: str = ""):
+        self.enabled = enabled
+        self.min_interval_ms = min_interval_ms
+        self.max_requests = max_requests
+        self.max_concurrent = max_concurrent
+        self.max_stored = max_stored
+        self.output_dir = output_dir
+        self.interval_s = max(min_interval_ms, 10) / 1000
+        self.remaining = 0
+        self._active: Dict[int, RequestProfile] = {}
+        self._results: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._header_bucket = TokenBucket(max(header_per_minute, 1), header_per_minute / 60, time.monotonic())
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def arm(self, requests: int, interval_ms: float) -> Dict[str, Any]:
+        """Perfila los próximos `requests` mensajes (acotado por los límites configurados)"""
+        with self._lock:
+            self.remaining = max(0, min(requests, self.max_requests))
+            self.interval_s = max(interval_ms, self.min_interval_ms) / 1000
+        logger.info("profiler_armed", requests=self.remaining, interval_ms=self.interval_s * 1000)
+        return self.get_status()
+
+    @contextmanager
+    def requested(self, header_value: Optional[str]):
+        """Marca el request actual para profiling si trae el header (solo con profiling habilitado)"""
+        wanted = self.enabled and bool(header_value) and header_value.lower() in ("1", "true", "yes")
+        token = _requested.set(wanted)
+        try:
+            yield
+        finally:
+            _requested.reset(token)
+
+    def _claim(self) -> Optional[str]:
+        """Decide si el request actual se perfila y por qué ('armed' / 'header')"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if len(self._active) >= self.max_concurrent:
+                return None
+            if self.remaining > 0:
+                self.remaining -= 1
+                return "armed"
+            if _requested.get():
+                now = time.monotonic()
+                self._header_bucket.refill(now)
+                if self._header_bucket.tokens >= 1:
+                    self._header_bucket.tokens -= 1
+                    return "header"
+                metrics.inc("profiler_rejected_total", reason="header_rate_limit")
+        return None
+
+    @contextmanager
+    def profile_request(self, label: str):
+        """Envuelve procesar_mensaje: sin profiling activo el costo es un chequeo de flags"""
+        trigger = self._claim()
+        if trigger is None:
+            yield
+            return
+
+        profile = RequestProfile(label, trigger, sys._getframe(2))
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        with self._lock:
+            self._active[thread_id] = profile
+            self._ensure_sampler()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(thread_id, None)
+            profile.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            self._store(profile)
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._sampler.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_s)
+            # Se muestrea con el lock tomado: profile_request saca el perfil de _active bajo el mismo
+            # lock antes de guardarlo, así ninguna muestra tardía toca stacks mientras se serializa
+            # (ni registra el stack entero del thread después de limpiar entry_frame)
+            with self._lock:
+                if not self._active:
+                    # Sin requests perfilados el thread termina; el próximo lo vuelve a crear
+                    self._sampler = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, profile in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.sample(frame)
+                sampled = len(self._active)
+            metrics.inc("profiler_samples_total", sampled)
+
+    def _store(self, profile: RequestProfile):
+        profile.entry_frame = None  # No retener el frame (y sus locals) después del request
+        with self._lock:
+            self._results[profile.id] = profile
+            while len(self._results) > self.max_stored:
+                self._results.popitem(last=False)
+        metrics.inc("profiles_captured_total", trigger=profile.trigger)
+        logger.info("profile_captured", **profile.summary())
+        if self.output_dir:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, f"profile_{int(profile.started_at)}_{profile.id}.collapsed")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(profile.collapsed())
+            except OSError as e:
+                logger.log_api_failure("profiler_output", str(e))
+
+    def get_profile(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._results.get(profile_id)
+
+    def merged(self, profile_ids: Optional[List[str]] = None) -> str:
+        """Stacks colapsados sumados de varios perfiles (todos los guardados si no se indican)"""
+        total: Counter = Counter()
+        with self._lock:
+            profiles = [self._results[pid] for pid in (profile_ids or list(self._results)) if pid in self._results]
+        for profile in profiles:
+            total.update(profile.stacks)
+        return "".join(f"{stack} {count}\n" for stack, count in total.most_common())
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "remaining_requests": self.remaining,
+                "interval_ms": round(self.interval_s * 1000, 2),
+                "active": len(self._active),
+                "limits": {
+                    "min_interval_ms": self.min_interval_ms,
+                    "max_requests": self.max_requests,
+                    "max_concurrent": self.max_concurrent,
+                    "header_per_minute": round(self._header_bucket.rate * 60, 2)
+                },
+                "profiles": [profile.summary() for profile in reversed(self._results.values())]
+            }
+
+
+# Instancia global
+profiler = SamplingProfiler(
+    enabled=PROFILING_ENABLED,
+    min_interval_ms=PROFILING_MIN_INTERVAL_MS,
+    max_requests=PROFILING_MAX_REQUESTS,
+    max_concurrent=PROFILING_MAX_CONCURRENT,
+    header_per_minute=PROFILING_HEADER_PER_MINUTE,
+    max_stored=PROFILING_MAX_STORED,
+    output_dir=PROFILING_OUTPUT_DIR
+)
+metrics.describe("profiles_captured_total", "Requests perfilados, por disparador (armed / header)")
+metrics.describe("profiler_samples_total", "Muestras de stack tomadas por el profiler")
+metrics.describe("profiler_rejected_total", "Pedidos de profiling rechazados por límites")
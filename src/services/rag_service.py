@@ -1,16 +1,72 @@
 from pinecone import Pinecone, ServerlessSpec
+import threading
 import time
-from typing import List
-from src.config.settings import openai_client, PINECONE_API_KEY, PINECONE_NAMESPACE
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from src.config.settings import (
+    openai_client,
+    http_client_factory,
+    PINECONE_API_KEY,
+    PINECONE_NAMESPACE,
+    PINECONE_INDEX_NAME,
+    PINECONE_HOST,
+    PINECONE_INDEX_HOST,
+    PINECONE_CONNECT_TIMEOUT_S,
+    PINECONE_READ_TIMEOUT_S,
+    OPENAI_READ_TIMEOUT_S,
+    HEDGE_EMBEDDINGS_MS,
+    HEDGE_PINECONE_MS,
+    RAG_CONTEXT_CACHE_SIZE
+)
 from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.tracing_service import tracer
+from src.services.usage_service import usage_tracker
+from src.services.resilience import breakers, hedged_call
+from src.services.admission import admission, AdmissionRejected
+from src.services.tenant_service import tenants, Tenant
+from src.services.deadline import deadlines, DeadlineExceeded
+
+class ContextCache:
+    """LRU de query normalizada → contexto, usado para responder en modo degradado"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(query: str) -> str:
+        return " ".join(query.lower().split())
+    
+    def get(self, query: str) -> Optional[str]:
+        with self._lock:
+            key = self.key(query)
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+    
+    def put(self, query: str, context: str):
+        with self._lock:
+            self._items[self.key(query)] = context
+            self._items.move_to_end(self.key(query))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
 
 class RAGManager:
-    def __init__(self):
+    def __init__(self, index_name: str = PINECONE_INDEX_NAME, namespace: str = PINECONE_NAMESPACE,
+                 pc: Optional[Pinecone] = None):
         """Inicializa el sistema RAG con Pinecone"""
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.index_name = 'argenfuego-chatbot-knowledge-base'
+        options = http_client_factory.pinecone_options(PINECONE_CONNECT_TIMEOUT_S, PINECONE_READ_TIMEOUT_S)
+        self.pool_threads = options["pool_threads"]
+        self.connection_pool_maxsize = options["connection_pool_maxsize"]
+        self.request_timeout = options["request_timeout"]
+        self.pc = pc or Pinecone(api_key=PINECONE_API_KEY, host=PINECONE_HOST, pool_threads=self.pool_threads)
+        self.index_name = index_name
         self.dimension = 1536
-        self.namespace = PINECONE_NAMESPACE
+        self.namespace = namespace
+        self.context_cache = ContextCache(RAG_CONTEXT_CACHE_SIZE)
         logger.info("rag_initialized", namespace=self.namespace, index=self.index_name)
         self.setup_pinecone_index()
     
@@ -33,16 +89,39 @@ class RAGManager:
             logger.debug("waiting_for_index_ready")
             time.sleep(1)
         
-        self.index = self.pc.Index(self.index_name)
+        self.index = self.pc.Index(
+            self.index_name,
+            host=PINECONE_INDEX_HOST,
+            pool_threads=self.pool_threads,
+            connection_pool_maxsize=self.connection_pool_maxsize
+        )
     
-    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def create_embeddings(self, texts: List[str], hedge_ms: int = 0) -> List[List[float]]:
         """Convierte textos en vectores usando OpenAI embeddings"""
+        def embed():
+            with metrics.time_dependency("openai_embeddings"), \
+                    deadlines.bounded("embeddings_timeout", OPENAI_READ_TIMEOUT_S):
+                client = deadlines.openai(openai_client, OPENAI_READ_TIMEOUT_S)
+                return client.embeddings.create(
+                    model="text-embedding-ada-002",
+                    input=texts
+                )
+        
         try:
-            response = openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=texts
-            )
+            with admission.admit("embeddings"):
+                response = breakers.get("openai_embeddings").call(
+                    lambda: hedged_call(embed, hedge_ms, "openai_embeddings")
+                )
+            usage_tracker.record("embeddings", "text-embedding-ada-002", response.usage)
             return [embedding.embedding for embedding in response.data]
+        except AdmissionRejected as e:
+            # Sin embeddings el RAG cae a su modo degradado (contexto cacheado o sin contexto)
+            logger.warn("embeddings_shed", reason=e.reason)
+            return []
+        except DeadlineExceeded:
+            # Venció con el timeout recortado por el deadline: no es una falla de OpenAI
+            logger.warn("embeddings_skipped", reason="deadline")
+            return []
         except Exception as e:
             logger.log_api_failure("openai_embeddings", str(e))
             return []
@@ -92,42 +171,110 @@ class RAGManager:
         logger.info("document_indexed", doc_id=doc_id, chunks_count=len(chunks))
         return True
     
-    def search_relevant_context(self, query: str, top_k: int = 3) -> str:
-        """Busca contexto relevante para una consulta"""
-        logger.debug("rag_search_started", namespace=self.namespace, query_preview=query[:50] + "...")
+    def _degraded_context(self, query: str, reason: str) -> str:
+        """Modo degradado: contexto cacheado para la misma consulta o sin RAG"""
+        cached = self.context_cache.get(query)
+        if cached is not None:
+            metrics.inc("cache_hits_total", cache="rag_context")
+            metrics.inc("degraded_mode_total", reason="rag_from_cache")
+            logger.info("rag_degraded", reason=reason, source="cache")
+            return cached
+        metrics.inc("degraded_mode_total", reason="rag_skipped")
+        logger.info("rag_degraded", reason=reason, source="none")
+        return ""
+    
+    def search_relevant_context(self, query: str, top_k: int = 3,
+                                query_embedding: Optional[List[float]] = None) -> str:
+        """Busca contexto relevante para una consulta (reusa el embedding si ya se calculó)"""
+        logger.debug("rag_search_started", namespace=self.namespace, query_preview=lambda: query[:50] + "...")
         
-        query_embeddings = self.create_embeddings([query])
+        # Sin presupuesto para embeddings + Pinecone: contexto cacheado o sin RAG
+        if deadlines.degrade("rag"):
+            return self._degraded_context(query, "deadline")
         
-        if not query_embeddings:
-            return ""
+        # Con algún breaker abierto no se espera a la dependencia caída
+        dependencies = ("pinecone_query",) if query_embedding else ("openai_embeddings", "pinecone_query")
+        for dependency in dependencies:
+            if breakers.get(dependency).is_open():
+                return self._degraded_context(query, f"{dependency}_breaker_open")
         
-        results = self.index.query(
-            vector=query_embeddings[0],
-            top_k=top_k,
-            include_metadata=True,
-            namespace=self.namespace
-        )
+        if query_embedding:
+            metrics.inc("embeddings_reused_total")
+        else:
+            with tracer.span("rag_embed"):
+                query_embeddings = self.create_embeddings([query], hedge_ms=HEDGE_EMBEDDINGS_MS)
+            
+            if not query_embeddings:
+                return self._degraded_context(query, "embeddings_failed")
+            query_embedding = query_embeddings[0]
+        
+        def query_index():
+            with metrics.time_dependency("pinecone_query"), \
+                    deadlines.bounded("rag_timeout", self.request_timeout[1]):
+                return self.index.query(
+                    vector=query_embedding,
+                    top_k=top_k,
+                    include_metadata=True,
+                    namespace=self.namespace,
+                    _request_timeout=(self.request_timeout[0],
+                                      deadlines.timeout(self.request_timeout[1]))
+                )
+        
+        try:
+            with tracer.span("vector_query", top_k=top_k) as span:
+                results = breakers.get("pinecone_query").call(
+                    lambda: hedged_call(query_index, HEDGE_PINECONE_MS, "pinecone_query")
+                )
+                if span is not None:
+                    span.set_attribute("matches", len(results.matches))
+        except DeadlineExceeded:
+            return self._degraded_context(query, "deadline")
+        except Exception as e:
+            logger.log_api_failure("pinecone_query", str(e))
+            return self._degraded_context(query, "pinecone_failed")
         
         logger.debug("rag_search_results", namespace=self.namespace, matches_found=len(results.matches))
         
         relevant_texts = []
+        match_ids = []
         for match in results.matches:
             if match.score > 0.7:
                 text_content = match.metadata.get('chunk_text', '') or match.metadata.get('text', '')
                 if text_content:
                     relevant_texts.append(text_content)
-                    logger.debug("rag_match_found", score=round(match.score, 4), content_preview=text_content[:50] + "...")
+                    match_ids.append(match.id)
+                    logger.debug("rag_match_found", score=round(match.score, 4), content_preview=lambda: text_content[:50] + "...")
         
-        return "\n\n".join(relevant_texts)
+        # Ids de los fragmentos usados: quedan en la traza y en el journal de conversaciones
+        if span is not None:
+            span.set_attribute("match_ids", ",".join(match_ids))
+        
+        context = "\n\n".join(relevant_texts)
+        self.context_cache.put(query, context)
+        return context
 
-rag_manager = None
+# Un RAGManager por (índice, namespace), compartido entre tenants que usen el mismo
+_rag_managers: Dict[Tuple[str, str], RAGManager] = {}
+_rag_managers_lock = threading.Lock()
 
-def get_rag_manager():
-    """Obtiene la instancia de RAGManager con lazy loading"""
-    global rag_manager
-    if rag_manager is None:
-        logger.info("rag_manager_created", instance="new")
-        rag_manager = RAGManager()
-    else:
+def get_rag_manager(tenant: Optional[Tenant] = None):
+    """Obtiene el RAGManager del tenant (el del request si no se indica) con lazy loading"""
+    tenant = tenant or tenants.current()
+    key = (tenant.index_name, tenant.namespace)
+    rag_manager = _rag_managers.get(key)
+    if rag_manager is not None:
         logger.debug("rag_manager_reused", namespace=rag_manager.namespace)
-    return rag_manager
\ No newline at end of file
+        return rag_manager
+    with _rag_managers_lock:
+        rag_manager = _rag_managers.get(key)
+        if rag_manager is None:
+            logger.info("rag_manager_created", instance="new", tenant=tenant.id, namespace=tenant.namespace)
+            # Todos los índices comparten el cliente (y el pool de conexiones) del primero
+            shared_pc = next(iter(_rag_managers.values())).pc if _rag_managers else None
+            rag_manager = RAGManager(tenant.index_name, tenant.namespace, pc=shared_pc)
+            _rag_managers[key] = rag_manager
+    return rag_manager
+
+metrics.register_callback("rag_managers_cached", lambda: len(_rag_managers))
+metrics.describe("rag_managers_cached", "RAGManagers en memoria (uno por índice y namespace)")
+metrics.describe("embeddings_reused_total", "Búsquedas RAG que reusaron el embedding del clasificador de tema")
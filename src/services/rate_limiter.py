@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from src.config.settings import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_USER_BURST,
+    RATE_LIMIT_USER_PER_MINUTE,
+    RATE_LIMIT_GLOBAL_BURST,
+    RATE_LIMIT_GLOBAL_PER_SECOND,
+    RATE_LIMIT_MAX_USERS
+)
+from src.services.metrics_service import metrics
+
+
+class TokenBucket:
+    """Bucket clásico: capacidad `burst`, se recarga a `rate` tokens por segundo"""
+
+    __slots__ = ("burst", "rate", "tokens", "updated_at")
+
+    def __init__(self, burst: float, rate: float, now: float):
+        self.burst = burst
+        self.rate = rate
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class RateLimiter:
+    """Token buckets por usuario (LRU acotado) más uno global, evaluados antes del pipeline"""
+
+    def __init__(self, user_burst: float, user_per_minute: float, global_burst: float,
+                 global_per_second: float, max_users: int, enabled: bool = True):
+        self.enabled = enabled
+        self.user_burst = user_burst
+        self.user_rate = user_per_minute / 60
+        self.max_users = max_users
+        self._global = TokenBucket(global_burst, global_per_second, time.monotonic())
+        self._users: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = {"user": 0, "global": 0}
+        metrics.register_callback("rate_limit_tracked_users", lambda: len(self._users))
+
+    def _user_bucket(self, user_id: str, now: float) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(self.user_burst, self.user_rate, now)
+            # Un bucket desalojado vuelve lleno: solo se pierde el estado de usuarios inactivos
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    def check(self, user_id: str, user_scope: bool = True) -> Optional[str]:
+        """Consume un token; devuelve None si pasa o el scope que limitó ('user' / 'global').
+        Con user_scope=False solo cuenta el bucket global (evaluación batch)"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._user_bucket(user_id or "anonymous", now) if user_scope else None
+            if bucket is not None:
+                bucket.refill(now)
+            self._global.refill(now)
+            # Primero el usuario: un número abusivo no gasta tokens del bucket global
+            if bucket is not None and bucket.tokens < 1:
+                scope = "user"
+            elif self._global.tokens < 1:
+                scope = "global"
+            else:
+                if bucket is not None:
+                    bucket.tokens -= 1
+                self._global.tokens -= 1
+                return None
+            self.limited[scope] += 1
+        metrics.inc("rate_limited_total", scope=scope)
+        return scope
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._global.refill(time.monotonic())
+            return {
+                "enabled": self.enabled,
+                "user_burst": self.user_burst,
+                "user_per_minute": round(self.user_rate * 60, 2),
+                "global_burst": self._global.burst,
+                "global_per_second": self._global.rate,
+                "global_tokens": round(self._global.tokens, 2),
+                "tracked_users": len(self._users),
+                "max_users": self.max_users,
+                "limited": dict(self.limited)
+            }
+
+
+# Instancia global
+rate_limiter = RateLimiter(
+    user_burst=RATE_LIMIT_USER_BURST,
+    user_per_minute=RATE_LIMIT_USER_PER_MINUTE,
+    global_burst=RATE_LIMIT_GLOBAL_BURST,
+    global_per_second=RATE_LIMIT_GLOBAL_PER_SECOND,
+    max_users=RATE_LIMIT_MAX_USERS,
+    enabled=RATE_LIMIT_ENABLED
+)
+metrics.describe("rate_limited_total", "Mensajes rechazados por el rate limiter, por scope")
+metrics.describe("rate_limit_tracked_users", "Usuarios con bucket en memoria")
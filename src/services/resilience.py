@@ -0,0 +1,196 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict
+from src.config.settings import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RECOVERY_SECONDS,
+    BREAKER_HALF_OPEN_MAX_CALLS
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.deadline import DeadlineExceeded
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """El breaker de la dependencia está abierto: no se intenta la llamada"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit breaker '{name}' is open")
+        self.name = name
+
+
+# Nombres de excepción (en la jerarquía) que indican una falla de transporte, sin status HTTP:
+# APITimeoutError / APIConnectionError de OpenAI, timeouts de httpx/requests, MaxRetryError de urllib3
+_TRANSPORT_ERROR_MARKERS = ("Timeout", "Connection", "MaxRetry")
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """True si el error indica que la dependencia está caída o saturada (timeout, conexión, 5xx, 429).
+    Los errores del cliente (400 por contexto largo, 401, parámetros inválidos) no abren el breaker:
+    una ráfaga de inputs malos no tiene que dejar a todos en modo degradado"""
+    if isinstance(error, DeadlineExceeded):
+        # Timeout recortado por el deadline del request: la dependencia puede estar sana
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status == 429
+    return any(marker in cls.__name__ for cls in type(error).__mro__ for marker in _TRANSPORT_ERROR_MARKERS)
+
+
+class CircuitBreaker:
+    """Breaker clásico: closed → open tras N fallas seguidas → half_open tras el cooldown"""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float, half_open_max_calls: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        metrics.register_callback("circuit_breaker_state", lambda: STATE_VALUES[self.state], dependency=name)
+
+    def _transition(self, new_state: str):
+        if new_state == self.state:
+            return
+        logger.warn("circuit_breaker_transition", dependency=self.name,
+                    from_state=self.state, to_state=new_state,
+                    consecutive_failures=self.consecutive_failures)
+        self.state = new_state
+        if new_state == "open":
+            self.opened_at = time.monotonic()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.recovery_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition("half_open")
+            if self.state == "half_open":
+                # Solo unas pocas llamadas de prueba mientras se confirma la recuperación
+                if self.half_open_in_flight >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self.half_open_in_flight += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state == "half_open":
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            self.consecutive_failures = 0
+            self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open":
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+                self._transition("open")
+            elif self.consecutive_failures >= self.failure_threshold:
+                self._transition("open")
+
+    def record_ignored(self):
+        """La llamada falló por un error que no es de la dependencia: solo libera el slot de prueba"""
+        with self._lock:
+            if self.state == "half_open":
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def is_open(self) -> bool:
+        """Abierto y todavía dentro del cooldown (no consume un slot de prueba)"""
+        return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_seconds
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        if not self.allow_request():
+            metrics.inc("circuit_breaker_rejections_total", dependency=self.name)
+            raise CircuitOpenError(self.name)
+        try:
+            result = fn()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                self.record_ignored()
+            raise
+        self.record_success()
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+            "seconds_since_open": round(time.monotonic() - self.opened_at, 1) if self.opened_at else None
+        }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS, BREAKER_HALF_OPEN_MAX_CALLS
+                )
+            return breaker
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: breaker.get_status() for name, breaker in self._breakers.items()}
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def hedged_call(fn: Callable[[], Any], hedge_delay_ms: int, name: str) -> Any:
+    """Lanza un segundo intento si el primero no respondió en hedge_delay_ms; gana el primero OK"""
+    if hedge_delay_ms <= 0:
+        return fn()
+
+    # Cada intento corre con una copia del contexto (traza y acumulador de uso del request)
+    first = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    done, _ = wait([first], timeout=hedge_delay_ms / 1000)
+    if done and first.exception() is None:
+        return first.result()
+
+    metrics.inc("hedged_requests_total", dependency=name)
+    pending = {first} if not done else set()
+    pending.add(_hedge_executor.submit(contextvars.copy_context().run, fn))
+    last_error = first.exception() if done else None
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+    raise last_error
+
+
+# Instancia global
+breakers = BreakerRegistry()
+metrics.describe("circuit_breaker_state", "Estado del breaker por dependencia (0=closed, 1=half_open, 2=open)")
+metrics.describe("circuit_breaker_rejections_total", "Llamadas no intentadas por breaker abierto")
+metrics.describe("hedged_requests_total", "Segundos intentos lanzados por hedging")
+metrics.describe("degraded_mode_total", "Respuestas servidas en modo degradado por motivo")
@@ -0,0 +1,172 @@
+import json
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from src.config.settings import (
+    TENANTS_FILE,
+    PINECONE_INDEX_NAME,
+    PINECONE_NAMESPACE,
+    TWILIO_WHATSAPP_NUMBER
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.memory_service import conversation_memory
+from src.templates.assembler import PromptAssembler, prompt_assembler
+from src.templates.prompts import CONTACT_INFO
+
+DEFAULT_TENANT_ID = "default"
+DEFAULT_WELCOME = "Hola, soy Eva, la asistente virtual de Argenfuego 🧯 ¿En qué te puedo ayudar?"
+
+
+def _digits(number: str) -> str:
+    """'whatsapp:+54 9 11 4736-1881' → '5491147361881'"""
+    return re.sub(r"\D", "", number or "")
+
+
+class Tenant:
+    """Config de un negocio: número de WhatsApp, índice/namespace de RAG, leads y prompt"""
+
+    def __init__(self, tenant_id: str, whatsapp_number: str, name: str = "Argenfuego",
+                 index_name: str = PINECONE_INDEX_NAME,
+                 namespace: str = PINECONE_NAMESPACE, lead_recipient: Optional[str] = None,
+                 sender_email: Optional[str] = None, sender_name: Optional[str] = None,
+                 instructions: Optional[str] = None, welcome: str = DEFAULT_WELCOME,
+                 contact: Optional[Dict[str, str]] = None):
+        self.id = tenant_id
+        self.name = name
+        self.whatsapp_number = whatsapp_number
+        self.index_name = index_name
+        self.namespace = namespace
+        self.lead_recipient = lead_recipient
+        self.sender_email = sender_email
+        self.sender_name = sender_name
+        self.welcome = welcome
+        self.contact = {**CONTACT_INFO, **(contact or {})}
+        # Templates compilados una vez por tenant; sin prompt propio se comparte el global
+        self.assembler = PromptAssembler(instructions=instructions) if instructions else prompt_assembler
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Tenant":
+        instructions = config.get("instructions")
+        if not instructions and config.get("instructions_file"):
+            with open(config["instructions_file"], encoding="utf-8") as f:
+                instructions = f.read()
+        return cls(
+            tenant_id=config["id"],
+            whatsapp_number=config["whatsapp_number"],
+            name=config.get("name", config["id"]),
+            index_name=config.get("index_name", PINECONE_INDEX_NAME),
+            namespace=config.get("namespace", config["id"]),
+            lead_recipient=config.get("lead_recipient"),
+            sender_email=config.get("sender_email"),
+            sender_name=config.get("sender_name"),
+            instructions=instructions,
+            welcome=config.get("welcome", DEFAULT_WELCOME),
+            contact=config.get("contact")
+        )
+
+    @property
+    def is_default(self) -> bool:
+        return self.id == DEFAULT_TENANT_ID
+
+    def session_key(self, user_id: str) -> str:
+        """Clave de memoria: el mismo número hablando con dos negocios son dos sesiones"""
+        return user_id if self.is_default else f"{self.id}:{user_id}"
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "whatsapp_number": self.whatsapp_number,
+            "index_name": self.index_name,
+            "namespace": self.namespace,
+            "lead_recipient": self.lead_recipient,
+            "custom_prompt": self.assembler is not prompt_assembler
+        }
+
+
+_current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+
+class TenantRegistry:
+    """Resuelve el tenant por el número destino ('To') y lo deja activo en el contexto del request"""
+
+    def __init__(self, tenants: List[Tenant]):
+        self.tenants = {tenant.id: tenant for tenant in tenants}
+        self.by_number = {_digits(tenant.whatsapp_number): tenant for tenant in tenants}
+        # El primero de la lista atiende números desconocidos y los endpoints de testing
+        self.default = tenants[0]
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {tenant.id: 0 for tenant in tenants}
+        for tenant in tenants:
+            metrics.register_callback("tenant_sessions", lambda tid=tenant.id: self._session_count(tid),
+                                      tenant=tenant.id)
+
+    def get(self, tenant_id: Optional[str]) -> Tenant:
+        return self.tenants.get(tenant_id or "", self.default)
+
+    def resolve(self, to_number: str) -> Tenant:
+        """Tenant del número que recibió el mensaje; si no está configurado, el default"""
+        tenant = self.by_number.get(_digits(to_number))
+        if tenant is None:
+            metrics.inc("tenant_unresolved_total")
+            logger.warn("tenant_unresolved", to_number=to_number, fallback=self.default.id)
+            tenant = self.default
+        with self._lock:
+            self.requests[tenant.id] += 1
+        metrics.inc("tenant_requests_total", tenant=tenant.id)
+        return tenant
+
+    def current(self) -> Tenant:
+        return _current_tenant.get() or self.default
+
+    @contextmanager
+    def use(self, tenant: Tenant):
+        token = _current_tenant.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current_tenant.reset(token)
+
+    def _session_count(self, tenant_id: str) -> int:
+        prefix = f"{tenant_id}:"
+        if tenant_id == DEFAULT_TENANT_ID:
+            return sum(1 for key in list(conversation_memory.user_sessions) if ":" not in key)
+        return sum(1 for key in list(conversation_memory.user_sessions) if key.startswith(prefix))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "default": self.default.id,
+            "tenants": [
+                {**tenant.describe(), "requests": self.requests[tenant.id],
+                 "sessions": self._session_count(tenant.id)}
+                for tenant in self.tenants.values()
+            ]
+        }
+
+
+def _load_tenants() -> List[Tenant]:
+    """Tenants desde TENANTS_FILE; sin archivo (o inválido) un único tenant con la config global"""
+    default = Tenant(DEFAULT_TENANT_ID, TWILIO_WHATSAPP_NUMBER)
+    if not TENANTS_FILE:
+        return [default]
+    try:
+        with open(TENANTS_FILE, encoding="utf-8") as f:
+            config = json.load(f)
+        items = config.get("tenants", []) if isinstance(config, dict) else config
+        tenants = [Tenant.from_config(item) for item in items]
+        if tenants:
+            logger.info("tenants_loaded", count=len(tenants), ids=[tenant.id for tenant in tenants])
+            return tenants
+    except Exception as e:
+        logger.log_api_failure("tenants_config", str(e))
+    return [default]
+
+
+# Instancia global
+tenants = TenantRegistry(_load_tenants())
+metrics.describe("tenant_requests_total", "Mensajes recibidos por tenant")
+metrics.describe("tenant_unresolved_total", "Mensajes a un número sin tenant configurado (van al default)")
+metrics.describe("tenant_sessions", "Sesiones de conversación en memoria por tenant")
@@ -0,0 +1,228 @@
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from src.config.settings import (
+    HEDGE_EMBEDDINGS_MS,
+    TOPIC_CLASSIFIER_ENABLED,
+    TOPIC_CLASSIFIER_LOW,
+    TOPIC_CLASSIFIER_HIGH,
+    TOPIC_CLASSIFIER_TOP_K,
+    TOPIC_CLASSIFIER_KB_SAMPLES,
+    TOPIC_CLASSIFIER_EXEMPLARS_FILE
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+from src.services.rag_service import get_rag_manager
+from src.services.tenant_service import tenants
+from src.services.tracing_service import tracer
+
+# Ejemplos etiquetados por defecto. Los on-topic se completan con fragmentos de la base de
+# conocimiento del tenant (los más cercanos al centroide de estos ejemplos).
+DEFAULT_EXEMPLARS: Dict[str, List[str]] = {
+    "on_topic": [
+        "Necesito recargar los matafuegos de mi local",
+        "¿Cuánto sale un extintor de 5 kg?",
+        "Quiero un presupuesto para el mantenimiento de extintores",
+        "¿Hacen el control anual de la red de incendio?",
+        "Necesito la habilitación de bomberos para mi comercio",
+        "¿Qué extintor me conviene para una cocina?",
+        "¿Cada cuánto hay que hacer la prueba hidráulica?",
+        "Instalan detectores de humo y alarmas?",
+        "Quiero capacitar a mi personal en evacuación",
+        "¿Venden elementos de protección personal?",
+        "Tengo un edificio y necesito revisar las bombas y los hidrantes",
+        "¿Me pueden certificar la instalación contra incendios?",
+        "Se me venció la carga del matafuego del auto",
+        "¿Qué norma IRAM aplica a los extintores?",
+        "Hola, quería hacer una consulta por un servicio",
+        "Quiero hablar con alguien de ventas"
+    ],
+    "off_topic": [
+        "¿Quién ganó el partido de River ayer?",
+        "Pasame una receta de empanadas",
+        "¿Qué opinás del gobierno?",
+        "Escribime un poema de amor",
+        "¿Cómo está el dólar hoy?",
+        "Ayudame con la tarea de matemática",
+        "¿Qué película me recomendás?",
+        "Contame un chiste",
+        "¿Cuál es la capital de Australia?",
+        "Necesito un turno con el dentista",
+        "¿Va a llover mañana?",
+        "Programame una función en Python",
+        "¿Cómo hago para bajar de peso?",
+        "Quiero comprar un celular nuevo"
+    ]
+}
+
+# Reintento de la construcción de centroides tras un fallo (embeddings o Pinecone caídos)
+_RETRY_AFTER_S = 60.0
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _load_exemplars() -> Dict[str, List[str]]:
+    """Ejemplos desde TOPIC_CLASSIFIER_EXEMPLARS_FILE ({"on_topic": [...], "off_topic": [...]})"""
+    if TOPIC_CLASSIFIER_EXEMPLARS_FILE:
+        try:
+            with open(TOPIC_CLASSIFIER_EXEMPLARS_FILE, encoding="utf-8") as f:
+                exemplars = json.load(f)
+            if exemplars.get("on_topic") and exemplars.get("off_topic"):
+                return exemplars
+            logger.warn("topic_exemplars_invalid", file=TOPIC_CLASSIFIER_EXEMPLARS_FILE)
+        except Exception as e:
+            logger.log_api_failure("topic_classifier_config", str(e))
+    return DEFAULT_EXEMPLARS
+
+
+class TopicScore(NamedTuple):
+    decision: str  # on_topic / off_topic / uncertain / unavailable
+    margin: Optional[float]
+    embedding: Optional[List[float]]
+
+
+class ExemplarSet:
+    """Vectores normalizados de cada clase para un índice/namespace"""
+
+    def __init__(self, on_topic: List[List[float]], off_topic: List[List[float]], kb_samples: int):
+        self.on_topic = [_normalize(v) for v in on_topic]
+        self.off_topic = [_normalize(v) for v in off_topic]
+        self.kb_samples = kb_samples
+
+
+class EmbeddingTopicClassifier:
+    """Clasifica el tema por similitud del embedding del mensaje contra ejemplos de cada clase.
+    Fuera de la banda [low, high] decide solo; adentro, el LLM valida."""
+
+    def __init__(self, exemplars: Dict[str, List[str]], low: float, high: float,
+                 top_k: int = 3, kb_samples: int = 0, enabled: bool = True):
+        self.enabled = enabled
+        self.exemplars = exemplars
+        self.low = low
+        self.high = high
+        self.top_k = max(1, top_k)
+        self.kb_samples = kb_samples
+        self._sets: Dict[Tuple[str, str], ExemplarSet] = {}
+        self._failed_at: Dict[Tuple[str, str], float] = {}
+        # Un lock por índice/namespace: la construcción de un tenant no frena a los demás
+        self._build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _build(self, rag) -> ExemplarSet:
+        """Embebe los ejemplos en un solo llamado y suma fragmentos de la base de conocimiento"""
+        texts = self.exemplars["on_topic"] + self.exemplars["off_topic"]
+        vectors = rag.create_embeddings(texts)
+        if len(vectors) != len(texts):
+            raise RuntimeError("embeddings de ejemplos no disponibles")
+        split = len(self.exemplars["on_topic"])
+        on_topic, off_topic = vectors[:split], vectors[split:]
+
+        kb_vectors: List[List[float]] = []
+        if self.kb_samples > 0:
+            centroid = [sum(values) / len(on_topic) for values in zip(*on_topic)]
+            try:
+                results = rag.index.query(vector=centroid, top_k=self.kb_samples, include_values=True,
+                                          namespace=rag.namespace, _request_timeout=rag.request_timeout)
+                kb_vectors = [match.values for match in results.matches if match.values]
+            except Exception as e:
+                # Sin la base de conocimiento alcanza con los ejemplos etiquetados
+                logger.log_api_failure("topic_classifier_kb", str(e))
+
+        logger.info("topic_classifier_built", index=rag.index_name, namespace=rag.namespace,
+                    on_topic=len(on_topic), kb_samples=len(kb_vectors), off_topic=len(off_topic))
+        return ExemplarSet(on_topic + kb_vectors, off_topic, len(kb_vectors))
+
+    def _exemplar_set(self) -> Optional[ExemplarSet]:
+        tenant = tenants.current()
+        key = (tenant.index_name, tenant.namespace)
+        exemplar_set = self._sets.get(key)
+        if exemplar_set is not None:
+            return exemplar_set
+        if time.monotonic() - self._failed_at.get(key, -_RETRY_AFTER_S) < _RETRY_AFTER_S:
+            return None
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        # Sin esperar: mientras otro request construye (embeddings + Pinecone) el mensaje va al LLM
+        if not build_lock.acquire(blocking=False):
+            metrics.inc("topic_classifier_build_busy_total")
+            return None
+        try:
+            if key in self._sets:
+                return self._sets[key]
+            self._sets[key] = self._build(get_rag_manager(tenant))
+            return self._sets[key]
+        except Exception as e:
+            self._failed_at[key] = time.monotonic()
+            logger.log_api_failure("topic_classifier_build", str(e))
+            return None
+        finally:
+            build_lock.release()
+
+    def _class_score(self, vector: List[float], exemplars: List[List[float]]) -> float:
+        """Promedio de las top_k similitudes coseno (más robusto que el centroide con clases dispersas)"""
+        similarities = sorted((_dot(vector, e) for e in exemplars), reverse=True)[:self.top_k]
+        return sum(similarities) / len(similarities)
+
+    def score(self, mensaje: str) -> TopicScore:
+        """Embebe el mensaje una vez y devuelve decisión, margen (on - off) y el vector para el RAG"""
+        exemplar_set = self._exemplar_set()
+        if exemplar_set is None:
+            metrics.inc("topic_classifier_total", decision="unavailable")
+            return TopicScore("unavailable", None, None)
+
+        with tracer.span("topic_embed"):
+            embeddings = get_rag_manager().create_embeddings([mensaje], hedge_ms=HEDGE_EMBEDDINGS_MS)
+        if not embeddings:
+            metrics.inc("topic_classifier_total", decision="unavailable")
+            return TopicScore("unavailable", None, None)
+
+        vector = _normalize(embeddings[0])
+        margin = (self._class_score(vector, exemplar_set.on_topic)
+                  - self._class_score(vector, exemplar_set.off_topic))
+        if margin >= self.high:
+            decision = "on_topic"
+        elif margin <= self.low:
+            decision = "off_topic"
+        else:
+            decision = "uncertain"
+        metrics.inc("topic_classifier_total", decision=decision)
+        tracer.set_attribute("topic_margin", round(margin, 4))
+        logger.debug("topic_classified", decision=decision, margin=round(margin, 4))
+        return TopicScore(decision, margin, embeddings[0])
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "band": [self.low, self.high],
+            "top_k": self.top_k,
+            "exemplars": {label: len(texts) for label, texts in self.exemplars.items()},
+            "built": [
+                {"index": index, "namespace": namespace, "on_topic": len(s.on_topic),
+                 "kb_samples": s.kb_samples, "off_topic": len(s.off_topic)}
+                for (index, namespace), s in self._sets.items()
+            ]
+        }
+
+
+# Instancia global
+topic_classifier = EmbeddingTopicClassifier(
+    _load_exemplars(),
+    low=TOPIC_CLASSIFIER_LOW,
+    high=TOPIC_CLASSIFIER_HIGH,
+    top_k=TOPIC_CLASSIFIER_TOP_K,
+    kb_samples=TOPIC_CLASSIFIER_KB_SAMPLES,
+    enabled=TOPIC_CLASSIFIER_ENABLED
+)
+metrics.describe("topic_classifier_total",
+                 "Mensajes clasificados por embeddings, por decisión (uncertain = pasa al LLM)")
+metrics.describe("topic_classifier_build_busy_total",
+                 "Mensajes que fueron al LLM porque los ejemplos de su tenant se estaban construyendo")
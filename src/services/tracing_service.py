@@ -0,0 +1,246 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from src.config.settings import TRACE_SLOW_MS, TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+
+class Span:
+    """Etapa medida dentro de un request"""
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    @property
+    def duration_ms(self) -> float:
+        return round(self.duration * 1000, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "duration_ms": self.duration_ms,
+            **({"error": self.error} if self.error else {}),
+            **self.attributes
+        }
+
+
+class Trace:
+    """Conjunto de spans de un request, identificado por trace_id"""
+
+    def __init__(self, name: str, user_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.user_id = user_id
+        # En los atributos exportables solo va el hash del usuario
+        self.root = Span(name, None, {"user.hash": logger.hash_user_id(user_id), **attributes})
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def span_attribute(self, span_name: str, key: str) -> Any:
+        """Valor de un atributo en el último span con ese nombre (None si no hubo)"""
+        with self._lock:
+            for span in reversed(self.spans):
+                if span.name == span_name and key in span.attributes:
+                    return span.attributes[key]
+        return None
+
+    def stage_timings(self) -> Dict[str, float]:
+        """Duración acumulada por etapa en ms"""
+        timings: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                timings[span.name] = round(timings.get(span.name, 0) + span.duration * 1000, 2)
+        return timings
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace_id: str, span: Span) -> Dict[str, Any]:
+    return {
+        "traceId": trace_id,
+        "spanId": span.span_id,
+        **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.start_ns + int(span.duration * 1e9)),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+    }
+
+
+class OTLPJsonExporter:
+    """Exporta trazas en formato OTLP/HTTP JSON a un collector local, en background"""
+
+    def __init__(self, endpoint: str, service_name: str, max_queue: int = 1000):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.exported = 0
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def submit(self, trace: Trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _payload(self, traces: List[Trace]) -> Dict[str, Any]:
+        spans = []
+        for trace in traces:
+            spans.append(_otlp_span(trace.trace_id, trace.root))
+            spans.extend(_otlp_span(trace.trace_id, span) for span in trace.spans)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "src.services.tracing_service"}, "spans": spans}]
+            }]
+        }
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 50:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=json.dumps(self._payload(batch)).encode(),
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                urllib.request.urlopen(request, timeout=2).close()
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.debug("otlp_export_failed", error=str(e), traces=len(batch))
+
+
+class Tracer:
+    """Tracing liviano por request: spans por etapa y captura de requests lentos"""
+
+    def __init__(self, slow_ms: int, exporter: Optional[OTLPJsonExporter] = None):
+        self.slow_ms = slow_ms
+        self.exporter = exporter
+        self.slow_requests = 0
+
+    def current_trace(self) -> Optional[Trace]:
+        return _current_trace.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        trace = _current_trace.get()
+        return trace.trace_id if trace else None
+
+    @contextmanager
+    def trace(self, name: str, user_id: Optional[str] = None, **attributes):
+        """Abre una traza para el request; si ya hay una activa, la reutiliza"""
+        existing = _current_trace.get()
+        if existing is not None:
+            yield existing
+            return
+
+        trace = Trace(name, user_id, attributes)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        except Exception as e:
+            trace.root.error = str(e)
+            raise
+        finally:
+            trace.root.finish()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Mide una etapa; sin traza activa no hace nada"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            trace.add(span)
+            metrics.observe("stage_duration_seconds", span.duration, stage=name)
+
+    def set_attribute(self, key: str, value: Any):
+        """Agrega un atributo al span activo (si lo hay)"""
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+    def _finish(self, trace: Trace):
+        total_ms = trace.root.duration_ms
+        if total_ms >= self.slow_ms:
+            self.slow_requests += 1
+            metrics.inc("slow_requests_total")
+            logger.warn("slow_request",
+                        trace_id=trace.trace_id,
+                        total_ms=total_ms,
+                        threshold_ms=self.slow_ms,
+                        user_id=trace.user_id,
+                        spans=lambda: [span.to_dict() for span in trace.spans])
+        if self.exporter is not None:
+            self.exporter.submit(trace)
+
+
+# Instancia global
+tracer = Tracer(
+    slow_ms=TRACE_SLOW_MS,
+    exporter=OTLPJsonExporter(TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME) if TRACE_OTLP_ENDPOINT else None
+)
+metrics.describe("stage_duration_seconds", "Latencia por etapa del pipeline (spans de tracing)")
+metrics.describe("slow_requests_total", "Requests que superaron TRACE_SLOW_MS")
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from src.config.settings import (
+    MODEL_PRICES_JSON,
+    USER_BUDGET_WINDOW_HOURS,
+    USER_BUDGET_DOWNGRADE_USD,
+    USER_BUDGET_THROTTLE_USD,
+    USER_BUDGET_MAX_USERS
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+# USD por millón de tokens: (input, output)
+DEFAULT_MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+    "omni-moderation": (0.0, 0.0),
+    "text-moderation": (0.0, 0.0)
+}
+
+
+def _load_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_MODEL_PRICES)
+    if MODEL_PRICES_JSON:
+        try:
+            prices.update({model: tuple(price) for model, price in json.loads(MODEL_PRICES_JSON).items()})
+        except Exception as e:
+            logger.log_api_failure("model_prices_config", str(e))
+    return prices
+
+
+class RequestUsage:
+    """Tokens y costo acumulados durante un request"""
+
+    def __init__(self, user_id: Optional[str]):
+        self.user_id = user_id
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.calls: Dict[str, int] = {}
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost, 6),
+            "calls": dict(self.calls)
+        }
+
+
+_current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("current_usage", default=None)
+
+
+class UserBudgets:
+    """Gasto por usuario en una ventana móvil, con almacenamiento acotado (LRU)"""
+
+    def __init__(self, window_seconds: float, max_users: int):
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self._spend: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, entries: deque, now: float):
+        cutoff = now - self.window_seconds
+        while entries and entries[0][0] < cutoff:
+            entries.popleft()
+
+    def add(self, user_id: str, cost: float):
+        now = time.time()
+        with self._lock:
+            entries = self._spend.get(user_id)
+            if entries is None:
+                entries = self._spend[user_id] = deque()
+                if len(self._spend) > self.max_users:
+                    self._spend.popitem(last=False)
+            else:
+                self._spend.move_to_end(user_id)
+            entries.append((now, cost))
+            self._prune(entries, now)
+
+    def spent(self, user_id: str) -> float:
+        with self._lock:
+            entries = self._spend.get(user_id)
+            if not entries:
+                return 0.0
+            self._prune(entries, time.time())
+            return sum(cost for _, cost in entries)
+
+    def top_spenders(self, limit: int = 10) -> list:
+        with self._lock:
+            user_ids = list(self._spend)
+        ranking = sorted(((self.spent(user_id), user_id) for user_id in user_ids), reverse=True)
+        return [
+            {"user_id": logger.hash_user_id(user_id), "spent_usd": round(spent, 6)}
+            for spent, user_id in ranking[:limit] if spent > 0
+        ]
+
+
+class UsageTracker:
+    """Contabiliza tokens y costo reales de cada llamada a OpenAI"""
+
+    def __init__(self):
+        self.prices = _load_prices()
+        self.budgets = UserBudgets(USER_BUDGET_WINDOW_HOURS * 3600, USER_BUDGET_MAX_USERS)
+        self.downgrade_usd = USER_BUDGET_DOWNGRADE_USD
+        self.throttle_usd = USER_BUDGET_THROTTLE_USD
+
+    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.prices.get(model)
+        if price is None:
+            # Snapshots con fecha (p.ej. gpt-4o-mini-2024-07-18) usan el precio del modelo base
+            base = max((name for name in self.prices if model.startswith(name)), key=len, default=None)
+            if base is None:
+                logger.warn("model_price_unknown", model=model)
+                return 0.0
+            price = self.prices[base]
+        input_price, output_price = price
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    @contextmanager
+    def track_request(self, user_id: Optional[str]):
+        """Acumula el uso de un request; reutiliza el acumulador si ya hay uno activo"""
+        existing = _current_usage.get()
+        if existing is not None:
+            yield existing
+            return
+
+        usage = RequestUsage(user_id)
+        token = _current_usage.set(usage)
+        try:
+            yield usage
+        finally:
+            _current_usage.reset(token)
+
+    def current(self) -> Optional[RequestUsage]:
+        return _current_usage.get()
+
+    def record(self, operation: str, model: str, usage=None, user_id: Optional[str] = None) -> float:
+        """Registra el `usage` devuelto por OpenAI y devuelve el costo en USD"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = self.calculate_cost(model, prompt_tokens, completion_tokens)
+
+        request_usage = _current_usage.get()
+        if request_usage is not None:
+            request_usage.prompt_tokens += prompt_tokens
+            request_usage.completion_tokens += completion_tokens
+            request_usage.cost += cost
+            request_usage.calls[operation] = request_usage.calls.get(operation, 0) + 1
+            user_id = user_id or request_usage.user_id
+
+        if user_id and cost > 0:
+            self.budgets.add(user_id, cost)
+
+        logger.log_openai_usage(operation, model, prompt_tokens, completion_tokens, cost, user_id=user_id)
+        return cost
+
+    def budget_status(self, user_id: str) -> str:
+        """'ok', 'downgrade' o 'throttle' según el gasto en la ventana móvil"""
+        spent = self.budgets.spent(user_id)
+        if spent >= self.throttle_usd:
+            return "throttle"
+        if spent >= self.downgrade_usd:
+            return "downgrade"
+        return "ok"
+
+
+# Instancia global
+usage_tracker = UsageTracker()
+metrics.describe("openai_tokens_total", "Tokens reales reportados por OpenAI")
+metrics.describe("openai_cost_usd_total", "Costo estimado en USD según la tabla de precios por modelo")
@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import httpx
+from src.config.settings import (
+    ADMISSION_LIMITS,
+    CLUSTER_WORKERS,
+    CLUSTER_WORKER_HOST,
+    CLUSTER_WORKER_BASE_PORT,
+    CLUSTER_VNODES,
+    CLUSTER_HEALTH_INTERVAL_S,
+    CLUSTER_HEALTH_TIMEOUT_S,
+    CLUSTER_HEALTH_FAILURES,
+    CLUSTER_RESTART_BACKOFF_MAX_S,
+    RATE_LIMIT_GLOBAL_BURST,
+    RATE_LIMIT_GLOBAL_PER_SECOND
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+# Un worker que sobrevive este tiempo sin caerse vuelve al backoff mínimo
+_STABLE_AFTER_S = 60.0
+# Un worker que no responde /health en este tiempo desde el arranque se considera colgado
+_STARTUP_TIMEOUT_S = 120.0
+
+_SAMPLE = re.compile(r"([^\s{]+)(\{?)(.*)")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Hash consistente con nodos virtuales: agregar o quitar un worker mueve solo ~1/N usuarios"""
+
+    def __init__(self, nodes: List[int], vnodes: int):
+        points = sorted((_hash(f"worker-{node}-{v}"), node) for node in nodes for v in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def candidates(self, key: str) -> List[int]:
+        """Workers en orden de preferencia para la clave: el dueño primero, después los siguientes del anillo"""
+        start = bisect_right(self._keys, _hash(key)) % len(self._keys)
+        ordered: List[int] = []
+        for i in range(len(self._nodes)):
+            node = self._nodes[(start + i) % len(self._nodes)]
+            if node not in ordered:
+                ordered.append(node)
+        return ordered
+
+
+def _per_worker_env(worker_id: int, workers: int) -> Dict[str, str]:
+    """Límites globales repartidos entre workers (cada proceso tiene sus propios buckets y semáforos)"""
+    admission = ",".join(
+        f"{stage}={max(1, math.ceil(in_flight / workers))}:{max(1, math.ceil(queue / workers))}:{wait}"
+        for stage, (in_flight, queue, wait) in ADMISSION_LIMITS.items()
+    )
+    return {
+        "WORKER_ID": str(worker_id),
+        # El outbox de leads es uno solo (LEAD_OUTBOX_PATH) para todos: el claim con lease evita
+        # envíos duplicados y ningún lead queda varado al cambiar la cantidad de workers
+        "RATE_LIMIT_GLOBAL_BURST": str(max(1.0, RATE_LIMIT_GLOBAL_BURST / workers)),
+        "RATE_LIMIT_GLOBAL_PER_SECOND": str(RATE_LIMIT_GLOBAL_PER_SECOND / workers),
+        "ADMISSION_LIMITS": admission
+    }
+
+
+class Worker:
+    """Un proceso uvicorn con src.main:app en su propio puerto"""
+
+    def __init__(self, worker_id: int, host: str, port: int):
+        self.id = worker_id
+        self.host = host
+        self.port = port
+        self.url = f"http://{host}:{port}"
+        self.process: Optional[subprocess.Popen] = None
+        self.state = "stopped"  # starting / up / down / stopped
+        self.failures = 0
+        self.restarts = 0
+        self.crashes_in_row = 0
+        self.started_at: Optional[float] = None
+        self.next_start_at = 0.0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "pid": self.process.pid if self.process else None,
+            "state": self.state,
+            "restarts": self.restarts,
+            "uptime_s": round(time.monotonic() - self.started_at, 1) if self.started_at else None
+        }
+
+
+class WorkerPool:
+    """Levanta N workers, los vigila (proceso y /health), los reinicia y enruta usuarios por hash"""
+
+    def __init__(self, workers: int, host: str, base_port: int, vnodes: int,
+                 health_interval_s: float, health_timeout_s: float, health_failures: int,
+                 restart_backoff_max_s: float):
+        self.workers = [Worker(i, host, base_port + i) for i in range(max(1, workers))]
+        self.ring = HashRing([w.id for w in self.workers], vnodes)
+        self.health_interval_s = health_interval_s
+        self.health_timeout_s = health_timeout_s
+        self.health_failures = health_failures
+        self.restart_backoff_max_s = restart_backoff_max_s
+        self.client: Optional[httpx.AsyncClient] = None
+        self._monitor: Optional[asyncio.Task] = None
+        for worker in self.workers:
+            metrics.register_callback("cluster_worker_up", lambda w=worker: 1 if w.state == "up" else 0,
+                                      worker=str(worker.id))
+
+    # --- Procesos ---
+
+    def _spawn(self, worker: Worker):
+        env = {**os.environ, **_per_worker_env(worker.id, len(self.workers))}
+        worker.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.main:app",
+             "--host", worker.host, "--port", str(worker.port)],
+            env=env
+        )
+        worker.state = "starting"
+        worker.failures = 0
+        worker.started_at = time.monotonic()
+        logger.info("cluster_worker_started", worker=worker.id, pid=worker.process.pid, port=worker.port)
+
+    def _terminate(self, worker: Worker, timeout: float = 10.0):
+        process = worker.process
+        if process is None or process.poll() is not None:
+            return
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _schedule_restart(self, worker: Worker, reason: str):
+        """Marca el worker caído y programa el reinicio con backoff exponencial si se cae seguido"""
+        if worker.started_at and time.monotonic() - worker.started_at > _STABLE_AFTER_S:
+            worker.crashes_in_row = 0
+        worker.crashes_in_row += 1
+        delay = min(self.restart_backoff_max_s, 0.5 * 2 ** (worker.crashes_in_row - 1))
+        worker.state = "down"
+        worker.started_at = None
+        worker.next_start_at = time.monotonic() + delay
+        metrics.inc("cluster_worker_restarts_total", worker=str(worker.id), reason=reason)
+        logger.warn("cluster_worker_down", worker=worker.id, reason=reason, restart_in_s=delay)
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_keepalive_connections=64))
+        for worker in self.workers:
+            self._spawn(worker)
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for worker in self.workers:
+            worker.state = "stopped"
+        await asyncio.gather(*(asyncio.to_thread(self._terminate, w) for w in self.workers))
+        if self.client is not None:
+            await self.client.aclose()
+        logger.info("cluster_stopped", workers=len(self.workers))
+
+    # --- Health checks ---
+
+    async def _check(self, worker: Worker):
+        if worker.state == "down":
+            if time.monotonic() >= worker.next_start_at:
+                worker.restarts += 1
+                self._spawn(worker)
+            return
+        if worker.process.poll() is not None:
+            self._schedule_restart(worker, f"exit_{worker.process.returncode}")
+            return
+        try:
+            response = await self.client.get(f"{worker.url}/health", timeout=self.health_timeout_s)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+
+        if healthy:
+            if worker.state != "up":
+                logger.info("cluster_worker_up", worker=worker.id, pid=worker.process.pid)
+            worker.state = "up"
+            worker.failures = 0
+        elif worker.state == "up":
+            worker.failures += 1
+            if worker.failures >= self.health_failures:
+                # Colgado (event loop bloqueado, deadlock): se mata y se reinicia
+                await asyncio.to_thread(self._terminate, worker)
+                self._schedule_restart(worker, "health_check")
+        elif time.monotonic() - worker.started_at > _STARTUP_TIMEOUT_S:
+            await asyncio.to_thread(self._terminate, worker)
+            self._schedule_restart(worker, "startup_timeout")
+        # 'starting' sin responder todavía: sigue importando módulos, se espera
+
+    async def _watch(self):
+        while True:
+            await asyncio.gather(*(self._check(w) for w in self.workers), return_exceptions=True)
+            await asyncio.sleep(self.health_interval_s)
+
+    # --- Ruteo ---
+
+    def route(self, key: str) -> Optional[Worker]:
+        """Worker dueño de la clave; si está caído, el siguiente sano del anillo (pierde la memoria
+        de la sesión igual que si el dueño se hubiera reiniciado) y vuelve al dueño cuando se recupera"""
+        candidates = self.ring.candidates(key)
+        for position, worker_id in enumerate(candidates):
+            worker = self.workers[worker_id]
+            if worker.state == "up":
+                if position > 0:
+                    metrics.inc("cluster_failover_total", worker=str(candidates[0]))
+                return worker
+        return None
+
+    def get(self, worker_id: int) -> Optional[Worker]:
+        return self.workers[worker_id] if 0 <= worker_id < len(self.workers) else None
+
+    # --- Métricas ---
+
+    async def scrape(self, local_text: str = "") -> str:
+        """/metrics de todos los workers sanos más las del front (local_text, worker="front"),
+        unidos por familia: cada familia sale una sola vez, con sus muestras contiguas"""
+        async def fetch(worker: Worker) -> Optional[str]:
+            try:
+                response = await self.client.get(f"{worker.url}/metrics", timeout=self.health_timeout_s)
+                return response.text if response.status_code == 200 else None
+            except httpx.HTTPError:
+                return None
+
+        up = [w for w in self.workers if w.state == "up"]
+        texts = await asyncio.gather(*(fetch(w) for w in up))
+        sources = [("front", local_text)] + [(str(w.id), text) for w, text in zip(up, texts)]
+        families: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+        for source, text in sources:
+            if not text:
+                continue
+            family = None
+            for line in text.splitlines():
+                if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                    family = families.setdefault(line.split()[2], {"header": [], "samples": []})
+                    if line not in family["header"]:
+                        family["header"].append(line)
+                elif line and not line.startswith("#") and family is not None:
+                    name, brace, rest = _SAMPLE.match(line).groups()
+                    label = f'worker="{source}"'
+                    family["samples"].append(f"{name}{{{label},{rest}" if brace else f"{name}{{{label}}}{rest}")
+        return "".join("\n".join(f["header"] + f["samples"]) + "\n" for f in families.values())
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "workers": [worker.describe() for worker in self.workers],
+            "up": sum(1 for worker in self.workers if worker.state == "up")
+        }
+
+
+# Instancia global (solo la usa el front: src/front.py)
+worker_pool = WorkerPool(
+    workers=CLUSTER_WORKERS,
+    host=CLUSTER_WORKER_HOST,
+    base_port=CLUSTER_WORKER_BASE_PORT,
+    vnodes=CLUSTER_VNODES,
+    health_interval_s=CLUSTER_HEALTH_INTERVAL_S,
+    health_timeout_s=CLUSTER_HEALTH_TIMEOUT_S,
+    health_failures=CLUSTER_HEALTH_FAILURES,
+    restart_backoff_max_s=CLUSTER_RESTART_BACKOFF_MAX_S
+)
+metrics.describe("cluster_worker_up", "1 si el worker responde /health")
+metrics.describe("cluster_worker_restarts_total", "Reinicios de workers, por motivo (exit_N / health_check / startup_timeout)")
+metrics.describe("cluster_failover_total", "Requests desviados a otro worker porque el dueño estaba caído")
+metrics.describe("cluster_proxy_requests_total", "Requests reenviados por el front, por worker y resultado")
+metrics.describe("cluster_proxy_duration_seconds", "Latencia del reenvío front → worker")
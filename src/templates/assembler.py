@@ -0,0 +1,95 @@
+from typing import Dict, List, Optional, Tuple
+from jinja2 import Environment
+from src.templates.prompts import (
+    SYSTEM_INSTRUCTIONS,
+    CONTEXT_TEMPLATE,
+    FALLBACK_PROMPT,
+    TOPIC_VALIDATION_INSTRUCTIONS,
+    TOPIC_MESSAGE_TEMPLATE
+)
+from src.services.logging_service import logger
+from src.services.metrics_service import metrics
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+except Exception:  # tiktoken es opcional (y necesita descargar el vocabulario)
+    def count_tokens(text: str) -> int:
+        """Estimación: ~4 caracteres por token en español"""
+        return (len(text) + 3) // 4
+
+Messages = List[Dict[str, str]]
+
+
+class PromptAssembler:
+    """Arma los mensajes con prefijo fijo primero y contexto/historial después.
+
+    Los templates se compilan una sola vez y los tokens de las secciones fijas
+    se cuentan al inicializar.
+    """
+
+    def __init__(self, instructions: str = SYSTEM_INSTRUCTIONS, fallback: str = FALLBACK_PROMPT):
+        env = Environment(autoescape=False, keep_trailing_newline=True)
+        self.instructions = instructions
+        self.fallback = fallback
+        self.context_template = env.from_string(CONTEXT_TEMPLATE)
+        self.topic_template = env.from_string(TOPIC_MESSAGE_TEMPLATE)
+        self.static_tokens = {
+            "instructions": count_tokens(instructions),
+            "fallback": count_tokens(fallback),
+            "topic_instructions": count_tokens(TOPIC_VALIDATION_INSTRUCTIONS)
+        }
+
+    def build_chat_messages(self, mensaje: str, contexto: str,
+                            history: Optional[List[Tuple[str, str]]] = None) -> Tuple[Messages, Dict[str, int]]:
+        """Mensajes para la completion y tokens por sección"""
+        if contexto:
+            messages = [
+                {"role": "system", "content": self.instructions},
+                {"role": "system", "content": self.context_template.render(contexto_relevante=contexto)}
+            ]
+            sections = {
+                "instructions": self.static_tokens["instructions"],
+                "context": count_tokens(messages[1]["content"])
+            }
+        else:
+            messages = [{"role": "system", "content": self.fallback}]
+            sections = {"instructions": self.static_tokens["fallback"], "context": 0}
+
+        history_tokens = 0
+        for user_turn, assistant_turn in history or []:
+            messages.append({"role": "user", "content": user_turn})
+            messages.append({"role": "assistant", "content": assistant_turn})
+            history_tokens += count_tokens(user_turn) + count_tokens(assistant_turn)
+        sections["history"] = history_tokens
+
+        messages.append({"role": "user", "content": mensaje})
+        sections["user"] = count_tokens(mensaje)
+
+        self._report("completion", sections)
+        return messages, sections
+
+    def build_topic_messages(self, mensaje: str) -> Messages:
+        """Mensajes para la validación de tema: instrucciones fijas + mensaje del cliente"""
+        content = self.topic_template.render(mensaje=mensaje)
+        self._report("topic_validation", {
+            "instructions": self.static_tokens["topic_instructions"],
+            "user": count_tokens(content)
+        })
+        return [
+            {"role": "system", "content": TOPIC_VALIDATION_INSTRUCTIONS},
+            {"role": "user", "content": content}
+        ]
+
+    def _report(self, prompt: str, sections: Dict[str, int]):
+        for section, tokens in sections.items():
+            metrics.inc("prompt_tokens_estimated_total", tokens, prompt=prompt, section=section)
+        logger.debug("prompt_assembled", prompt=prompt, total_tokens=sum(sections.values()), **sections)
+
+
+# Instancia global
+prompt_assembler = PromptAssembler()
+metrics.describe("prompt_tokens_estimated_total", "Tokens de prompt estimados por sección")